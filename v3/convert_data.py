@@ -0,0 +1,141 @@
+import os
+import time
+import argparse
+import numpy as np
+import tables
+import phase_parameters.params
+import generate_data3
+
+# convert existing data files (train3.hdf5, test3.hdf5) to the float32 /
+# uint16, chunked and compressed layout of generate_data3.create_data_file
+# with labels stored once per sample, and measure the read throughput of the training batches
+#
+# python convert_data.py convert train3.hdf5 train3_uint16.hdf5 --trace_format uint16 --complevel 5
+# python convert_data.py benchmark train3.hdf5 train3_uint16.hdf5
+
+
+def convert_data_file(filename_in, filename_out, block_rows=1000, **file_kwargs):
+    """
+    copy the traces and labels of filename_in into a new file, file_kwargs
+    are passed to generate_data3.create_data_file
+
+    the label rows of noise_trace files with one label row per trace row are
+    deduplicated to one row per sample with a sample_index
+    """
+    levels = 1 + len(phase_parameters.params.noise_counts)
+
+    with tables.open_file(filename_in, mode='r') as file_in:
+        trace_name = generate_data3.trace_array_name(file_in)
+        xuv_coefs = file_in.root.xuv_coefs.shape[1]
+        generate_data3.create_data_file(filename_out, xuv_coefs, clean_only=(trace_name == 'trace'), **file_kwargs)
+        with tables.open_file(filename_out, mode='a') as file_out:
+            file_in.root._v_attrs._f_copy(file_out.root)
+        deduplicate = trace_name == 'noise_trace' and 'sample_index' not in file_in.root
+
+        rows = getattr(file_in.root, trace_name).nrows
+        if deduplicate and rows % levels != 0:
+            raise ValueError("{} rows are not a multiple of {} noise levels".format(rows, levels))
+        # blocks of whole samples
+        block_rows = (block_rows // levels) * levels
+
+        with tables.open_file(filename_out, mode='a') as file_out:
+            for row in range(0, rows, block_rows):
+                traces = generate_data3.read_traces(file_in, trace_name, row, row + block_rows)
+                generate_data3.append_trace_rows(file_out, traces)
+
+                if deduplicate:
+                    labels = generate_data3.read_row_labels(file_in, row, row + block_rows)
+                    sample_labels = labels.reshape(-1, levels, labels.shape[1])
+                    if not np.all(sample_labels == sample_labels[:, :1]):
+                        raise ValueError("the labels of rows {}:{} are not constant per sample".format(
+                            row, row + block_rows))
+                    sample_ids = row // levels + np.arange(len(sample_labels))
+                    file_out.root.sample_index.append(np.stack([np.repeat(sample_ids, levels),
+                                                                np.tile(np.arange(levels), len(sample_labels))],
+                                                               axis=1).astype(np.int32))
+                    file_out.root.xuv_coefs.append(sample_labels[:, 0, :xuv_coefs])
+                    file_out.root.ir_params.append(sample_labels[:, 0, xuv_coefs:])
+
+            if not deduplicate:
+                for name in ['xuv_coefs', 'ir_params', 'sample_index']:
+                    if name in file_in.root:
+                        array_in = getattr(file_in.root, name)
+                        for row in range(0, array_in.nrows, block_rows):
+                            getattr(file_out.root, name).append(array_in[row:row + block_rows])
+
+
+def read_benchmark(filename, batch_size=10, n_batches=500, reopen=True):
+    """
+    read n_batches training batches with generate_data3.read_samples
+
+    reopen: open the file for every batch, like network3.GetData
+    """
+    with tables.open_file(filename, mode='r') as hdf5_file:
+        samples = generate_data3.stored_samples(hdf5_file)
+    n_batches = min(n_batches, samples // batch_size)
+    random_state = np.random.RandomState(0)
+
+    hdf5_file = None
+    time1 = time.time()
+    for batch in range(n_batches):
+        if hdf5_file is None or reopen:
+            hdf5_file = tables.open_file(filename, mode='r')
+        trace_batch, _ = generate_data3.read_samples(hdf5_file, batch * batch_size, (batch + 1) * batch_size,
+                                                     random_state=random_state)
+        if reopen:
+            hdf5_file.close()
+    if not reopen:
+        hdf5_file.close()
+    duration = time.time() - time1
+
+    results = {}
+    results["filename"] = filename
+    results["file_size_MB"] = os.path.getsize(filename) / 1e6
+    results["samples_per_second"] = n_batches * batch_size / duration
+    results["batches_per_second"] = n_batches / duration
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="convert and benchmark streaking trace data files")
+    subparsers = parser.add_subparsers(dest="command")
+
+    convert_parser = subparsers.add_parser("convert")
+    convert_parser.add_argument("filename_in")
+    convert_parser.add_argument("filename_out")
+    convert_parser.add_argument("--trace_format", default=phase_parameters.params.data_trace_format,
+                                choices=["float64", "float32", "uint16"])
+    convert_parser.add_argument("--chunk_rows", type=int, default=phase_parameters.params.data_chunk_rows)
+    convert_parser.add_argument("--complevel", type=int, default=phase_parameters.params.data_complevel)
+    convert_parser.add_argument("--complib", default="blosc:lz4")
+
+    benchmark_parser = subparsers.add_parser("benchmark")
+    benchmark_parser.add_argument("filenames", nargs="+")
+    benchmark_parser.add_argument("--batch_size", type=int, default=10)
+    benchmark_parser.add_argument("--n_batches", type=int, default=500)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        time1 = time.time()
+        convert_data_file(args.filename_in, args.filename_out, trace_format=args.trace_format,
+                          chunk_rows=args.chunk_rows, complevel=args.complevel, complib=args.complib)
+        print("{} -> {}: {} MB -> {} MB in {} s".format(
+            args.filename_in, args.filename_out, round(os.path.getsize(args.filename_in) / 1e6, 1),
+            round(os.path.getsize(args.filename_out) / 1e6, 1), round(time.time() - time1, 2)))
+
+    elif args.command == "benchmark":
+        for filename in args.filenames:
+            for reopen in [True, False]:
+                results = read_benchmark(filename, batch_size=args.batch_size, n_batches=args.n_batches,
+                                         reopen=reopen)
+                print("{} ({} MB, reopen={}): {} samples/s, {} batches/s".format(
+                    filename, round(results["file_size_MB"], 1), reopen,
+                    round(results["samples_per_second"], 1), round(results["batches_per_second"], 1)))
+
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
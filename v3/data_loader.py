@@ -0,0 +1,373 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+import tables
+import tensorflow as tf
+import phase_parameters.params
+import generate_data3
+import generate_shards
+import memmap_data
+import tf_functions
+
+# training batches from a data file with one open handle. a background
+# thread reads blocks of block_batches contiguous batches and puts the
+# batches in a bounded queue, so the next batches are read while the
+# network trains on the current one. tf_dataset is the same input as a
+# tf.data pipeline, consumed by the graph without feed_dict, online_batch
+# simulates the training data in the graph
+
+
+class DataLoader():
+    def __init__(self, filename, batch_size, prefetch_batches=None, block_batches=None, shuffle=None, seed=None,
+                 memmap_directory=None):
+        """
+        prefetch_batches: size of the batch queue
+        block_batches: batches read with one contiguous read
+        shuffle: shuffle the order of the blocks and the rows inside each block every epoch
+        defaults from phase_parameters.params
+
+        memmap_directory: memmap export of filename (memmap_data.py), the
+        blocks are sliced from the memmaps instead of read from the hdf5 file
+        """
+        if prefetch_batches is None:
+            prefetch_batches = phase_parameters.params.data_prefetch_batches
+        if block_batches is None:
+            block_batches = phase_parameters.params.data_block_batches
+        if shuffle is None:
+            shuffle = phase_parameters.params.data_shuffle
+
+        self.filename = filename
+        self.batch_size = batch_size
+        self.block_rows = block_batches * batch_size
+        self.shuffle = shuffle
+        self.random_state = np.random.RandomState(seed)
+
+        self.hdf5_file = None
+        self.memmap = None
+        if memmap_directory is not None:
+            self.memmap = memmap_data.MemmapData(memmap_directory)
+            if self.memmap.header["source"] != os.path.abspath(self.filename):
+                raise ValueError("{} is not an export of {}".format(memmap_directory, self.filename))
+            self.samples = self.memmap.samples
+        else:
+            self.hdf5_file = tables.open_file(self.filename, mode="r")
+            generate_data3.check_provenance(self.hdf5_file, self.filename)
+            self.samples = generate_data3.stored_samples(self.hdf5_file)
+
+        self.queue = queue.Queue(maxsize=prefetch_batches)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # throughput
+        self.start_time = None
+        self.delivered_rows = 0
+        self.read_rows = 0
+        self.read_time = 0.0
+        self.wait_time = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.start_time = time.time()
+            self.thread = threading.Thread(target=self.read_epochs, daemon=True)
+            self.thread.start()
+
+    def read_epochs(self):
+        try:
+            while not self.stop_event.is_set():
+                block_starts = np.arange(0, self.samples, self.block_rows)
+                if self.shuffle:
+                    self.random_state.shuffle(block_starts)
+
+                for block_start in block_starts:
+                    time1 = time.time()
+                    if self.memmap is not None:
+                        trace_block, label_block = self.memmap.read_samples(block_start, block_start + self.block_rows,
+                                                                            random_state=self.random_state)
+                    else:
+                        trace_block, label_block = generate_data3.read_samples(self.hdf5_file, block_start,
+                                                                               block_start + self.block_rows,
+                                                                               random_state=self.random_state)
+                    self.read_time += time.time() - time1
+                    self.read_rows += len(trace_block)
+
+                    if self.shuffle:
+                        order = self.random_state.permutation(len(trace_block))
+                        trace_block, label_block = trace_block[order], label_block[order]
+
+                    for row in range(0, len(trace_block), self.batch_size):
+                        if not self.put((trace_block[row:row + self.batch_size],
+                                         label_block[row:row + self.batch_size])):
+                            return
+
+        except Exception as exception:
+            # raised again by next_batch
+            self.put(exception)
+
+    def put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def next_batch(self):
+        """
+        next (traces, labels) batch, the epochs follow each other without a gap
+        """
+        self.start()
+
+        time1 = time.time()
+        item = self.queue.get()
+        self.wait_time += time.time() - time1
+
+        if isinstance(item, Exception):
+            raise item
+
+        self.delivered_rows += len(item[0])
+        return item
+
+    def throughput(self):
+        """
+        samples per second delivered to the training loop and read from the
+        file, and the fraction of the time the training loop waited for data
+        (close to 1: the training is i/o bound)
+        """
+        duration = max(time.time() - self.start_time, 1e-9) if self.start_time is not None else 1e-9
+
+        results = {}
+        results["delivered_samples_per_second"] = self.delivered_rows / duration
+        results["read_samples_per_second"] = self.read_rows / max(self.read_time, 1e-9)
+        results["wait_fraction"] = self.wait_time / duration
+        results["queued_batches"] = self.queue.qsize()
+        return results
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.hdf5_file is not None:
+            self.hdf5_file.close()
+
+
+#----------------------------------------------------------------
+# tf.data pipeline
+#----------------------------------------------------------------
+def data_filenames(filename):
+    """
+    the shards of a generate_shards manifest (.json) or a single data file
+    """
+    if filename.endswith(".json"):
+        return [shard["path"] for shard in generate_shards.open_manifest(filename)["shards"]]
+    return [filename]
+
+
+def file_blocks(filename, block_rows, num_shards=1, shard_index=0):
+    """
+    blocks of float32 (traces, labels) rows of one data file, every
+    num_shards-th block from block shard_index
+    """
+    if isinstance(filename, bytes):
+        filename = filename.decode()
+
+    with tables.open_file(filename, mode="r") as hdf5_file:
+        trace_name = generate_data3.trace_array_name(hdf5_file)
+        rows = getattr(hdf5_file.root, trace_name).nrows
+        for start in range(shard_index * block_rows, rows, num_shards * block_rows):
+            traces = generate_data3.read_traces(hdf5_file, trace_name, start, start + block_rows)
+            labels = generate_data3.read_row_labels(hdf5_file, start, start + block_rows)
+            yield traces.astype(np.float32), labels.astype(np.float32)
+
+
+def tf_dataset(filename, batch_size, shuffle_buffer=None, block_rows=None, prefetch_batches=None, seed=None,
+               num_shards=1, shard_index=0):
+    """
+    infinite tf.data pipeline of training batches: the blocks of the shards
+    are interleaved, clean only files get the shot noise levels of
+    generate_data3.augment_traces in the graph, then the rows are shuffled,
+    batched and prefetched
+
+    filename: data file or generate_shards manifest
+    num_shards, shard_index: the blocks of one worker of
+    network3.distributed_train
+    returns a dict with the "traces" and "labels" tensors of the next batch,
+    and the number of "samples" (rows) per epoch
+    """
+    if shuffle_buffer is None:
+        shuffle_buffer = phase_parameters.params.data_shuffle_buffer
+    if block_rows is None:
+        block_rows = phase_parameters.params.data_block_batches * batch_size
+    if prefetch_batches is None:
+        prefetch_batches = phase_parameters.params.data_prefetch_batches
+
+    filenames = data_filenames(filename)
+    samples = 0
+    layout = None
+    for data_filename in filenames:
+        with tables.open_file(data_filename, mode="r") as hdf5_file:
+            generate_data3.check_provenance(hdf5_file, data_filename)
+            samples += generate_data3.stored_samples(hdf5_file)
+            trace_name = generate_data3.trace_array_name(hdf5_file)
+            file_layout = (trace_name == 'trace', getattr(hdf5_file.root, trace_name).shape[1],
+                           hdf5_file.root.xuv_coefs.shape[1] + hdf5_file.root.ir_params.shape[1])
+        # all shards are parsed with the layout of the first file
+        if layout is None:
+            layout = file_layout
+        elif file_layout != layout:
+            raise ValueError("{} (clean only, trace and label size {}) does not match {} ({})".format(
+                data_filename, file_layout, filenames[0], layout))
+    clean_only, n_trace, n_label = layout
+
+    def read_file(data_filename):
+        return tf.data.Dataset.from_generator(file_blocks, output_types=(tf.float32, tf.float32),
+                                              output_shapes=([None, n_trace], [None, n_label]),
+                                              args=(data_filename, block_rows, num_shards, shard_index))
+
+    def split_rows(traces, labels):
+        return tf.data.Dataset.from_tensor_slices((traces, labels))
+
+    def augment(trace, label):
+        # the clean trace followed by one trace for each noise level
+        noisy_traces = tf_functions.add_shot_noise(tf.reshape(trace, [1, -1]), seed=seed)[0]
+        traces = tf.concat([tf.reshape(trace, [1, -1]), noisy_traces], axis=0)
+        labels = tf.tile(tf.reshape(label, [1, -1]), [tf.shape(traces)[0], 1])
+        return traces, labels
+
+    dataset = tf.data.Dataset.from_tensor_slices(filenames).repeat()
+    dataset = dataset.interleave(read_file, cycle_length=len(filenames), block_length=1)
+    dataset = dataset.flat_map(split_rows)
+    if clean_only:
+        dataset = dataset.map(augment, num_parallel_calls=4).flat_map(split_rows)
+    if shuffle_buffer > 0:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed)
+    dataset = dataset.batch(batch_size).prefetch(prefetch_batches)
+
+    traces, labels = dataset.make_one_shot_iterator().get_next()
+
+    pipeline = {}
+    pipeline["traces"] = traces
+    pipeline["labels"] = labels
+    pipeline["samples"] = samples
+    return pipeline
+
+
+#----------------------------------------------------------------
+# online generation
+#----------------------------------------------------------------
+def tf_xuv_coefs(n_samples, seed=None):
+    """
+    graph version of generate_data3.generate_xuv_coefs_batch
+    """
+    # different op seeds, ops with the same seed give the same sequence
+    def op_seed(offset):
+        return None if seed is None else seed + offset
+
+    # integration method
+    xuv_coefs_rand = tf.random_uniform([n_samples, 4], -1.0, 1.0, seed=op_seed(0))
+    xuv_coefs_int = tf.concat([tf.zeros([n_samples, 1]), xuv_coefs_rand], axis=1)
+    scalar = tf.random_uniform([n_samples, 1], seed=op_seed(1))
+    integral = tf.reduce_sum(tf.abs(xuv_coefs_int), axis=1, keepdims=True)
+    xuv_coefs_int = xuv_coefs_int * scalar / integral
+
+    # single value
+    index_rand = tf.random_uniform([n_samples], 1, 5, dtype=tf.int32, seed=op_seed(2))
+    amplitude = tf.random_uniform([n_samples, 1], -1.0, 1.0, seed=op_seed(3))
+    xuv_coefs_single = tf.one_hot(index_rand, phase_parameters.params.xuv_phase_coefs) * amplitude
+
+    choose = tf.random_uniform([n_samples], seed=op_seed(4))
+    return tf.where(choose > 0.5, xuv_coefs_int, xuv_coefs_single)
+
+
+def online_batch(batch_size, candidate_batch=None, capacity=None, n_threads=None, seed=None):
+    """
+    training batches simulated in the graph: candidate xuv coefficients and
+    ir params are drawn like generate_data3, pulses outside of the time
+    window are rejected, the traces of the accepted samples are calculated
+    with streaking_trace_batch and every trace gets a random noise level
+    (clean or one of noise_counts, like the rows of a data file)
+
+    n_threads queue runners fill a FIFOQueue of capacity rows while the
+    network trains, start them with tf.train.start_queue_runners
+
+    returns a dict with the "traces" and "labels" tensors of the next batch
+    """
+    if candidate_batch is None:
+        candidate_batch = phase_parameters.params.online_candidate_batch
+    if capacity is None:
+        capacity = phase_parameters.params.online_queue_capacity
+    if n_threads is None:
+        n_threads = phase_parameters.params.online_threads
+
+    n_trace = len(phase_parameters.params.K) * len(phase_parameters.params.delay_values)
+    n_label = phase_parameters.params.xuv_phase_coefs + 4
+
+    # time window threshold relative to a pulse with no phase
+    xuv_no_phase = tf_functions.xuv_taylor_to_E(tf.zeros([1, phase_parameters.params.xuv_phase_coefs]))
+    threshold = tf.reduce_max(tf.abs(xuv_no_phase["t"])) * phase_parameters.params.threshold_scaler
+    indexmin = phase_parameters.params.threshold_min_index
+    indexmax = phase_parameters.params.threshold_max_index
+
+    # rejection sampling of the xuv coefficients
+    xuv_coefs = tf_xuv_coefs(candidate_batch, seed=seed)
+    abs_xuv_t = tf.abs(tf_functions.xuv_taylor_to_E(xuv_coefs)["t"])
+    accepted = tf.logical_and(tf.reduce_max(abs_xuv_t[:, :indexmin], axis=1) <= threshold,
+                              tf.reduce_max(abs_xuv_t[:, indexmax:], axis=1) <= threshold)
+    xuv_coefs = tf.boolean_mask(xuv_coefs, accepted)
+    n_accepted = tf.shape(xuv_coefs)[0]
+    ir_values = tf.random_uniform([n_accepted, 4], -1.0, 1.0, seed=None if seed is None else seed + 5)
+
+    # traces of the accepted samples
+    xuv_E_prop = tf_functions.xuv_taylor_to_E(xuv_coefs)
+    ir_E_prop = tf_functions.ir_from_params(ir_values)["E_prop"]
+    traces = tf.reshape(tf_functions.streaking_trace_batch(xuv_cropped_f_in=xuv_E_prop["f_cropped"],
+                                                           ir_cropped_f_in=ir_E_prop["f_cropped"]), [-1, n_trace])
+
+    # clean trace or one of the noise levels
+    noisy_traces = tf_functions.add_shot_noise(traces, seed=None if seed is None else seed + 6)
+    all_levels = tf.concat([tf.expand_dims(traces, axis=1), noisy_traces], axis=1)
+    n_levels = 1 + len(phase_parameters.params.noise_counts)
+    level = tf.random_uniform([n_accepted], 0, n_levels, dtype=tf.int32, seed=None if seed is None else seed + 7)
+    traces = tf.reduce_sum(all_levels * tf.expand_dims(tf.one_hot(level, n_levels), axis=2), axis=1)
+
+    labels = tf.concat([xuv_coefs, ir_values], axis=1)
+
+    queue = tf.FIFOQueue(capacity, dtypes=[tf.float32, tf.float32], shapes=[[n_trace], [n_label]])
+    enqueue_op = queue.enqueue_many([traces, labels])
+    tf.train.add_queue_runner(tf.train.QueueRunner(queue, [enqueue_op] * n_threads))
+
+    traces_batch, labels_batch = queue.dequeue_many(batch_size)
+
+    online = {}
+    online["traces"] = traces_batch
+    online["labels"] = labels_batch
+    online["samples"] = phase_parameters.params.online_epoch_samples
+    online["acceptance_rate"] = tf.reduce_mean(tf.cast(accepted, tf.float32))
+    return online
+
+
+def loader_benchmark(filename, batch_size=10, n_batches=1000, train_time=0.0, **loader_kwargs):
+    """
+    batches per second of DataLoader, with train_time seconds of simulated
+    training per batch
+    """
+    loader = DataLoader(filename, batch_size, **loader_kwargs)
+    time1 = time.time()
+    for _ in range(n_batches):
+        loader.next_batch()
+        if train_time > 0:
+            time.sleep(train_time)
+    duration = time.time() - time1
+
+    results = loader.throughput()
+    results["batches_per_second"] = n_batches / duration
+    loader.close()
+    return results
+
+
+if __name__ == "__main__":
+    for shuffle in [False, True]:
+        print("shuffle={}: {}".format(shuffle, loader_benchmark('train3.hdf5', shuffle=shuffle)))
@@ -21,15 +21,19 @@ import measured_trace.get_trace as get_measured_trace
 
 class GeneticAlgorithm():
 
-    def __init__(self, generations, pop_size, run_name, measured_trace, retrieval, bootstrap=False):
+    def __init__(self, generations, pop_size, run_name, measured_trace, retrieval, bootstrap=False,
+                 eval_batch_size=50):
         """
         bootstrap: dictionary
         bootstrap["indexes"] : a numpy array of the index values for bootstrap method (2/3 length of trace)
                                     shape (-1)
+
+        eval_batch_size: number of individuals scored in one sess.run
         
         """
         print("initialize")
         self.bootstrap = bootstrap
+        self.eval_batch_size = eval_batch_size
         self.method = "Genetic Algorithm"
         self.retrieval = retrieval
         self.generations = generations
@@ -48,6 +52,20 @@ class GeneticAlgorithm():
         elif self.retrieval == "autocorrelation":
             self.trace_mse_tb = tf.summary.scalar("trace_mse", self.tf_graphs["error"]["autocorr_mse"])
 
+        # the network3.RetrievalResult fields of an individual
+        self.retrieval_nodes = {}
+        self.retrieval_nodes["xuv_f"] = self.tf_graphs["xuv_E_prop"]["f_cropped"]
+        self.retrieval_nodes["xuv_f_phase"] = self.tf_graphs["xuv_E_prop"]["phasecurve_cropped"]
+        self.retrieval_nodes["xuv_f_full"] = self.tf_graphs["xuv_E_prop"]["f"]
+        self.retrieval_nodes["xuv_t"] = self.tf_graphs["xuv_E_prop"]["t"]
+        self.retrieval_nodes["ir_f"] = self.tf_graphs["ir_E_prop"]["f_cropped"]
+        self.retrieval_nodes["input_trace"] = self.tf_graphs["measured"]["trace"]
+        self.retrieval_nodes["input_proof"] = self.tf_graphs["measured"]["proof"]
+        self.retrieval_nodes["input_auto"] = self.tf_graphs["measured"]["autocorrelation"]
+        self.retrieval_nodes["reconstructed"] = self.tf_graphs["reconstructed"]["trace"]
+        self.retrieval_nodes["reconstructed_proof"] = self.tf_graphs["reconstructed"]["proof"]
+        self.retrieval_nodes["reconstructed_auto"] = self.tf_graphs["reconstructed"]["autocorrelation"]
+
         self.sess = tf.Session()
 
         # create plot axes, share from unsupervised learning plotting
@@ -68,7 +86,7 @@ class GeneticAlgorithm():
         # create the initial population
         self.pop = self.toolbox.create_population(n=pop_size)
         # evaluate and assign fitness numbers
-        fitnesses = [self.toolbox.evaluate(p) for p in self.pop]
+        fitnesses = self.evaluate_population(self.pop)
         for ind, fit in zip(self.pop, fitnesses):
             ind.fitness.values = fit,
 
@@ -99,6 +117,32 @@ class GeneticAlgorithm():
 
         return mse
 
+    def evaluate_population(self, individuals):
+        # calculate the mse of many individuals with the batched streaking trace
+        if self.retrieval not in self.tf_graphs["error"]["batch"]:
+            raise ValueError("retrieval must be either 'normal', 'proof', or 'autocorrelation'")
+
+        fitnesses = []
+        for start in range(0, len(individuals), self.eval_batch_size):
+            batch = individuals[start:start + self.eval_batch_size]
+
+            # append 0 for linear phase
+            xuv_values = np.array([np.append([0], individual["xuv"]) for individual in batch])
+            ir_values = np.array([individual["ir"] for individual in batch])
+
+            feed_dict = {self.tf_graphs["xuv_coefs_in"]: xuv_values,
+                         self.tf_graphs["ir_values_in"]: ir_values}
+
+            if self.bootstrap == False:
+                mse_node = self.tf_graphs["error"]["batch"][self.retrieval]["mse"]
+            else:
+                mse_node = self.tf_graphs["error"]["batch"][self.retrieval]["bootstrap_mse"]
+                feed_dict[self.tf_graphs["error"]["batch"][self.retrieval]["index_ph"]] = self.bootstrap["indexes"]
+
+            fitnesses.extend(self.sess.run(mse_node, feed_dict=feed_dict))
+
+        return fitnesses
+
     def get_trace_and_rmse(self, individual):
         mse = self.calc_vecs_and_mse(individual)
         
@@ -133,98 +177,96 @@ class GeneticAlgorithm():
 
         if self.retrieval == "normal":
             if self.bootstrap == False:
-                # calculate mse for normal trace
-                trace_mse = self.sess.run(self.tf_graphs["error"]["trace_mse"], feed_dict=feed_dict)
+                # mse for normal trace
+                mse_node = self.tf_graphs["error"]["trace_mse"]
             else:
                 # evaluate with bootstrap
                 print("using bootstrap!")
                 # add bootstrap indexes to the feed dict
                 feed_dict[self.tf_graphs["error"]["bootstrap"]["normal"]["index_ph"]] = self.bootstrap["indexes"]
-                trace_mse = self.sess.run(self.tf_graphs["error"]["bootstrap"]["normal"]["mse"], feed_dict=feed_dict)
+                mse_node = self.tf_graphs["error"]["bootstrap"]["normal"]["mse"]
 
         elif self.retrieval == "proof":
             if self.bootstrap == False:
-                # calculate mse for proof trace
-                trace_mse = self.sess.run(self.tf_graphs["error"]["proof_mse"], feed_dict=feed_dict)
+                # mse for proof trace
+                mse_node = self.tf_graphs["error"]["proof_mse"]
             else:
                 # evaluate with bootstrap
                 print("using bootstrap!")
                 # add bootstrap indexes to the feed dict
                 feed_dict[self.tf_graphs["error"]["bootstrap"]["proof"]["index_ph"]] = self.bootstrap["indexes"]
-                trace_mse = self.sess.run(self.tf_graphs["error"]["bootstrap"]["proof"]["mse"], feed_dict=feed_dict)
+                mse_node = self.tf_graphs["error"]["bootstrap"]["proof"]["mse"]
 
         elif self.retrieval == "autocorrelation":
             if self.bootstrap == False:
-                # calculate mse for autocorrelation trace
-                trace_mse = self.sess.run(self.tf_graphs["error"]["autocorr_mse"], feed_dict=feed_dict)
+                # mse for autocorrelation trace
+                mse_node = self.tf_graphs["error"]["autocorr_mse"]
             else:
                 # evaluate with bootstrap
                 print("using bootstrap!")
                 # add bootstrap indexes to the feed dict
                 feed_dict[self.tf_graphs["error"]["bootstrap"]["auto"]["index_ph"]] = self.bootstrap["indexes"]
-                trace_mse = self.sess.run(self.tf_graphs["error"]["bootstrap"]["auto"]["mse"], feed_dict=feed_dict)
+                mse_node = self.tf_graphs["error"]["bootstrap"]["auto"]["mse"]
 
         else:
             raise ValueError("retrieval must be either 'normal', 'proof', or 'autocorrelation'")
 
-        if plot_and_graph:
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            # ++++++++++calculate input and reconstructed traces++++++++++
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            input_traces = dict()
-            input_traces["trace"] = self.sess.run(self.tf_graphs["measured"]["trace"])
-            input_traces["proof"] = self.sess.run(self.tf_graphs["measured"]["proof"],
-                                                   feed_dict=feed_dict)
-            input_traces["autocorrelation"] = self.sess.run(self.tf_graphs["measured"]["autocorrelation"],
-                                                   feed_dict=feed_dict)
-            recons_traces = dict()
-            recons_traces["trace"] = self.sess.run(self.tf_graphs["reconstructed"]["trace"],
-                                                   feed_dict=feed_dict)
-            recons_traces["proof"] = self.sess.run(self.tf_graphs["reconstructed"]["proof"],
-                                                   feed_dict=feed_dict)
-            recons_traces["autocorrelation"] = self.sess.run(self.tf_graphs["reconstructed"]["autocorrelation"],
-                                                   feed_dict=feed_dict)
+        if not plot_and_graph:
+            return self.sess.run(mse_node, feed_dict=feed_dict)
+
+        # traces, fields, mse and tensorboard value in one run
+        retrieval = network3.run_retrieval(self.sess, self.retrieval_nodes, feed_dict, mse=mse_node,
+                                           summary=self.trace_mse_tb)
+        trace_mse = retrieval.mse
+
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        # ++++++++++++++++++input and reconstructed traces++++++++++++
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        input_traces = dict()
+        input_traces["trace"] = retrieval.input_trace
+        input_traces["proof"] = retrieval.input_proof
+        input_traces["autocorrelation"] = retrieval.input_auto
+        recons_traces = dict()
+        recons_traces["trace"] = retrieval.reconstructed
+        recons_traces["proof"] = retrieval.reconstructed_proof
+        recons_traces["autocorrelation"] = retrieval.reconstructed_auto
+
+        xuv_f = retrieval.xuv_f[0]
+        xuv_f_phase = retrieval.xuv_f_phase[0]
+        xuv_f_full = retrieval.xuv_f_full[0]
+        xuv_t = retrieval.xuv_t[0]
+        ir_f = retrieval.ir_f[0]
+
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        # ++++++++++++++++++plot fields and traces++++++++++++++++++++
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        if self.retrieval == "normal":
+            unsupervised_retrieval.plot_images_fields(axes=self.axes, traces_meas=input_traces,
+                               traces_reconstructed=recons_traces,
+                               xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.g,
+                               run_name=self.run_name, true_fields=False, cost_function="trace",
+                               method=self.method, save_data_objs=True)
+            plt.pause(0.00001)
+
+        elif self.retrieval == "proof":
+            unsupervised_retrieval.plot_images_fields(axes=self.axes, traces_meas=input_traces,
+                               traces_reconstructed=recons_traces,
+                               xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.g,
+                               run_name=self.run_name, true_fields=False, cost_function="proof",
+                               method=self.method, save_data_objs=True)
+            plt.pause(0.00001)
+
+        elif self.retrieval == "autocorrelation":
+            unsupervised_retrieval.plot_images_fields(axes=self.axes, traces_meas=input_traces,
+                               traces_reconstructed=recons_traces,
+                               xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.g,
+                               run_name=self.run_name, true_fields=False, cost_function="autocorrelation",
+                               method=self.method, save_data_objs=True)
+            plt.pause(0.00001)
 
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            # ++++++++++++++++++++calculate fields++++++++++++++++++++++
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            xuv_f = self.sess.run(self.tf_graphs["xuv_E_prop"]["f_cropped"], feed_dict=feed_dict)[0]
-            xuv_f_phase = self.sess.run(self.tf_graphs["xuv_E_prop"]["phasecurve_cropped"], feed_dict=feed_dict)[0]
-            xuv_f_full = self.sess.run(self.tf_graphs["xuv_E_prop"]["f"], feed_dict=feed_dict)[0]
-            xuv_t = self.sess.run(self.tf_graphs["xuv_E_prop"]["t"], feed_dict=feed_dict)[0]
-            ir_f = self.sess.run(self.tf_graphs["ir_E_prop"]["f_cropped"], feed_dict=feed_dict)[0]
-
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            # ++++++++++++++++++plot fields and traces++++++++++++++++++++
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            if self.retrieval == "normal":
-                unsupervised_retrieval.plot_images_fields(axes=self.axes, traces_meas=input_traces,
-                                   traces_reconstructed=recons_traces,
-                                   xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.g,
-                                   run_name=self.run_name, true_fields=False, cost_function="trace",
-                                   method=self.method, save_data_objs=True)
-                plt.pause(0.00001)
-
-            elif self.retrieval == "proof":
-                unsupervised_retrieval.plot_images_fields(axes=self.axes, traces_meas=input_traces,
-                                   traces_reconstructed=recons_traces,
-                                   xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.g,
-                                   run_name=self.run_name, true_fields=False, cost_function="proof",
-                                   method=self.method, save_data_objs=True)
-                plt.pause(0.00001)
-
-            elif self.retrieval == "autocorrelation":
-                unsupervised_retrieval.plot_images_fields(axes=self.axes, traces_meas=input_traces,
-                                   traces_reconstructed=recons_traces,
-                                   xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.g,
-                                   run_name=self.run_name, true_fields=False, cost_function="autocorrelation",
-                                   method=self.method, save_data_objs=True)
-                plt.pause(0.00001)
-
-            # add tensorboard value
-            summ = self.sess.run(self.trace_mse_tb, feed_dict=feed_dict)
-            self.writer.add_summary(summ, global_step=self.g)
-            self.writer.flush()
+        # add tensorboard value
+        self.writer.add_summary(retrieval.summary, global_step=self.g)
+        self.writer.flush()
 
         return trace_mse
 
@@ -276,7 +318,7 @@ class GeneticAlgorithm():
 
             # Evaluate the individuals with an invalid fitness
             invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-            fitnesses = [self.toolbox.evaluate(inv) for inv in invalid_ind]
+            fitnesses = self.evaluate_population(invalid_ind)
             for ind, fit in zip(invalid_ind, fitnesses):
                 ind.fitness.values = fit,
 
@@ -361,6 +403,27 @@ class GeneticAlgorithm():
         auto_boot_mse, auto_boot_ph = network3.calc_bootstrap_error(auto_trace_recons,  measured_auto_trace)
         proof_boot_mse, proof_boot_ph = network3.calc_bootstrap_error(proof_recons, measured_proof_trace)
 
+        # ++++++++++++++++++++++++++++++++++++++++
+        # +++++batch errors for the population++++
+        # ++++++++++++++++++++++++++++++++++++++++
+        image_batch = tf_functions.streaking_trace_batch(xuv_cropped_f_in=xuv_E_prop["f_cropped"],
+                                                         ir_cropped_f_in=ir_E_prop["f_cropped"])
+        proof_recons_batch = tf.map_fn(lambda trace: tf_functions.proof_trace(trace)["proof"], image_batch)
+        auto_trace_recons_batch = tf.map_fn(tf_functions.autocorrelate, image_batch)
+
+        batch_errors = dict()
+        for retrieval, recons_batch, measured in [("normal", image_batch, tf_measured_trace),
+                                                  ("proof", proof_recons_batch, measured_proof_trace),
+                                                  ("autocorrelation", auto_trace_recons_batch, measured_auto_trace)]:
+            # mean squared error of each trace in the batch
+            squared_error = tf.square(tf.reshape(recons_batch, [tf.shape(recons_batch)[0], -1]) - tf.reshape(measured, [1, -1]))
+            index_ph = tf.placeholder(tf.int32, shape=[None])
+
+            batch_errors[retrieval] = dict()
+            batch_errors[retrieval]["mse"] = tf.reduce_mean(squared_error, axis=1)
+            batch_errors[retrieval]["bootstrap_mse"] = tf.reduce_mean(tf.gather(squared_error, index_ph, axis=1), axis=1)
+            batch_errors[retrieval]["index_ph"] = index_ph
+
         tf_graphs = dict()
         tf_graphs["measured"] = dict()
         tf_graphs["reconstructed"] = dict()
@@ -377,6 +440,7 @@ class GeneticAlgorithm():
         tf_graphs["error"]["trace_mse"] = trace_mse
         tf_graphs["error"]["autocorr_mse"] = autocorr_mse
         tf_graphs["error"]["proof_mse"] = proof_mse
+        tf_graphs["error"]["batch"] = batch_errors
 
         tf_graphs["xuv_coefs_in"] = xuv_coefs_in
         tf_graphs["ir_values_in"] = ir_values_in
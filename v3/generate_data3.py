@@ -3,11 +3,14 @@ import tensorflow as tf
 import tf_functions
 import numpy as np
 import scipy.constants as sc
-import matplotlib.pyplot as plt
 import xuv_spectrum.spectrum
 import ir_spectrum.ir_spectrum
 import time
+import os
+import argparse
+import subprocess
 import phase_parameters.params
+import kernel_constants
 
 
 
@@ -69,8 +72,33 @@ def generate_xuv_coefs():
     return xuv_coefs
 
 
+def generate_xuv_coefs_batch(n_samples, random_state=None):
+    """
+    n_samples coefficient vectors, drawn like generate_xuv_coefs
+    """
+    if random_state is None:
+        random_state = np.random.mtrand._rand
+
+    # integration method
+    xuv_coefs_rand = 2 * random_state.rand(n_samples, 4) - 1.0
+    xuv_coefs_int = np.append(np.zeros((n_samples, 1)), xuv_coefs_rand, axis=1)
+    scalar = random_state.rand(n_samples, 1)
+    integral = np.sum(np.abs(xuv_coefs_int), axis=1, keepdims=True)
+    xuv_coefs_int = xuv_coefs_int * scalar / integral
+
+    # single value
+    xuv_coefs_single = np.zeros((n_samples, 5))
+    index_rand = random_state.randint(1, 5, size=n_samples)
+    amplitude = 2 * random_state.rand(n_samples) - 1.0
+    xuv_coefs_single[np.arange(n_samples), index_rand] = amplitude
+
+    choose = random_state.rand(n_samples, 1)
+    return np.where(choose > 0.5, xuv_coefs_int, xuv_coefs_single)
+
+
 def plot_opened_file(xuv_coefs, ir_params, trace, sess, tf_graphs):
 
+    import matplotlib.pyplot as plt
     fig = plt.figure()
     gs = fig.add_gridspec(2, 2)
 
@@ -101,6 +129,7 @@ def plot_opened_file(xuv_coefs, ir_params, trace, sess, tf_graphs):
 
 def update_plots2(axes, trace, xuv_t, threshold):
 
+    import matplotlib.pyplot as plt
     axes[0].cla()
     axes[0].pcolormesh(trace, cmap='jet')
     axes[1].cla()
@@ -115,58 +144,230 @@ def update_plots2(axes, trace, xuv_t, threshold):
     plt.pause(0.001)
 
 
-def check_time_boundary(indexmin, indexmax, threshold, xuv_t, bad_samples):
-    # check to make sure the signal decreases in time
-    # indexmin = 100
-    # indexmax = 924
-
-    value_1 = np.max(np.abs(xuv_t[:indexmin]))
-    value_2 = np.max(np.abs(xuv_t[indexmax:]))
-
-
-    if value_1 > threshold or value_2 > threshold:
-    # if True:
-        bad_samples+=1
-        plt.ioff()
-        plt.figure(356)
-        plt.cla()
-        plt.plot(np.real(xuv_t))
-        plt.plot([indexmin, indexmin], [-np.max(np.real(xuv_t)), np.max(np.real(xuv_t))], color='black')
-        plt.plot([indexmax, indexmax], [-np.max(np.real(xuv_t)), np.max(np.real(xuv_t))], color='black')
-        plt.plot([indexmin, indexmax], [threshold, threshold], color='red', linestyle='dashed')
-        plt.text(0.1, 0.8, 'bad samples:{}'.format(bad_samples), transform=plt.gca().transAxes)
-        plt.show()
-        exit(0)
-
-    return None
-
+def check_time_boundary(xuv_t, threshold_dict):
+    """
+    accepted pulses of a batch xuv_t [batch, N]: the pulse must decrease
+    below the threshold outside of the index window
+    """
+    indexmin, indexmax = threshold_dict["indexes"]
+    abs_xuv_t = np.abs(xuv_t)
+    value_1 = np.max(abs_xuv_t[:, :indexmin], axis=1)
+    value_2 = np.max(abs_xuv_t[:, indexmax:], axis=1)
+    return (value_1 <= threshold_dict["threshold"]) & (value_2 <= threshold_dict["threshold"])
+
+
+def sample_xuv_coefs(sess, tf_graphs, n_samples, threshold_dict, batch_size=None, random_state=None):
+    """
+    rejection sampling of xuv coefficients: candidate batches are drawn with
+    generate_xuv_coefs_batch and the pulses outside of the time window are
+    rejected until n_samples are accepted
+
+    returns the coefficients [n_samples, 5] and a dict with the number of
+    drawn and accepted candidates and the acceptance rate
+    """
+    if batch_size is None:
+        batch_size = phase_parameters.params.xuv_sample_batch_size
+
+    accepted_coefs = []
+    n_accepted = 0
+    n_drawn = 0
+    while n_accepted < n_samples:
+        xuv_coefs_in = generate_xuv_coefs_batch(batch_size, random_state=random_state)
+        xuv_t = sess.run(tf_graphs["xuv_E_prop"]["t"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in})
+        accepted = check_time_boundary(xuv_t, threshold_dict)
+
+        accepted_coefs.append(xuv_coefs_in[accepted])
+        n_accepted += int(np.sum(accepted))
+        n_drawn += batch_size
+
+    sample_stats = {}
+    sample_stats["drawn"] = n_drawn
+    sample_stats["accepted"] = n_accepted
+    sample_stats["acceptance_rate"] = n_accepted / n_drawn
+    return np.concatenate(accepted_coefs, axis=0)[:n_samples], sample_stats
+
+
+def trace_array_name(hdf5_file):
+    if "trace" in hdf5_file.root:
+        return 'trace'
+    return 'noise_trace'
+
+
+def create_data_file(filename, xuv_coefs, clean_only=False, trace_format=None, chunk_rows=None, complevel=None,
+                     complib="blosc:lz4"):
+    """
+    empty data file with the trace, xuv_coefs and ir_params arrays
+
+    the labels are stored once per sample. the noise_trace rows of a sample
+    (the clean trace and the noise levels) have the (sample_id, count_level)
+    index in 'sample_index', count_level 0 is the clean trace and i the
+    noise level noise_counts[i-1]
+
+    trace_format: "float64", "float32" or "uint16" (quantised per trace with
+    a float32 scale in the '<trace>_scale' array)
+    chunk_rows: rows per hdf5 chunk of every array, so a training batch reads
+    the traces and labels from the same chunk of rows
+    complevel: compression level with complib, 0 for no compression
+    defaults from phase_parameters.params
+    """
+    if trace_format is None:
+        trace_format = phase_parameters.params.data_trace_format
+    if chunk_rows is None:
+        chunk_rows = phase_parameters.params.data_chunk_rows
+    if complevel is None:
+        complevel = phase_parameters.params.data_complevel
+
+    trace_atoms = {"float64": tables.Float64Atom(), "float32": tables.Float32Atom(), "uint16": tables.UInt16Atom()}
+    if trace_format not in trace_atoms:
+        raise ValueError("trace_format must be one of {}".format(sorted(trace_atoms.keys())))
 
-def generate_samples(tf_graphs, n_samples, filename, xuv_coefs, sess, axis):
-    print('creating file: ' + filename)
     num_E = len(phase_parameters.params.K)
     num_tau = len(phase_parameters.params.delay_values)
+    trace_name = 'trace' if clean_only else 'noise_trace'
+
+    filters = None
+    if complevel > 0:
+        filters = tables.Filters(complevel=complevel, complib=complib, shuffle=True)
+
+    def create(hd5file, name, atom, columns):
+        chunkshape = None if chunk_rows is None else (chunk_rows, columns)
+        hd5file.create_earray(hd5file.root, name, atom, shape=(0, columns), filters=filters,
+                              chunkshape=chunkshape, expectedrows=64000)
 
     # create hdf5 file
     with tables.open_file(filename, mode='w') as hd5file:
-        # create array for trace
-        # hd5file.create_earray(hd5file.root, 'trace', tables.Float64Atom(), shape=(0, num_E * num_tau))
-
-        # noise trace
-        hd5file.create_earray(hd5file.root, 'noise_trace', tables.Float64Atom(),shape=(0, num_E * num_tau))
+        # clean traces ('trace') or clean and noisy traces ('noise_trace')
+        create(hd5file, trace_name, trace_atoms[trace_format], num_E * num_tau)
+        if trace_format == "uint16":
+            create(hd5file, trace_name + '_scale', tables.Float32Atom(), 1)
+        if not clean_only:
+            create(hd5file, 'sample_index', tables.Int32Atom(), 2)
 
         # create array for XUV
-        hd5file.create_earray(hd5file.root, 'xuv_coefs', tables.Float64Atom(), shape=(0, xuv_coefs))
+        create(hd5file, 'xuv_coefs', tables.Float64Atom(), xuv_coefs)
 
         # create array for IR
-        hd5file.create_earray(hd5file.root, 'ir_params', tables.Float64Atom(), shape=(0, 4))
+        create(hd5file, 'ir_params', tables.Float64Atom(), 4)
 
         # proof trace
         # hd5file.create_earray(hd5file.root, 'proof_trace_noise', tables.Float64Atom(),shape=(0, num_E * num_tau))
 
 
-        hd5file.close()
-
-
+def quantise_traces(traces):
+    """
+    uint16 traces and the float32 scale of each trace, trace ~= quantised * scale
+    """
+    traces = np.asarray(traces, dtype=np.float64)
+    scale = np.max(np.abs(traces), axis=1, keepdims=True) / 65535.0
+    scale[scale == 0] = 1.0
+    quantised = np.round(np.clip(traces / scale, 0, 65535)).astype(np.uint16)
+    return quantised, scale.astype(np.float32)
+
+
+def append_trace_rows(hd5file, traces):
+    """
+    append trace rows in the format of the file
+    """
+    trace_name = trace_array_name(hd5file)
+    traces = np.asarray(traces)
+
+    if trace_name + '_scale' in hd5file.root:
+        traces, scale = quantise_traces(traces)
+        getattr(hd5file.root, trace_name + '_scale').append(scale)
+
+    getattr(hd5file.root, trace_name).append(traces)
+
+
+def append_samples(hd5file, traces, xuv_coefs, ir_params):
+    """
+    append samples in the format of the file
+
+    traces: [batch, trace] clean traces or [batch, levels, trace] clean and noisy traces
+    xuv_coefs, ir_params: [batch, ...] labels of each sample
+    """
+    traces = np.asarray(traces)
+    n_samples = len(xuv_coefs)
+
+    if traces.ndim == 3 and 'sample_index' in hd5file.root:
+        # labels once per sample, an index for every trace row
+        levels = traces.shape[1]
+        sample_ids = hd5file.root.xuv_coefs.nrows + np.arange(n_samples)
+        sample_index = np.stack([np.repeat(sample_ids, levels), np.tile(np.arange(levels), n_samples)], axis=1)
+        hd5file.root.sample_index.append(sample_index.astype(np.int32))
+
+    elif traces.ndim == 3:
+        # one label row for every trace row
+        xuv_coefs = np.repeat(xuv_coefs, traces.shape[1], axis=0)
+        ir_params = np.repeat(ir_params, traces.shape[1], axis=0)
+
+    append_trace_rows(hd5file, traces.reshape(-1, traces.shape[-1]))
+    hd5file.root.xuv_coefs.append(xuv_coefs)
+    hd5file.root.ir_params.append(ir_params)
+
+
+def read_traces(hd5file, trace_name, start, stop):
+    """
+    rows start:stop of the trace array, float32 and uint16 traces are returned as float32
+    """
+    traces = getattr(hd5file.root, trace_name)[start:stop, :]
+
+    if trace_name + '_scale' in hd5file.root:
+        scale = getattr(hd5file.root, trace_name + '_scale')[start:stop, :]
+        return traces.astype(np.float32) * scale
+
+    return traces
+
+
+def read_row_labels(hd5file, start, stop):
+    """
+    appended (xuv_coefs, ir_params) labels of the noise_trace rows start:stop,
+    resolved with 'sample_index' if the labels are stored once per sample
+    """
+    if 'sample_index' not in hd5file.root:
+        return np.append(hd5file.root.xuv_coefs[start:stop, :], hd5file.root.ir_params[start:stop, :], 1)
+
+    sample_ids = hd5file.root.sample_index[start:stop, 0]
+    if len(sample_ids) == 0:
+        n_label = hd5file.root.xuv_coefs.shape[1] + hd5file.root.ir_params.shape[1]
+        return np.zeros((0, n_label))
+
+    # the rows of a range of samples are contiguous
+    first, last = np.min(sample_ids), np.max(sample_ids) + 1
+    labels = np.append(hd5file.root.xuv_coefs[first:last, :], hd5file.root.ir_params[first:last, :], 1)
+    return labels[sample_ids - first]
+
+
+def read_noise_level(hd5file, count_level, max_samples=None, random_state=None):
+    """
+    traces and labels of every sample at one noise level: 0 is the clean
+    trace and i the noise level noise_counts[i-1]
+    """
+    if "noise_trace" in hd5file.root and 'sample_index' not in hd5file.root:
+        raise ValueError("the rows of this file have no sample_index")
+
+    if "noise_trace" in hd5file.root:
+        rows = np.nonzero(hd5file.root.sample_index[:, 1] == count_level)[0][:max_samples]
+        traces = hd5file.root.noise_trace[rows, :]
+        if 'noise_trace_scale' in hd5file.root:
+            traces = traces.astype(np.float32) * hd5file.root.noise_trace_scale[rows, :]
+        sample_ids = hd5file.root.sample_index[rows, 0]
+        labels = np.append(hd5file.root.xuv_coefs[sample_ids, :], hd5file.root.ir_params[sample_ids, :], 1)
+        return traces, labels
+
+    # clean only file
+    stop = hd5file.root.trace.shape[0] if max_samples is None else max_samples
+    traces = read_traces(hd5file, 'trace', 0, stop)
+    if count_level > 0:
+        counts = [phase_parameters.params.noise_counts[count_level - 1]]
+        traces = add_shot_noise_batch(traces, counts, random_state=random_state)[:, 0]
+    labels = np.append(hd5file.root.xuv_coefs[:stop, :], hd5file.root.ir_params[:stop, :], 1)
+    return traces, labels
+
+
+def time_boundary_threshold(sess, tf_graphs):
+    """
+    threshold and index window of check_time_boundary, relative to a pulse with no phase
+    """
     # make a sample with no phase to give a comparison
     xuv_coefs_in = np.array([[0.0, 0.0, 0.0, 0.0, 0.0]])
     xuv_t = sess.run(tf_graphs["xuv_E_prop"]["t"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in})
@@ -177,95 +378,333 @@ def generate_samples(tf_graphs, n_samples, filename, xuv_coefs, sess, axis):
     threshold_dict = {}
     threshold_dict["threshold"] = threshold
     threshold_dict["indexes"] = (indexmin, indexmax)
+    return threshold_dict
 
-    # count the number of bad samples generated
-    bad_samples = 0
 
+def generate_samples(tf_graphs, n_samples, filename, xuv_coefs, sess, axis, clean_only=False, seed=None,
+                     resume=False, checkpoint_every=None, **file_kwargs):
+    """
+    clean_only: store only the clean trace of each sample in a 'trace'
+    array, the noise levels are added when the data is read
+    (network3.GetData), which makes the file 6 times smaller. otherwise
+    the clean trace and one trace for each of
+    phase_parameters.params.noise_counts are stored in 'noise_trace'
 
-    # open and append the file
-    with tables.open_file(filename, mode='a') as hd5file:
+    seed: seed of the random stream of the coefficients, ir params and noise
 
-        for i in range(n_samples):
+    resume: continue the file from its last checkpoint instead of creating it
+    checkpoint_every: samples between checkpoints, the file is flushed and
+    the number of samples and the random state are stored in its attributes
 
-            xuv_coefs_in = generate_xuv_coefs()
+    file_kwargs: trace_format, chunk_rows, complevel, complib of create_data_file
+    """
+    if checkpoint_every is None:
+        checkpoint_every = phase_parameters.params.data_checkpoint_every
 
-            # generate time pulse from these coefficients
-            xuv_t = sess.run(tf_graphs["xuv_E_prop"]["t"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in})
+    random_state = np.random.RandomState(seed)
+    start_sample = 0
 
-            # check if the pulse is constrained in time window
-            check_time_boundary(indexmin, indexmax, threshold, xuv_t[0], bad_samples)
+    if resume and os.path.isfile(filename):
+        with tables.open_file(filename, mode='a') as hd5file:
+            check_provenance(hd5file, filename)
+            start_sample = resume_checkpoint(hd5file, random_state)
+        print('resuming file: {} at sample {}'.format(filename, start_sample))
 
-            # make ir params
-            ir_values_in = (2.0*np.random.rand(4)-1.0).reshape(1, -1)
+    else:
+        print('creating file: ' + filename)
+        create_data_file(filename, xuv_coefs, clean_only=clean_only, **file_kwargs)
+        with tables.open_file(filename, mode='a') as hd5file:
+            write_provenance(hd5file)
+            write_checkpoint(hd5file, 0, random_state)
 
-            # generate streaking trace
-            if i % 500 == 0:
-                print('generating sample {} of {}'.format(i + 1, n_samples))
-                print('bad sample count: {}'.format(bad_samples))
-                # generate the streaking trace
-                time1 = time.time()
 
-                trace = sess.run(tf_graphs["image"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in,
-                                                                tf_graphs["ir_values_in"]: ir_values_in})
+    threshold_dict = time_boundary_threshold(sess, tf_graphs)
 
-                update_plots2(axes=axis, trace=trace, xuv_t=xuv_t[0], threshold=threshold_dict)
 
+    drawn, accepted = 0, 0
 
-                time2 = time.time()
-                duration = time2 - time1
-                print('duration: {} s'.format(round(duration, 4)))
+    # open and append the file
+    with tables.open_file(filename, mode='a') as hd5file:
 
-            else:
-                trace = sess.run(tf_graphs["image"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in,
-                                                                tf_graphs["ir_values_in"]: ir_values_in})
+        for block_start in range(start_sample, n_samples, checkpoint_every):
+            block_stop = min(block_start + checkpoint_every, n_samples)
+
+            # draw the xuv coefficients of the block in bulk, pulses outside of the time window are rejected
+            block_xuv_coefs, sample_stats = sample_xuv_coefs(sess, tf_graphs, block_stop - block_start,
+                                                             threshold_dict, random_state=random_state)
+            drawn += sample_stats["drawn"]
+            accepted += sample_stats["accepted"]
+            print('xuv acceptance rate: {} ({} of {})'.format(round(accepted / drawn, 4), accepted, drawn))
+
+            for i in range(block_start, block_stop):
+
+                xuv_coefs_in = block_xuv_coefs[i - block_start].reshape(1, -1)
+
+                # make ir params
+                ir_values_in = (2.0*random_state.rand(4)-1.0).reshape(1, -1)
+
+                # generate streaking trace
+                if i % 500 == 0:
+                    print('generating sample {} of {}'.format(i + 1, n_samples))
+                    # generate the streaking trace
+                    time1 = time.time()
+
+                    xuv_t, trace = sess.run([tf_graphs["xuv_E_prop"]["t"], tf_graphs["image"]],
+                                            feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in,
+                                                       tf_graphs["ir_values_in"]: ir_values_in})
+
+                    update_plots2(axes=axis, trace=trace, xuv_t=xuv_t[0], threshold=threshold_dict)
+
+
+                    time2 = time.time()
+                    duration = time2 - time1
+                    print('duration: {} s'.format(round(duration, 4)))
+
+                else:
+                    trace = sess.run(tf_graphs["image"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in,
+                                                                    tf_graphs["ir_values_in"]: ir_values_in})
+
+                if clean_only:
+                    append_samples(hd5file, trace.reshape(1, -1), xuv_coefs_in.reshape(1, -1), ir_values_in.reshape(1, -1))
+                    continue
+
+                # the clean trace followed by one trace for each noise level
+                noise_traces = augment_traces(trace.reshape(1, -1), random_state=random_state)
+                append_samples(hd5file, noise_traces, xuv_coefs_in.reshape(1, -1), ir_values_in.reshape(1, -1))
+
+            hd5file.root._v_attrs.xuv_acceptance_rate = accepted / drawn
+            write_checkpoint(hd5file, block_stop, random_state)
+
+
+#----------------------------------------------------------------
+# provenance and checkpoints
+#----------------------------------------------------------------
+def spectrum_ids():
+    """
+    identifiers of the spectra the data is generated with
+    """
+    ids = {}
+    ids["xuv_spectrum"] = int(xuv_spectrum.spectrum.spectrum)
+    ids["xuv_spectrum_hash"] = kernel_constants.config_hash("xuv_spectrum", {
+        "Ef": xuv_spectrum.spectrum.Ef, "fmat": xuv_spectrum.spectrum.fmat})
+    ids["ir_spectrum_hash"] = kernel_constants.config_hash("ir_spectrum", {
+        "fmat_cropped": ir_spectrum.ir_spectrum.fmat_cropped, "N": ir_spectrum.ir_spectrum.N})
+    return ids
+
+
+def git_hash():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def provenance():
+    """
+    the configuration a data file is generated with
+    """
+    values = spectrum_ids()
+    values["git_hash"] = git_hash()
+    values["K"] = np.array(phase_parameters.params.K, dtype=np.float64)
+    values["delay_values"] = np.array(phase_parameters.params.delay_values, dtype=np.float64)
+    values["Ip"] = float(phase_parameters.params.Ip)
+    values["xuv_phase_coefs"] = int(phase_parameters.params.xuv_phase_coefs)
+    values["amplitude"] = float(phase_parameters.params.amplitude)
+    values["scaler_2"] = np.array(phase_parameters.params.scaler_2, dtype=np.float64)
+    values["threshold_scaler"] = float(phase_parameters.params.threshold_scaler)
+    values["threshold_min_index"] = int(phase_parameters.params.threshold_min_index)
+    values["threshold_max_index"] = int(phase_parameters.params.threshold_max_index)
+    values["noise_counts"] = np.array(phase_parameters.params.noise_counts, dtype=np.float64)
+    return values
+
+
+def write_provenance(hd5file):
+    for key, value in provenance().items():
+        setattr(hd5file.root._v_attrs, key, value)
+
+
+def check_provenance(hd5file, filename=""):
+    """
+    raise a ValueError if the data file does not match the current K / delay
+    grid, number of xuv coefficients or spectra
+    """
+    num_E = len(phase_parameters.params.K)
+    num_tau = len(phase_parameters.params.delay_values)
+    trace_width = getattr(hd5file.root, trace_array_name(hd5file)).shape[1]
+    if trace_width != num_E * num_tau:
+        raise ValueError("{}: traces have {} values, the K / delay grid has {} x {}".format(
+            filename, trace_width, num_E, num_tau))
+
+    # files written before the provenance attributes only have the size check
+    attrs = hd5file.root._v_attrs
+    if "K" not in attrs._v_attrnames:
+        return
+
+    current = provenance()
+    for key in ["K", "delay_values"]:
+        stored = np.asarray(getattr(attrs, key))
+        if stored.shape != current[key].shape or not np.allclose(stored, current[key]):
+            raise ValueError("{}: {} does not match phase_parameters.params".format(filename, key))
+    for key in ["xuv_phase_coefs", "xuv_spectrum", "xuv_spectrum_hash", "ir_spectrum_hash"]:
+        if getattr(attrs, key) != current[key]:
+            raise ValueError("{}: {} {} does not match the current {}".format(
+                filename, key, getattr(attrs, key), current[key]))
+
+
+def array_rows_per_sample(name, clean_only):
+    # the labels are stored once per sample
+    if clean_only or name in ['xuv_coefs', 'ir_params']:
+        return 1
+    return 1 + len(phase_parameters.params.noise_counts)
 
-            # add noise to trace
-            # set the maximum counts for the image
-            counts_min, counts_max = 10, 100
-            # maximum counts between two values
-            # counts = np.round(counts_min + np.random.rand() * (counts_max - counts_min))
+
+def data_array_names(hd5file):
+    trace_name = trace_array_name(hd5file)
+    names = [trace_name, 'xuv_coefs', 'ir_params']
+    for name in [trace_name + '_scale', 'sample_index']:
+        if name in hd5file.root:
+            names.append(name)
+    return names
 
 
-            # append one trace with no noise
-            hd5file.root.noise_trace.append(trace.reshape(1, -1))
-            hd5file.root.xuv_coefs.append(xuv_coefs_in.reshape(1, -1))
-            hd5file.root.ir_params.append(ir_values_in.reshape(1, -1))
+def truncate_samples(hd5file, n_samples):
+    """
+    remove the rows of every array after sample n_samples
+    """
+    clean_only = trace_array_name(hd5file) == 'trace'
+    for name in data_array_names(hd5file):
+        rows = n_samples * array_rows_per_sample(name, clean_only)
+        if getattr(hd5file.root, name).nrows > rows:
+            getattr(hd5file.root, name).truncate(rows)
+
+
+def write_checkpoint(hd5file, n_samples, random_state):
+    """
+    flush the file and store the number of complete samples and the random state
+    """
+    hd5file.flush()
+    _, keys, pos, has_gauss, cached_gaussian = random_state.get_state()
+    attrs = hd5file.root._v_attrs
+    attrs.checkpoint_samples = int(n_samples)
+    attrs.checkpoint_rng_keys = keys
+    attrs.checkpoint_rng_pos = int(pos)
+    attrs.checkpoint_rng_has_gauss = int(has_gauss)
+    attrs.checkpoint_rng_cached_gaussian = float(cached_gaussian)
+    hd5file.flush()
+
+
+def resume_checkpoint(hd5file, random_state):
+    """
+    restore the random state of the last checkpoint, remove the rows written
+    after it and return the number of samples
+    """
+    attrs = hd5file.root._v_attrs
+    if "checkpoint_samples" not in attrs._v_attrnames:
+        raise ValueError("the file has no checkpoint to resume from")
+
+    random_state.set_state(("MT19937", attrs.checkpoint_rng_keys, attrs.checkpoint_rng_pos,
+                            attrs.checkpoint_rng_has_gauss, attrs.checkpoint_rng_cached_gaussian))
+    truncate_samples(hd5file, attrs.checkpoint_samples)
+    return int(attrs.checkpoint_samples)
+
+
+def add_shot_noise_batch(traces, counts, random_state=None):
+    """
+    shot noise for a batch of traces at several count levels in one call
+
+    traces: [batch, ...] clean traces
+    counts: maximum counts of each noise level
+    random_state: np.random.RandomState of the noise, the global numpy
+    random state is used if None
+
+    returns [batch, len(counts), ...], each noisy trace normalized to a maximum of 1
+    """
+    if random_state is None:
+        random_state = np.random.mtrand._rand
+
+    traces = np.asarray(traces)
+    counts = np.asarray(counts, dtype=np.float64).reshape((1, -1) + (1,) * (traces.ndim - 1))
+
+    discrete_trace = np.round(np.expand_dims(traces, axis=1) * counts)
+    noisy_trace = random_state.poisson(lam=discrete_trace).astype(np.float64)
+
+    # normalize each noisy trace
+    reduce_axes = tuple(range(2, noisy_trace.ndim))
+    return noisy_trace / np.max(noisy_trace, axis=reduce_axes, keepdims=True)
 
 
-            for counts_val in np.linspace(counts_min, counts_max, 5):
+def augment_traces(traces, counts=None, random_state=None):
+    """
+    the clean traces followed by their noisy copies
 
-                counts_val = np.round(counts_val)
-                noise_trace = add_shot_noise(trace, counts_val)
+    traces: [batch, ...] clean traces
+    counts: noise levels, defaults to phase_parameters.params.noise_counts
 
-                # create a proof trace of the noise trace
-                # proof_trace_gen = sess.run(tf_graphs["proof_trace"], feed_dict={tf_graphs["image_noisy_placeholder"]:noise_trace})
-                # append data sample
-                # hd5file.root.proof_trace_noise.append(proof_trace_gen.reshape(1, -1))
-                # hd5file.root.trace.append(trace.reshape(1, -1))
-                hd5file.root.noise_trace.append(noise_trace.reshape(1, -1))
-                hd5file.root.xuv_coefs.append(xuv_coefs_in.reshape(1, -1))
-                hd5file.root.ir_params.append(ir_values_in.reshape(1, -1))
+    returns [batch, 1 + len(counts), ...] in the order the rows of a
+    'noise_trace' dataset are stored for each sample
+    """
+    if counts is None:
+        counts = phase_parameters.params.noise_counts
 
+    traces = np.asarray(traces, dtype=np.float64)
+    noisy_traces = add_shot_noise_batch(traces, counts, random_state=random_state)
 
-def add_shot_noise(trace_sample, counts):
+    return np.concatenate([np.expand_dims(traces, axis=1), noisy_traces], axis=1)
 
-    discrete_trace = np.round(trace_sample*counts)
 
-    noise = np.random.poisson(lam=discrete_trace) - discrete_trace
+def add_shot_noise(trace_sample, counts, random_state=None):
 
-    noisy_trace = discrete_trace + noise
+    return add_shot_noise_batch(np.expand_dims(trace_sample, axis=0), [counts], random_state=random_state)[0, 0]
 
-    noisy_trace_normalized = noisy_trace / np.max(noisy_trace)
 
-    return noisy_trace_normalized
 
 
+def stored_samples(hdf5_file):
+    """
+    number of traces in the file, a file with only clean traces ('trace')
+    has 1 + len(noise_counts) traces per stored sample
+    """
+    if "noise_trace" in hdf5_file.root:
+        return hdf5_file.root.noise_trace.shape[0]
 
+    return hdf5_file.root.trace.shape[0] * (1 + len(phase_parameters.params.noise_counts))
 
-if __name__ == "__main__":
 
+def read_samples(hdf5_file, start, stop, random_state=None):
+    """
+    traces and labels of rows start:stop in the order of the 'noise_trace'
+    layout. for clean only files the noise levels are added here
+    """
+    if "noise_trace" in hdf5_file.root:
+        appended_label_batch = read_row_labels(hdf5_file, start, stop)
+        trace_batch = read_traces(hdf5_file, 'noise_trace', start, stop)
+        return trace_batch, appended_label_batch
+
+    # row i is noise level i % levels of stored sample i // levels
+    levels = 1 + len(phase_parameters.params.noise_counts)
+    stop = min(stop, hdf5_file.root.trace.shape[0] * levels)
+    n_rows = max(stop - start, 0)
+    first = start // levels
+    last = first if n_rows == 0 else (stop - 1) // levels + 1
+    offset = start - first * levels
+
+    xuv_coefs = np.repeat(hdf5_file.root.xuv_coefs[first:last, :], levels, axis=0)
+    ir_params = np.repeat(hdf5_file.root.ir_params[first:last, :], levels, axis=0)
+    appended_label_batch = np.append(xuv_coefs, ir_params, 1)[offset:offset + n_rows]
+
+    clean_traces = read_traces(hdf5_file, 'trace', first, last)
+    trace_batch = augment_traces(clean_traces, random_state=random_state)
+    trace_batch = trace_batch.reshape(-1, clean_traces.shape[1])[offset:offset + n_rows]
+
+    return trace_batch, appended_label_batch
+
+
+def build_graphs():
+    """
+    xuv, ir and streaking trace graphs used to generate samples
+    """
     # initialize XUV generator
-    xuv_phase_coeffs = phase_parameters.params.xuv_phase_coefs
     xuv_coefs_in = tf.placeholder(tf.float32, shape=[None, phase_parameters.params.xuv_phase_coefs])
     xuv_E_prop = tf_functions.xuv_taylor_to_E(xuv_coefs_in)
 
@@ -288,19 +727,41 @@ if __name__ == "__main__":
     tf_graphs["image"] = image
     tf_graphs["image_noisy_placeholder"] = image_noisy_placeholder
     tf_graphs["proof_trace"] = proof_trace
+    return tf_graphs
+
+
+if __name__ == "__main__":
+
+    import matplotlib.pyplot as plt
+    parser = argparse.ArgumentParser(description="generate the training and test data files")
+    parser.add_argument("--n_train", type=int, default=64000)
+    parser.add_argument("--n_test", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resume", action="store_true", help="continue the files from their last checkpoint")
+    parser.add_argument("--checkpoint_every", type=int, default=phase_parameters.params.data_checkpoint_every)
+    parser.add_argument("--clean_only", action="store_true",
+                        help="store only the clean training traces, the noise is added when they are read")
+    args = parser.parse_args()
+
+    tf_graphs = build_graphs()
 
     # create plot to show samples as they are generated
     _, ax = plt.subplots(2, 1, figsize=(5, 5))
     with tf.Session() as sess:
 
 
-        generate_samples(tf_graphs=tf_graphs, n_samples=64000,
+        # the noise levels of each training sample are stored, with --clean_only
+        # only the clean traces and the noise is added by network3.GetData
+        generate_samples(tf_graphs=tf_graphs, n_samples=args.n_train,
                          filename="train3.hdf5",
-                         xuv_coefs=phase_parameters.params.xuv_phase_coefs, sess=sess, axis=ax)
+                         xuv_coefs=phase_parameters.params.xuv_phase_coefs, sess=sess, axis=ax,
+                         clean_only=args.clean_only, seed=args.seed, resume=args.resume,
+                         checkpoint_every=args.checkpoint_every)
 
-        generate_samples(tf_graphs=tf_graphs, n_samples=500,
+        generate_samples(tf_graphs=tf_graphs, n_samples=args.n_test,
                          filename="test3.hdf5",
-                         xuv_coefs=phase_parameters.params.xuv_phase_coefs, sess=sess, axis=ax)
+                         xuv_coefs=phase_parameters.params.xuv_phase_coefs, sess=sess, axis=ax,
+                         seed=args.seed + 1, resume=args.resume, checkpoint_every=args.checkpoint_every)
 
 
         # test open the file
@@ -308,7 +769,10 @@ if __name__ == "__main__":
         with tables.open_file('train3.hdf5', mode='r') as hd5file:
             xuv_coefs = hd5file.root.xuv_coefs[index, :]
             ir_params = hd5file.root.ir_params[index, :]
-            trace = hd5file.root.noise_trace[index, :]
+            # the clean trace is the first row of the sample
+            trace_name = trace_array_name(hd5file)
+            row = index * array_rows_per_sample(trace_name, trace_name == 'trace')
+            trace = read_traces(hd5file, trace_name, row, row + 1)[0]
 
         plot_opened_file(xuv_coefs=xuv_coefs, ir_params=ir_params,
                          trace=trace, sess=sess, tf_graphs=tf_graphs)
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import tables
+import phase_parameters.params
+import generate_data3
+
+# parallel version of generate_data3.generate_samples. the sample range is
+# split across worker processes, each worker writes its own hdf5 shard and a
+# json manifest joins the shards. samples are generated in blocks of
+# block_samples, every block is seeded from (seed, block index), so the data
+# does not depend on the number of workers and a shard can be resumed after
+# a crash from its last complete block
+#
+# python generate_shards.py --n_samples 64000 --workers 8 --prefix train3 --clean_only --merge train3.hdf5
+
+
+def shard_ranges(n_samples, n_shards, block_samples):
+    # shards start at a block boundary
+    n_blocks = int(np.ceil(n_samples / block_samples))
+    bounds = np.minimum(np.linspace(0, n_blocks, n_shards + 1).astype(int) * block_samples, n_samples)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def shard_filename(prefix, shard):
+    return "{}_shard{:03d}.hdf5".format(prefix, shard)
+
+
+def manifest_filename(prefix):
+    return "{}_manifest.json".format(prefix)
+
+
+def resume_shard(hd5file, block_samples, shard_samples):
+    """
+    number of samples in the complete blocks of the shard, rows of a block
+    that was only partially written are removed
+    """
+    clean_only = generate_data3.trace_array_name(hd5file) == 'trace'
+    completed = min(getattr(hd5file.root, name).nrows // generate_data3.array_rows_per_sample(name, clean_only)
+                    for name in generate_data3.data_array_names(hd5file))
+    if completed < shard_samples:
+        completed = (completed // block_samples) * block_samples
+    generate_data3.truncate_samples(hd5file, completed)
+
+    return completed
+
+
+def create_shard(filename, clean_only, file_kwargs):
+    generate_data3.create_data_file(filename, phase_parameters.params.xuv_phase_coefs, clean_only=clean_only,
+                                    **file_kwargs)
+    with tables.open_file(filename, mode='a') as hd5file:
+        generate_data3.write_provenance(hd5file)
+
+
+def generate_shard(shard_config):
+    """
+    worker: generate samples start:stop of the manifest into one shard
+    """
+    # imported in the worker process so every process has its own tensorflow
+    import tensorflow as tf
+
+    shard = shard_config["shard"]
+    filename = shard_config["filename"]
+    start, stop = shard_config["start"], shard_config["stop"]
+    clean_only = shard_config["clean_only"]
+    seed = shard_config["seed"]
+    file_kwargs = shard_config["file_kwargs"]
+
+    completed = 0
+    if os.path.isfile(filename):
+        try:
+            with tables.open_file(filename, mode='a') as hd5file:
+                generate_data3.check_provenance(hd5file, filename)
+                completed = resume_shard(hd5file, shard_config["block_samples"], stop - start)
+        except (tables.HDF5ExtError, tables.NoSuchNodeError):
+            print("shard {}: {} is not readable, starting again".format(shard, filename))
+            completed = 0
+            create_shard(filename, clean_only, file_kwargs)
+    else:
+        create_shard(filename, clean_only, file_kwargs)
+
+    stats = {}
+    stats["shard"] = shard
+    stats["resumed_at"] = completed
+    stats["samples"] = 0
+    stats["drawn"] = 0
+    stats["acceptance_rate"] = 0.0
+    stats["duration"] = 0.0
+
+    if start + completed >= stop:
+        stats["samples_per_second"] = 0.0
+        return stats
+
+    if completed > 0:
+        print("shard {}: resuming at sample {} of {}".format(shard, completed, stop - start))
+
+    tf_graphs = generate_data3.build_graphs()
+    config = tf.ConfigProto(intra_op_parallelism_threads=shard_config["threads"],
+                            inter_op_parallelism_threads=shard_config["threads"])
+
+    with tf.Session(config=config) as sess:
+        threshold_dict = generate_data3.time_boundary_threshold(sess, tf_graphs)
+
+        block_samples = shard_config["block_samples"]
+        time1 = time.time()
+        with tables.open_file(filename, mode='a') as hd5file:
+            for block_start in range(start + completed, stop, block_samples):
+                block_stop = min(block_start + block_samples, stop)
+                n_block = block_stop - block_start
+
+                # blocks are independent of the worker that generates them
+                random_state = np.random.RandomState([seed, block_start // block_samples])
+
+                # bulk rejection sampling of the xuv pulses
+                xuv_coefs, sample_stats = generate_data3.sample_xuv_coefs(sess, tf_graphs, n_block, threshold_dict,
+                                                                          random_state=random_state)
+                ir_values = 2.0*random_state.rand(n_block, 4) - 1.0
+                stats["drawn"] += sample_stats["drawn"]
+
+                for i in range(n_block):
+                    xuv_coefs_in = xuv_coefs[i].reshape(1, -1)
+                    ir_values_in = ir_values[i].reshape(1, -1)
+                    trace = sess.run(tf_graphs["image"], feed_dict={tf_graphs["xuv_coefs_in"]: xuv_coefs_in,
+                                                                    tf_graphs["ir_values_in"]: ir_values_in})
+
+                    if clean_only:
+                        traces = trace.reshape(1, -1)
+                    else:
+                        traces = generate_data3.augment_traces(trace.reshape(1, -1), random_state=random_state)
+
+                    generate_data3.append_samples(hd5file, traces, xuv_coefs_in, ir_values_in)
+
+                stats["samples"] += n_block
+                stats["acceptance_rate"] = stats["samples"] / stats["drawn"]
+                # a complete block is on disk
+                hd5file.flush()
+
+                if (block_stop - start) % shard_config["report_every"] < block_samples or block_stop == stop:
+                    duration = time.time() - time1
+                    print("shard {}: sample {} of {}, {} samples/s, xuv acceptance rate: {}".format(
+                        shard, block_stop - start, stop - start, round(stats["samples"] / duration, 2),
+                        round(stats["acceptance_rate"], 4)))
+                    sys.stdout.flush()
+
+    stats["duration"] = time.time() - time1
+    stats["samples_per_second"] = stats["samples"] / stats["duration"]
+    return stats
+
+
+#----------------------------------------------------------------
+# manifest
+#----------------------------------------------------------------
+def write_manifest(filename, manifest):
+    temporary_filename = "{}.{}.tmp".format(filename, os.getpid())
+    with open(temporary_filename, "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(temporary_filename, filename)
+
+
+def open_manifest(filename):
+    with open(filename, "r") as file:
+        manifest = json.load(file)
+    # shard filenames are relative to the manifest
+    directory = os.path.dirname(os.path.abspath(filename))
+    for shard in manifest["shards"]:
+        shard["path"] = os.path.join(directory, shard["filename"])
+    return manifest
+
+
+def manifest_samples(manifest):
+    """
+    number of rows of the joined shards, in the layout of generate_data3.read_samples
+    """
+    samples = 0
+    for shard in manifest["shards"]:
+        with tables.open_file(shard["path"], mode='r') as hd5file:
+            samples += generate_data3.stored_samples(hd5file)
+    return samples
+
+
+def read_manifest_samples(manifest, start, stop, random_state=None):
+    """
+    traces and labels of rows start:stop of the joined shards
+    """
+    trace_batches, label_batches = [], []
+    shard_start = 0
+    for shard in manifest["shards"]:
+        if shard_start >= stop:
+            break
+        with tables.open_file(shard["path"], mode='r') as hd5file:
+            shard_samples = generate_data3.stored_samples(hd5file)
+            if start < shard_start + shard_samples:
+                trace_batch, label_batch = generate_data3.read_samples(hd5file, max(start - shard_start, 0),
+                                                                       stop - shard_start, random_state=random_state)
+                trace_batches.append(trace_batch)
+                label_batches.append(label_batch)
+        shard_start += shard_samples
+
+    if not trace_batches:
+        raise ValueError("rows {}:{} are outside of the dataset".format(start, stop))
+
+    return np.concatenate(trace_batches, axis=0), np.concatenate(label_batches, axis=0)
+
+
+def merge_shards(manifest, filename, chunk_samples=1000):
+    """
+    copy the shards into one file in the layout read by network3.GetData
+    """
+    generate_data3.create_data_file(filename, phase_parameters.params.xuv_phase_coefs,
+                                    clean_only=manifest["clean_only"], **manifest["file_kwargs"])
+
+    with tables.open_file(filename, mode='a') as merged_file:
+        generate_data3.write_provenance(merged_file)
+        for shard in manifest["shards"]:
+            # sample ids of the shard start after the samples of the previous shards
+            sample_offset = merged_file.root.xuv_coefs.nrows
+            with tables.open_file(shard["path"], mode='r') as hd5file:
+                generate_data3.check_provenance(hd5file, shard["path"])
+                for name in generate_data3.data_array_names(hd5file):
+                    rows = getattr(hd5file.root, name).nrows
+                    for row in range(0, rows, chunk_samples):
+                        values = getattr(hd5file.root, name)[row:row + chunk_samples]
+                        if name == 'sample_index':
+                            values = values + np.array([[sample_offset, 0]], dtype=values.dtype)
+                        getattr(merged_file.root, name).append(values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="generate streaking trace samples in parallel hdf5 shards")
+    parser.add_argument("--n_samples", type=int, default=64000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--prefix", default="train3", help="shards are written to <prefix>_shardNNN.hdf5")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clean_only", action="store_true", help="store only the clean traces")
+    parser.add_argument("--threads", type=int, default=None, help="tensorflow threads per worker")
+    parser.add_argument("--overwrite", action="store_true", help="start again instead of resuming the shards")
+    parser.add_argument("--merge", default=None, help="also copy the shards into this file")
+    parser.add_argument("--trace_format", default=phase_parameters.params.data_trace_format,
+                        choices=["float64", "float32", "uint16"])
+    parser.add_argument("--chunk_rows", type=int, default=phase_parameters.params.data_chunk_rows)
+    parser.add_argument("--complevel", type=int, default=phase_parameters.params.data_complevel,
+                        help="blosc:lz4 compression level, 0 for no compression")
+    parser.add_argument("--report_every", type=int, default=500)
+    parser.add_argument("--block_samples", type=int, default=100,
+                        help="samples per seeded block, shards are resumed from the last complete block")
+    args = parser.parse_args(argv)
+
+    manifest_file = manifest_filename(args.prefix)
+    if os.path.isfile(manifest_file) and not args.overwrite:
+        # resume with the partition of the existing manifest
+        manifest = open_manifest(manifest_file)
+        for name in ["n_samples", "seed", "clean_only", "block_samples"]:
+            if manifest[name] != getattr(args, name):
+                raise ValueError("{} does not match {}: {} != {}, use --overwrite to start again".format(
+                    name, manifest_file, getattr(args, name), manifest[name]))
+        print("resuming {}".format(manifest_file))
+
+    else:
+        manifest = {}
+        manifest["n_samples"] = args.n_samples
+        manifest["seed"] = args.seed
+        manifest["clean_only"] = args.clean_only
+        manifest["block_samples"] = args.block_samples
+        manifest["noise_counts"] = [float(counts) for counts in phase_parameters.params.noise_counts]
+        manifest["file_kwargs"] = {"trace_format": args.trace_format, "chunk_rows": args.chunk_rows,
+                                   "complevel": args.complevel}
+        manifest["shards"] = []
+        for shard, (start, stop) in enumerate(shard_ranges(args.n_samples, args.workers, args.block_samples)):
+            filename = shard_filename(args.prefix, shard)
+            if os.path.isfile(filename):
+                os.remove(filename)
+            manifest["shards"].append({"filename": os.path.basename(filename), "start": start, "stop": stop})
+        write_manifest(manifest_file, manifest)
+        manifest = open_manifest(manifest_file)
+
+    n_workers = len(manifest["shards"])
+    threads = args.threads
+    if threads is None:
+        threads = max(1, multiprocessing.cpu_count() // n_workers)
+
+    shard_configs = []
+    for shard, shard_info in enumerate(manifest["shards"]):
+        shard_config = {}
+        shard_config["shard"] = shard
+        shard_config["filename"] = shard_info["path"]
+        shard_config["start"] = shard_info["start"]
+        shard_config["stop"] = shard_info["stop"]
+        shard_config["clean_only"] = manifest["clean_only"]
+        shard_config["seed"] = manifest["seed"]
+        shard_config["file_kwargs"] = manifest["file_kwargs"]
+        shard_config["threads"] = threads
+        shard_config["report_every"] = args.report_every
+        shard_config["block_samples"] = manifest["block_samples"]
+        shard_configs.append(shard_config)
+
+    time1 = time.time()
+    # spawn: tensorflow can not be used in a forked process
+    with multiprocessing.get_context("spawn").Pool(n_workers) as pool:
+        all_stats = pool.map(generate_shard, shard_configs, chunksize=1)
+    duration = time.time() - time1
+
+    for stats in all_stats:
+        print("shard {}: {} samples ({} resumed), {} samples/s, xuv acceptance rate: {}".format(
+            stats["shard"], stats["samples"], stats["resumed_at"], round(stats["samples_per_second"], 2),
+            round(stats["acceptance_rate"], 4)))
+    total_samples = sum(stats["samples"] for stats in all_stats)
+    print("total: {} samples in {} s, {} samples/s".format(total_samples, round(duration, 2),
+                                                          round(total_samples / duration, 2)))
+
+    if args.merge is not None:
+        print("merging shards into {}".format(args.merge))
+        merge_shards(manifest, args.merge)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import time
+import resource
+import argparse
+import multiprocessing
+
+# build time and memory of network3.setup_neural_net in each graph mode, every
+# mode is built in a new process so the peak rss is that of one graph
+#
+# python graph_benchmark.py --modes all train train_inline infer unsupervised
+
+
+def build_graph(mode):
+    import tensorflow as tf
+    import network3
+
+    rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    time1 = time.time()
+    nn_nodes = network3.setup_neural_net(mode=mode)
+    build_time = time.time() - time1
+
+    time1 = time.time()
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer())
+        init_time = time.time() - time1
+
+        # the phase net output is built in every mode
+        sess.run(nn_nodes["general"]["phase_net_output"]["predicted_coefficients_params"],
+                 feed_dict={nn_nodes["general"]["x_in"]: network3.get_measured_trace.trace.reshape(1, -1)})
+
+    results = {}
+    results["mode"] = mode
+    results["build_time"] = build_time
+    results["init_time"] = init_time
+    results["operations"] = len(tf.get_default_graph().get_operations())
+    results["variables"] = len(tf.global_variables())
+    # kilobytes on linux
+    results["peak_rss_MB"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    results["import_rss_MB"] = rss_start / 1e3
+    return results
+
+
+def graph_benchmark(modes):
+    results = []
+    for mode in modes:
+        # spawn: a new interpreter without the graphs of the previous modes
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            results.append(pool.apply(build_graph, (mode,)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="build time and peak memory of the network3 graph modes")
+    parser.add_argument("--modes", nargs="+", default=["all", "train", "train_inline", "evaluate", "infer",
+                                                             "unsupervised"])
+    args = parser.parse_args(argv)
+
+    for results in graph_benchmark(args.modes):
+        print("{}: build {} s, init {} s, {} operations, {} variables, peak rss {} MB ({} MB after imports)".format(
+            results["mode"], round(results["build_time"], 2), round(results["init_time"], 2),
+            results["operations"], results["variables"], round(results["peak_rss_MB"], 1),
+            round(results["import_rss_MB"], 1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import hashlib
+import weakref
+import numpy as np
+import scipy.constants as sc
+from scipy.special import factorial
+import xuv_spectrum.spectrum
+import ir_spectrum.ir_spectrum
+import phase_parameters.params
+
+# constant arrays for the streaking trace and xuv graphs. they only depend on
+# the spectrum and phase_parameters.params, so they are computed once per
+# configuration, saved in cache_dir (keyed by a hash of the inputs) and
+# shared between all graphs in the process
+
+
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernel_cache")
+use_disk_cache = True
+
+# configuration hash -> dict of numpy arrays
+memory_cache = {}
+# tf graph -> {(configuration hash, name, dtype): tf constant}
+graph_constants = weakref.WeakKeyDictionary()
+
+
+def config_hash(name, inputs):
+    sha = hashlib.sha1(name.encode())
+    for key in sorted(inputs.keys()):
+        value = np.ascontiguousarray(np.asarray(inputs[key]))
+        sha.update(key.encode())
+        sha.update(str(value.dtype).encode())
+        sha.update(str(value.shape).encode())
+        sha.update(value.tobytes())
+    return name + "_" + sha.hexdigest()[:16]
+
+
+def cached(name, inputs, compute):
+    """
+    return the arrays from compute(**inputs), from memory or the disk cache
+    if they were already calculated for these inputs
+    """
+    key = config_hash(name, inputs)
+    if key in memory_cache:
+        return memory_cache[key]
+
+    filename = os.path.join(cache_dir, key + ".npz")
+    if use_disk_cache and os.path.isfile(filename):
+        with np.load(filename) as data:
+            values = {array_name: data[array_name] for array_name in data.files}
+
+    else:
+        values = compute(**inputs)
+        if use_disk_cache:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, exist_ok=True)
+            # write to a temporary file first so other processes never read a partial file
+            temporary_filename = "{}.{}.tmp".format(filename, os.getpid())
+            with open(temporary_filename, "wb") as file:
+                np.savez(file, **values)
+            os.replace(temporary_filename, filename)
+
+    values["hash"] = key
+    memory_cache[key] = values
+    return values
+
+
+def graph_constant(constants, name, dtype, value=None):
+    """
+    tf constant of constants[name] (or value) in the default graph, created
+    once per graph and reused by every graph builder calling this
+    """
+    # imported here so the numpy backend can use the constants without tensorflow
+    import tensorflow as tf
+
+    graph = tf.get_default_graph()
+    if graph not in graph_constants:
+        graph_constants[graph] = {}
+
+    key = (constants["hash"], name, dtype)
+    if key not in graph_constants[graph]:
+        if value is None:
+            value = constants[name]
+        # create the constant outside of any while loop (tf.map_fn) so it can be used everywhere
+        with tf.init_scope():
+            graph_constants[graph][key] = tf.constant(value, dtype=dtype)
+
+    return graph_constants[graph][key]
+
+
+def compute_streaking_constants(K_eV, Ip, tmat, dt, N, delay_values, ir_N, ir_df):
+    # convert K to atomic units
+    K = K_eV * sc.electron_volt  # joules
+    K = K / sc.physical_constants['atomic unit of energy'][0]  # a.u.
+    p = np.sqrt(2 * K)
+
+    # fourier transform term (K, xuv_time)
+    e_fft = np.exp(-1j * (K.reshape(-1, 1) + Ip) * tmat.reshape(1, -1))
+
+    # N of the ir required to match the xuv timestep
+    N_req = int(1 / (dt * ir_df))
+    pad_2 = int((N_req - ir_N) / 2)
+
+    # ir t axis
+    ir_taxis = dt * np.arange(-N_req/2, N_req/2, 1)
+
+    # indexes of tau values on the ir t axis
+    center_indexes = np.argmin(np.abs(delay_values.reshape(-1, 1) - ir_taxis.reshape(1, -1)), axis=1)
+    rangevals = np.array(range(N)) - int((N/2))
+    delayindexes = center_indexes.reshape(1, -1) + rangevals.reshape(-1, 1)
+
+    constants = {}
+    constants["K"] = K
+    constants["p"] = p
+    constants["e_fft"] = e_fft
+    constants["N_req"] = np.array(N_req)
+    constants["pad_2"] = np.array(pad_2)
+    constants["ir_taxis"] = ir_taxis
+    constants["center_indexes"] = center_indexes
+    constants["delayindexes"] = delayindexes.astype(np.int32)
+    return constants
+
+
+def streaking_constants(delay_values=None):
+    """
+    K / p grids, fourier term e_fft (K, xuv_time), matched ir time axis and
+    the delayindexes (xuv_time, tau) gather table of the streaking trace
+
+    delay_values: delays (a.u.) on the ir t axis, defaults to the delays of
+    phase_parameters.params
+    """
+    if delay_values is None:
+        delay_values = phase_parameters.params.delay_values/sc.physical_constants['atomic unit of time'][0]
+
+    inputs = {}
+    inputs["K_eV"] = np.array(phase_parameters.params.K, dtype=np.float64)
+    inputs["Ip"] = phase_parameters.params.Ip
+    inputs["tmat"] = xuv_spectrum.spectrum.tmat
+    inputs["dt"] = xuv_spectrum.spectrum.dt
+    inputs["N"] = xuv_spectrum.spectrum.N
+    inputs["delay_values"] = np.array(delay_values, dtype=np.float64)
+    inputs["ir_N"] = ir_spectrum.ir_spectrum.N
+    inputs["ir_df"] = ir_spectrum.ir_spectrum.df
+
+    return cached("streaking", inputs, compute_streaking_constants)
+
+
+def compute_band_constants(N, indexmin, indexmax, ir_N, start_index, end_index, N_req, pad_2, delayindexes):
+    # tf_ifft(x, shift=s) of a length L vector is
+    # y[n] = (1/L) * sum_q x[q] * exp(2*pi*i*(q + s)*(n - s)/L)
+    # so the fields only need the columns q of the nonzero band
+
+    # xuv (N, n_xuv_band)
+    n_xuv = np.arange(N).reshape(-1, 1)
+    q_xuv = np.arange(indexmin, indexmax).reshape(1, -1)
+    xuv_basis = np.exp(2j * np.pi * (q_xuv + int(N/2)) * (n_xuv - int(N/2)) / N) / N
+
+    # ir on the matched xuv time step, only on the span of the ir time axis
+    # reached by the delays (span, n_ir_band), including the scale factor
+    L = ir_N + 2 * pad_2
+    s = int(N_req/2)
+    index_min = int(np.min(delayindexes))
+    index_max = int(np.max(delayindexes)) + 1
+    q_ir = (pad_2 + np.arange(start_index, end_index)).reshape(1, -1)
+    n_ir = np.arange(index_min, index_max).reshape(-1, 1)
+    ir_basis = (N_req / ir_N) * np.exp(2j * np.pi * (q_ir + s) * (n_ir - s) / L) / L
+
+    # sum of the ir field before the span, the start value of the cumsum of A(t)
+    n_before = np.arange(index_min).reshape(-1, 1)
+    ir_start_weights = np.sum((N_req / ir_N) * np.exp(2j * np.pi * (q_ir + s) * (n_before - s) / L) / L, axis=0)
+
+    constants = {}
+    constants["xuv_basis"] = xuv_basis
+    constants["ir_basis"] = ir_basis
+    constants["ir_start_weights"] = ir_start_weights
+    constants["index_min"] = np.array(index_min)
+    constants["delayindexes_span"] = (delayindexes - index_min).astype(np.int32)
+    return constants
+
+
+def band_constants():
+    """
+    band limited fourier matrices for the cropped xuv and ir spectra, the
+    xuv time domain field from the xuv band and the ir field on the span of
+    delayindexes from the ir band (see compute_band_constants)
+    """
+    streak_constants = streaking_constants()
+
+    inputs = {}
+    inputs["N"] = xuv_spectrum.spectrum.N
+    inputs["indexmin"] = xuv_spectrum.spectrum.indexmin
+    inputs["indexmax"] = xuv_spectrum.spectrum.indexmax
+    inputs["ir_N"] = ir_spectrum.ir_spectrum.N
+    inputs["start_index"] = ir_spectrum.ir_spectrum.start_index
+    inputs["end_index"] = ir_spectrum.ir_spectrum.end_index
+    inputs["N_req"] = int(streak_constants["N_req"])
+    inputs["pad_2"] = int(streak_constants["pad_2"])
+    inputs["delayindexes"] = streak_constants["delayindexes"]
+
+    return cached("band", inputs, compute_band_constants)
+
+
+def compute_taylor_constants(fmat, f0, xuv_phase_coefs, amplitude, scaler_2):
+    exponents = np.array(range(xuv_phase_coefs)) + 1
+    fmat_taylor = fmat - f0
+
+    constants = {}
+    constants["factorials"] = factorial(exponents)
+    constants["exponents"] = exponents
+    # fmat raised to the power of each taylor term (xuv_phase_coefs, N)
+    constants["exp_mat_fmat"] = fmat_taylor.reshape(1, -1) ** exponents.reshape(-1, 1)
+    # amplitude scales with exponent
+    constants["amplitude_scaler"] = amplitude ** exponents
+    constants["scaler_2"] = np.array(scaler_2)
+    return constants
+
+
+def taylor_constants():
+    """
+    factorial, exponent and fmat power tables of xuv_taylor_to_E
+    """
+    inputs = {}
+    inputs["fmat"] = xuv_spectrum.spectrum.fmat
+    inputs["f0"] = xuv_spectrum.spectrum.f0
+    inputs["xuv_phase_coefs"] = phase_parameters.params.xuv_phase_coefs
+    inputs["amplitude"] = phase_parameters.params.amplitude
+    inputs["scaler_2"] = np.array(phase_parameters.params.scaler_2, dtype=np.float64)
+
+    return cached("taylor", inputs, compute_taylor_constants)
+
+
+def clear_disk_cache():
+    if os.path.isdir(cache_dir):
+        for filename in os.listdir(cache_dir):
+            if filename.endswith(".npz"):
+                os.remove(os.path.join(cache_dir, filename))
@@ -0,0 +1,219 @@
+import os
+import time
+import pickle
+import numpy as np
+import tables
+import scipy.spatial
+import phase_parameters.params
+import generate_data3
+import memmap_data
+
+# nearest neighbour index over the samples of a data file, stored next to it
+# as <data file>_index_<network>.p
+#
+# label space: the converted ir parameters (network3.convert_ir_params) and
+# xuv coefs 1.., the squared distance is the cost of
+# net_test1.get_closest_params
+# trace space (optional): the clean traces projected on their first
+# pca_components principal components
+
+
+def index_filename(data_filename, network_name):
+    return os.path.splitext(data_filename)[0] + "_index_" + network_name + ".p"
+
+
+def sample_rows(hdf5_file):
+    """
+    row (in the order of generate_data3.read_samples) of the clean trace of
+    every stored sample, the rows of the stored traces and the labels
+    """
+    levels = 1 + len(phase_parameters.params.noise_counts)
+
+    if "noise_trace" not in hdf5_file.root:
+        n_samples = hdf5_file.root.trace.nrows
+        trace_rows = np.arange(n_samples)
+        rows = trace_rows * levels
+        labels = np.append(hdf5_file.root.xuv_coefs[:, :], hdf5_file.root.ir_params[:, :], 1)
+
+    elif "sample_index" in hdf5_file.root:
+        sample_index = hdf5_file.root.sample_index[:, :]
+        rows = np.nonzero(sample_index[:, 1] == 0)[0]
+        rows = rows[np.argsort(sample_index[rows, 0], kind="stable")]
+        trace_rows = rows
+        labels = np.append(hdf5_file.root.xuv_coefs[:, :], hdf5_file.root.ir_params[:, :], 1)
+        labels = labels[sample_index[rows, 0]]
+
+    else:
+        # one label row per trace row
+        rows = np.arange(hdf5_file.root.noise_trace.nrows)
+        trace_rows = rows
+        labels = generate_data3.read_row_labels(hdf5_file, 0, len(rows))
+
+    return rows, trace_rows, labels
+
+
+def memmap_rows(data):
+    """
+    sample_rows of a memmap export (memmap_data.MemmapData), the same rows
+    as sample_rows of the exported file
+    """
+    if data.clean_only:
+        trace_rows = np.arange(len(data.traces))
+        rows = trace_rows * data.levels
+
+    elif data.sample_index is not None:
+        sample_index = np.asarray(data.sample_index)
+        rows = np.nonzero(sample_index[:, 1] == 0)[0]
+        rows = rows[np.argsort(sample_index[rows, 0], kind="stable")]
+        trace_rows = rows
+
+    elif "sample_index" not in data.header:
+        # exported before the sample_index was stored, the clean rows are unknown
+        raise ValueError("noisy export without a sample_index, export {} again".format(data.header["source"]))
+
+    else:
+        # one label row per trace row
+        rows = np.arange(len(data.traces))
+        trace_rows = rows
+
+    return rows, trace_rows, np.asarray(data.labels[trace_rows], dtype=np.float64)
+
+
+def label_features(labels, convert_ir, block_rows=10000):
+    """
+    convert_ir: function of the ir params [n, 4] returning the converted
+    labels, called once per block of rows
+    """
+    labels = np.atleast_2d(labels)
+    xuv_coefs = phase_parameters.params.xuv_phase_coefs
+    ir_converted = []
+    for start in range(0, len(labels), block_rows):
+        ir_converted.append(np.asarray(convert_ir(labels[start:start + block_rows, xuv_coefs:])))
+    ir_converted = np.concatenate(ir_converted, axis=0) if ir_converted else np.zeros((0, 4))
+
+    # get_closest_params averages the ir and xuv errors separately
+    ir_weight = 1 / np.sqrt(ir_converted.shape[1])
+    xuv_weight = 1 / np.sqrt(xuv_coefs - 1)
+    return np.append(ir_weight * ir_converted, xuv_weight * labels[:, 1:xuv_coefs], 1)
+
+
+def fit_pca(traces, n_components):
+    mean = np.mean(traces, axis=0)
+    _, _, v = np.linalg.svd(traces - mean, full_matrices=False)
+    return {"mean": mean, "components": v[:n_components]}
+
+
+def project_pca(pca, traces):
+    return (np.atleast_2d(traces) - pca["mean"]) @ pca["components"].T
+
+
+class LabelIndex():
+    def __init__(self, data_filename, convert_ir, network_name, pca_components=None, pca_samples=5000,
+                 block_rows=10000, memmap_directory=None):
+        """
+        memmap_directory: memmap export of data_filename (memmap_data.py), the
+        labels and traces are read from the memmaps instead of the hdf5 file
+        """
+        self.data_filename = data_filename
+        self.convert_ir = convert_ir
+        self.network_name = network_name
+        self.pca_components = pca_components
+
+        if memmap_directory is not None:
+            data = memmap_data.MemmapData(memmap_directory)
+            if data.header["source"] != os.path.abspath(data_filename):
+                raise ValueError("{} is not an export of {}".format(memmap_directory, data_filename))
+            self.rows, trace_rows, self.labels = memmap_rows(data)
+            self.build(lambda rows: np.asarray(data.traces[rows], dtype=np.float64), trace_rows,
+                       pca_samples, block_rows)
+        else:
+            with tables.open_file(data_filename, mode="r") as hdf5_file:
+                generate_data3.check_provenance(hdf5_file, data_filename)
+                self.rows, trace_rows, self.labels = sample_rows(hdf5_file)
+                trace_name = generate_data3.trace_array_name(hdf5_file)
+                self.build(lambda rows: read_trace_rows(hdf5_file, trace_name, rows), trace_rows,
+                           pca_samples, block_rows)
+
+        self.source = source_stats(data_filename)
+
+    def build(self, read_traces, trace_rows, pca_samples, block_rows):
+        # read_traces: function of sorted trace rows returning the traces
+        self.label_tree = scipy.spatial.cKDTree(label_features(self.labels, self.convert_ir, block_rows))
+
+        self.pca = None
+        self.trace_tree = None
+        if self.pca_components:
+            # the samples are not ordered, fit the first pca_samples
+            self.pca = fit_pca(read_traces(trace_rows[:pca_samples]), self.pca_components)
+
+            projected = []
+            for start in range(0, len(trace_rows), block_rows):
+                projected.append(project_pca(self.pca, read_traces(trace_rows[start:start + block_rows])))
+            self.trace_tree = scipy.spatial.cKDTree(np.concatenate(projected, axis=0))
+
+    def query_labels(self, xuv_coefs, ir_params, k=1):
+        """
+        the k samples with the closest labels to the (retrieved) xuv coefs and ir params
+
+        returns distances, rows and labels of the samples, closest first
+        """
+        labels = np.append(np.atleast_2d(xuv_coefs), np.atleast_2d(ir_params), 1)
+        distances, indexes = self.label_tree.query(label_features(labels, self.convert_ir), k=k)
+        indexes = np.atleast_1d(np.squeeze(indexes))
+        return np.atleast_1d(np.squeeze(distances)), self.rows[indexes], self.labels[indexes]
+
+    def query_trace(self, trace, k=1):
+        """
+        the k samples with the closest clean traces in the pca space
+        """
+        if self.trace_tree is None:
+            raise ValueError("the index was built without pca_components")
+        distances, indexes = self.trace_tree.query(project_pca(self.pca, np.reshape(trace, [1, -1])), k=k)
+        indexes = np.atleast_1d(np.squeeze(indexes))
+        return np.atleast_1d(np.squeeze(distances)), self.rows[indexes], self.labels[indexes]
+
+    def save(self, filename=None):
+        filename = index_filename(self.data_filename, self.network_name) if filename is None else filename
+        # the conversion function is not pickled
+        convert_ir = self.convert_ir
+        self.convert_ir = None
+        with open(filename, "wb") as file:
+            pickle.dump(self, file)
+        self.convert_ir = convert_ir
+
+
+def read_trace_rows(hdf5_file, trace_name, rows):
+    # rows are sorted, read the range once
+    if len(rows) == 0:
+        return np.zeros((0, getattr(hdf5_file.root, trace_name).shape[1]))
+    traces = generate_data3.read_traces(hdf5_file, trace_name, rows[0], rows[-1] + 1)
+    return traces[rows - rows[0]]
+
+
+def source_stats(data_filename):
+    return {"size": os.path.getsize(data_filename), "mtime": os.path.getmtime(data_filename)}
+
+
+def load_index(data_filename, convert_ir, network_name, pca_components=None, rebuild=False, memmap_directory=None):
+    """
+    open the index of data_filename, it is built and saved if it does not
+    exist, the data file has changed or has no pca of pca_components
+
+    memmap_directory: build the index from the memmap export of data_filename
+    """
+    filename = index_filename(data_filename, network_name)
+    if os.path.exists(filename) and not rebuild:
+        with open(filename, "rb") as file:
+            label_index = pickle.load(file)
+        if label_index.source == source_stats(data_filename) and \
+                (not pca_components or label_index.pca_components == pca_components):
+            label_index.convert_ir = convert_ir
+            return label_index
+        print("{} is out of date, rebuilding".format(filename))
+
+    time1 = time.time()
+    label_index = LabelIndex(data_filename, convert_ir, network_name, pca_components=pca_components,
+                             memmap_directory=memmap_directory)
+    label_index.save(filename)
+    print("built {} ({} samples) in {} s".format(filename, len(label_index.rows), round(time.time() - time1, 2)))
+    return label_index
@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 import csv
 import scipy.constants as sc
@@ -47,6 +46,7 @@ def find_central_frequency_from_trace(trace, delay, energy, plotting=False):
     lam0 = sc.c / f0
 
     if plotting:
+        import matplotlib.pyplot as plt
         # find central frequency
         _, ax = plt.subplots(3, 1)
         ax[0].pcolormesh(delay, energy, trace, cmap='jet')
@@ -183,6 +183,7 @@ elif trace_num == 4:
 
 if __name__ == "__main__":
 
+    import matplotlib.pyplot as plt
     delay, energy, trace = retrieve_trace3(find_f0=True)
 
     plt.figure()
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import tables
+import phase_parameters.params
+import generate_data3
+
+# flat array export of a data file for random access: traces.npy [n, K*tau]
+# float32, labels.npy [n, xuv_coefs + 4] float32, sample_index.npy [n, 2]
+# (noisy files with a sample_index) and header.json. the arrays are opened
+# as memmaps, so batches of contiguous rows are views of the file
+#
+# python memmap_data.py export train3.hdf5 train3_memmap
+# python memmap_data.py benchmark train3.hdf5 train3_memmap
+
+
+def export_memmap(filename, directory, block_rows=1000):
+    """
+    write the stored rows of filename (clean traces of a clean only file) to
+    directory/traces.npy, directory/labels.npy and directory/header.json
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with tables.open_file(filename, mode="r") as hdf5_file:
+        generate_data3.check_provenance(hdf5_file, filename)
+        trace_name = generate_data3.trace_array_name(hdf5_file)
+        trace_array = getattr(hdf5_file.root, trace_name)
+        n_rows, n_trace = trace_array.shape
+        n_label = hdf5_file.root.xuv_coefs.shape[1] + hdf5_file.root.ir_params.shape[1]
+
+        traces = np.lib.format.open_memmap(os.path.join(directory, "traces.npy"), mode="w+",
+                                           dtype=np.float32, shape=(n_rows, n_trace))
+        labels = np.lib.format.open_memmap(os.path.join(directory, "labels.npy"), mode="w+",
+                                           dtype=np.float32, shape=(n_rows, n_label))
+
+        for start in range(0, n_rows, block_rows):
+            stop = min(start + block_rows, n_rows)
+            traces[start:stop] = generate_data3.read_traces(hdf5_file, trace_name, start, stop)
+            # labels of every row
+            labels[start:stop] = generate_data3.read_row_labels(hdf5_file, start, stop)
+        traces.flush()
+        labels.flush()
+        del traces, labels
+
+        # (sample, count_level) of every row, for the clean rows of a noisy file
+        has_sample_index = trace_name != 'trace' and 'sample_index' in hdf5_file.root
+        if has_sample_index:
+            np.save(os.path.join(directory, "sample_index.npy"), hdf5_file.root.sample_index[:, :])
+
+    header = {}
+    header["source"] = os.path.abspath(filename)
+    header["rows"] = int(n_rows)
+    header["clean_only"] = trace_name == 'trace'
+    header["sample_index"] = has_sample_index
+    header["noise_counts"] = [float(counts) for counts in phase_parameters.params.noise_counts]
+    header["K"] = [float(value) for value in phase_parameters.params.K]
+    header["delay_values"] = [float(value) for value in phase_parameters.params.delay_values]
+    header.update(generate_data3.spectrum_ids())
+    with open(os.path.join(directory, "header.json"), "w") as file:
+        json.dump(header, file, indent=4)
+
+
+class MemmapData():
+    def __init__(self, directory, check_spectrum=True):
+        with open(os.path.join(directory, "header.json"), "r") as file:
+            self.header = json.load(file)
+
+        if check_spectrum:
+            for key, value in generate_data3.spectrum_ids().items():
+                if self.header[key] != value:
+                    raise ValueError("{} of {} does not match the current configuration".format(key, directory))
+            for key in ["K", "delay_values"]:
+                current = np.array(getattr(phase_parameters.params, key), dtype=np.float64)
+                if len(self.header[key]) != len(current) or not np.allclose(self.header[key], current):
+                    raise ValueError("{} of {} does not match phase_parameters.params".format(key, directory))
+
+        self.traces = np.load(os.path.join(directory, "traces.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(directory, "labels.npy"), mmap_mode="r")
+
+        self.sample_index = None
+        if self.header.get("sample_index"):
+            self.sample_index = np.load(os.path.join(directory, "sample_index.npy"), mmap_mode="r")
+
+        self.clean_only = self.header["clean_only"]
+        self.levels = 1 + len(self.header["noise_counts"]) if self.clean_only else 1
+        self.samples = len(self.traces) * self.levels
+
+    def batch(self, start, stop):
+        """
+        stored rows start:stop, views of the memmaps without a copy
+        """
+        return self.traces[start:stop], self.labels[start:stop]
+
+    def rows(self, indexes):
+        """
+        stored rows at indexes (copied)
+        """
+        indexes = np.asarray(indexes)
+        return self.traces[indexes], self.labels[indexes]
+
+    def read_samples(self, start, stop, random_state=None):
+        """
+        rows start:stop in the layout of generate_data3.read_samples, the noise
+        levels are added to a clean only export (which copies the traces)
+        """
+        if not self.clean_only:
+            return self.batch(start, stop)
+
+        stop = min(stop, self.samples)
+        n_rows = max(stop - start, 0)
+        first = start // self.levels
+        last = first if n_rows == 0 else (stop - 1) // self.levels + 1
+        offset = start - first * self.levels
+
+        labels = np.repeat(self.labels[first:last], self.levels, axis=0)[offset:offset + n_rows]
+        traces = generate_data3.augment_traces(self.traces[first:last], random_state=random_state)
+        traces = traces.reshape(-1, self.traces.shape[1])[offset:offset + n_rows]
+        return traces.astype(np.float32), labels
+
+
+def random_access_benchmark(filename, directory, n_reads=200, batch_size=10, seed=0):
+    """
+    single random rows and contiguous batches from the hdf5 file and the
+    memmap export, rows per second
+    """
+    random_state = np.random.RandomState(seed)
+    memmap_data = MemmapData(directory)
+    n_rows = len(memmap_data.traces)
+    indexes = random_state.randint(0, n_rows, size=n_reads)
+    batch_starts = random_state.randint(0, max(n_rows - batch_size, 1), size=n_reads)
+
+    results = {}
+    with tables.open_file(filename, mode="r") as hdf5_file:
+        trace_name = generate_data3.trace_array_name(hdf5_file)
+
+        time1 = time.time()
+        for index in indexes:
+            generate_data3.read_traces(hdf5_file, trace_name, index, index + 1)
+            generate_data3.read_row_labels(hdf5_file, index, index + 1)
+        results["hdf5_random_rows_per_second"] = n_reads / (time.time() - time1)
+
+        time1 = time.time()
+        for start in batch_starts:
+            generate_data3.read_traces(hdf5_file, trace_name, start, start + batch_size)
+            generate_data3.read_row_labels(hdf5_file, start, start + batch_size)
+        results["hdf5_batch_rows_per_second"] = n_reads * batch_size / (time.time() - time1)
+
+    # np.sum reads the pages so the views are not only created
+    time1 = time.time()
+    for index in indexes:
+        traces, labels = memmap_data.batch(index, index + 1)
+        np.sum(traces), np.sum(labels)
+    results["memmap_random_rows_per_second"] = n_reads / (time.time() - time1)
+
+    time1 = time.time()
+    for start in batch_starts:
+        traces, labels = memmap_data.batch(start, start + batch_size)
+        np.sum(traces), np.sum(labels)
+    results["memmap_batch_rows_per_second"] = n_reads * batch_size / (time.time() - time1)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="export data files to memmap arrays")
+    subparsers = parser.add_subparsers(dest="command")
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("filename")
+    export_parser.add_argument("directory")
+
+    benchmark_parser = subparsers.add_parser("benchmark")
+    benchmark_parser.add_argument("filename")
+    benchmark_parser.add_argument("directory")
+    benchmark_parser.add_argument("--n_reads", type=int, default=200)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        time1 = time.time()
+        export_memmap(args.filename, args.directory)
+        print("exported {} to {} in {} s".format(args.filename, args.directory, round(time.time() - time1, 2)))
+
+    elif args.command == "benchmark":
+        for key, value in random_access_benchmark(args.filename, args.directory, n_reads=args.n_reads).items():
+            print("{}: {}".format(key, round(value, 1)))
+
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,69 +8,55 @@ import tf_functions
 from phase_parameters import params
 import measured_trace.get_trace as get_measured_trace
 import generate_data3
+import memmap_data
+import label_index
+import time
 import matplotlib.pyplot as plt
 # import network3
 import importlib
 
 
-def get_closest_params(retrieved, network_in):
+def get_closest_params(retrieved, network_in, k=10, data_filename='train3.hdf5', rebuild=False, memmap_directory=None):
+    # nearest samples of the training data to the retrieved parameters, the
+    # label index is built on the first call and saved next to the data file
+    # memmap_directory: memmap export of data_filename, the index is built and
+    # the closest traces are read from it
     network3 = importlib.import_module("models.network3_"+network_in)
 
     ir_values_in = tf.placeholder(tf.float32, shape=[None, 4])
     ir_label = network3.convert_ir_params(ir_values_in)
 
     with tf.Session() as sess:
-
-        smallest_error_data = None
-        smallest_error_index = None
-        smallest_error_data_ls = []
-        smallest_error_index_ls = []
-        cost_lowest = 100
-        getdata = network3.GetData(batch_size=10)
-
-        while getdata.batch_index < getdata.samples:
-            current_index = getdata.batch_index
-            batch_x, batch_y = getdata.next_batch()
-
-            print("getdata.batch_index =>", getdata.batch_index)
-            for index, batch_y_i in enumerate(batch_y):
-                # find the closest match
-                ir_y = batch_y_i[params.xuv_phase_coefs:]
-                xuv_y = batch_y_i[:params.xuv_phase_coefs]
-
-                # convert ir params to get phase
-                ir_label_out = sess.run(ir_label, feed_dict={ir_values_in:np.array([ir_y])})
-                ir_label_out_ret = sess.run(ir_label, feed_dict={ir_values_in:retrieved["ir_params_pred"]})
-
-                xuv_label = xuv_y[1:]
-                xuv_label_ret = retrieved["xuv_retrieved"][0,1:]
-
-                # calculate the smallest difference according to the cost function
-                cost = np.mean((ir_label_out-ir_label_out_ret)**2) + np.mean((xuv_label-xuv_label_ret)**2)
-
-                if cost < cost_lowest:
-                    # print("new lowest cost:", cost)
-                    # print("retrieved['predicted_coefficients_params'] =>")
-                    # print(retrieved['predicted_coefficients_params'])
-                    # print("batch_y_i =>")
-                    # print(batch_y_i)
-                    cost_lowest = cost
-                    smallest_error_data = np.array(batch_y_i)
-                    smallest_error_index = current_index + index
-                    smallest_error_data_ls.append(smallest_error_data)
-                    smallest_error_index_ls.append(smallest_error_index)
-
-        obj = {
-                "smallest_error_index":smallest_error_index,
-                "smallest_error_data":smallest_error_data,
-                "smallest_error_data_ls":smallest_error_data_ls,
-                "smallest_error_index_ls":smallest_error_index_ls
-                }
+        convert_ir = lambda ir_params: sess.run(ir_label, feed_dict={ir_values_in: ir_params})
+        index = label_index.load_index(data_filename, convert_ir, network_in, rebuild=rebuild,
+                                       memmap_directory=memmap_directory)
+
+        time1 = time.time()
+        distances, rows, labels = index.query_labels(retrieved["xuv_retrieved"][:1],
+                                                     retrieved["ir_params_pred"][:1], k=k)
+        print("query: {} ms".format(round(1000 * (time.time() - time1), 2)))
+
+    # closest last, like the sequence of improving matches of a scan
+    obj = {
+            "smallest_error_index":int(rows[0]),
+            "smallest_error_data":np.array(labels[0]),
+            "smallest_error_data_ls":[np.array(label) for label in labels[::-1]],
+            "smallest_error_index_ls":[int(row) for row in rows[::-1]],
+            "smallest_error_cost":distances[::-1]**2
+            }
+    if memmap_directory is not None:
+        data = memmap_data.MemmapData(memmap_directory)
+        obj["smallest_error_trace"] = np.array(data.traces[int(rows[0]) // data.levels])
 
     return obj
 
-def open_data_index(index, data_type=None):
+def open_data_index(index, data_type=None, memmap_directory=None):
     # open the trace corresponding to this error number
+    if memmap_directory is not None:
+        # memmap export of the data file (memmap_data.py)
+        return memmap_data.MemmapData(memmap_directory).read_samples(index, index + 1,
+                                                                     random_state=np.random.RandomState(index))
+
     if data_type is not None:
         if data_type=="train":
             hdf5_file = tables.open_file('train3.hdf5', mode="r")
@@ -80,11 +66,10 @@ def open_data_index(index, data_type=None):
             raise ValueError("not test or train")
     else:
         hdf5_file = tables.open_file('train3.hdf5', mode="r")
+    generate_data3.check_provenance(hdf5_file, hdf5_file.filename)
 
-    xuv_coefs = hdf5_file.root.xuv_coefs[index:index + 1, :]
-    ir_params = hdf5_file.root.ir_params[index:index + 1, :]
-    appended_label_batch = np.append(xuv_coefs, ir_params, 1)
-    trace_batch = hdf5_file.root.noise_trace[index:index + 1, :]
+    trace_batch, appended_label_batch = generate_data3.read_samples(hdf5_file, index, index + 1,
+                                                                    random_state=np.random.RandomState(index))
     hdf5_file.close()
     return trace_batch, appended_label_batch
 
@@ -5,42 +5,50 @@ import sys
 import scipy.constants as sc
 import tables
 import shutil
-import matplotlib.pyplot as plt
 import os
+import time
+import pickle
+import collections
+import queue
+import multiprocessing
 import phase_parameters.params
 import measured_trace.get_trace as get_measured_trace
 # import fake_measured_trace.get_fake_meas_trace as get_measured_trace
-import unsupervised_retrieval
+import generate_data3
+import data_loader
 
 
 class PhaseNetTrain:
     def __init__(self, modelname):
 
-        # convert the measured trace to a proof trace
-        # also this function clears tf default graph
+        # traces per batch and batches per optimizer step
+        self.batch_size = phase_parameters.params.train_batch_size
+        self.accumulation_steps = phase_parameters.params.train_accumulation_steps
+        self.train_step = 0
+        self.accumulated = 0
 
-        # self.measured_trace = convert_regular_trace_to_proof(get_measured_trace.trace)
-        self.measured_trace = get_measured_trace.trace
+        # training input, tf.data pipeline or feed_dict
+        self.input_pipeline = None
+        if phase_parameters.params.train_input_pipeline == "tf_data":
+            self.input_pipeline = data_loader.tf_dataset('train3.hdf5', batch_size=self.batch_size)
+        elif phase_parameters.params.train_input_pipeline == "online":
+            # traces simulated in the graph, no training data file
+            self.input_pipeline = data_loader.online_batch(batch_size=self.batch_size)
 
         # build neural net graph
-        self.nn_nodes = setup_neural_net()
-
-        self.measured_axes = unsupervised_retrieval.create_plot_axes()
-        # create a feed dictionary to test on the measured trace
-        self.measured_feed_dict = {
-                self.nn_nodes["general"]["x_in"]: self.measured_trace.reshape(1, -1)
-                }
+        # the inline evaluation needs the reconstructed, proof and autocorrelation traces
+        train_mode = "train_inline" if phase_parameters.params.train_evaluation == "inline" else "train"
+        self.nn_nodes = setup_neural_net(input_batch=self.input_pipeline, mode=train_mode)
 
         # test_generate_data(nn_nodes)
 
         print("built neural net")
 
-        # init data object
-        self.get_data = GetData(batch_size=10)
-
-        # initialize mse tracking objects
-        self.tf_loggers = init_tf_loggers(self.nn_nodes)
-
+        # feed_dict input, the graph input pipelines need no data object
+        self.get_data = None
+        if self.input_pipeline is None:
+            self.get_data = GetData(batch_size=self.batch_size)
+        self.batch_index = 0
 
         # saver and set epoch number to run
         self.saver = tf.train.Saver()
@@ -53,22 +61,39 @@ class PhaseNetTrain:
 
         shutil.copyfile('./network3.py', './models/network3_{}.py'.format(self.modelname))
 
-        # create figures for showing results
-        self.axes = {}
-
-        self.axes["testplot1"], self.axes["testfig1"]= create_sample_plot()
-        self.axes["testplot2"], self.axes["testfig2"]= create_sample_plot()
-
-        self.axes["trainplot1"], self.axes["trainfig1"]= create_sample_plot()
-        self.axes["trainplot2"], self.axes["trainfig2"]= create_sample_plot()
-
-        # plt.ion()
-
         self.init = tf.global_variables_initializer()
-        self.sess = tf.Session()
+        self.sess = tf.Session(config=session_config())
         self.sess.run(self.init)
 
-        self.writer = tf.summary.FileWriter("./tensorboard_graph/" + self.modelname)
+        # simulation threads of the online input
+        self.coord = tf.train.Coordinator()
+        self.queue_threads = tf.train.start_queue_runners(sess=self.sess, coord=self.coord)
+
+        # samples per epoch
+        if self.input_pipeline is not None:
+            self.epoch_samples = self.input_pipeline["samples"]
+        else:
+            self.epoch_samples = self.get_data.samples
+
+        # evaluation, plots and the retrieval of the measured trace, in a
+        # worker process that restores the checkpoints saved after each epoch,
+        # inline (in this session) or not at all
+        self.evaluation = phase_parameters.params.train_evaluation
+        self.headless = phase_parameters.params.train_headless
+        if self.evaluation == "background":
+            self.evaluation_saver = tf.train.Saver(var_list=self.nn_nodes["general"]["phase_net_vars"],
+                                                   max_to_keep=3)
+            context = multiprocessing.get_context("spawn")
+            self.evaluation_queue = context.Queue()
+            self.evaluation_process = context.Process(target=evaluation_worker,
+                                                      args=(self.modelname, self.headless, self.evaluation_queue))
+            self.evaluation_process.start()
+        elif self.evaluation == "inline":
+            self.evaluate = PhaseNetEvaluate(self.modelname, self.headless, sess=self.sess, nn_nodes=self.nn_nodes,
+                                             get_data=self.get_data)
+        elif self.evaluation != "none":
+            raise ValueError("train_evaluation must be 'background', 'inline' or 'none'")
+
         self.i = None
         self.epoch = None
         self.dots = None
@@ -82,19 +107,24 @@ class PhaseNetTrain:
             # iterate through every sample in the training set
             self.dots = 0
             alternate_training_counter = 0
-            while self.get_data.batch_index < self.get_data.samples:
+            time1 = time.time()
+            while self.batch_index < self.epoch_samples:
 
                 self.show_loading_bar()
 
+                if self.input_pipeline is not None:
+                    # the training op reads the batch from the input pipeline
+                    self.batch_index += self.batch_size
+                    self.train_batch(feed_dict={})
+                    continue
+
                 # retrieve data
                 batch_x, batch_y = self.get_data.next_batch()
+                self.batch_index += self.batch_size
 
                 # train only with coefficients
-                self.sess.run(self.nn_nodes["supervised"]["phase_network_train_coefs_params"],
-                         feed_dict={self.nn_nodes["supervised"]["x_in"]: batch_x,
-                                    self.nn_nodes["supervised"]["actual_coefs_params"]: batch_y,
-                                    self.nn_nodes["general"]["hold_prob"]: 1.0,
-                                    self.nn_nodes["supervised"]["s_LR"]: 0.0001})
+                self.train_batch(feed_dict={self.nn_nodes["supervised"]["x_in"]: batch_x,
+                                            self.nn_nodes["supervised"]["actual_coefs_params"]: batch_y})
 
                 # train with coefficients then with fields
                 # if self.i < 15:
@@ -114,25 +144,141 @@ class PhaseNetTrain:
                 #                         self.nn_nodes["supervised"]["s_LR"]: 0.0001})
 
             print("")
-            self.add_tensorboard_values()
+            print("training: {} samples/s, {} optimizer steps, learning rate {}".format(
+                round(self.batch_index / (time.time() - time1), 1), self.train_step,
+                scaled_learning_rate(self.train_step, self.batch_size * self.accumulation_steps)))
+            if self.input_pipeline is None:
+                throughput = self.get_data.throughput()
+                print("data: {} samples/s, waiting for data {} % of the time".format(
+                    round(throughput["delivered_samples_per_second"], 1), round(100 * throughput["wait_fraction"], 1)))
             # every x steps plot predictions
+            self.request_evaluation(plots=(self.epoch % 20 == 0 or self.epoch <= 15),
+                                    experimental=(self.epoch % 5 == 0 or self.epoch==1))
             if self.epoch % 20 == 0 or self.epoch <= 15:
-                # update the plot
-
-                self.update_plots()
-
                 # save model
                 self.saver.save(self.sess, "models/" + self.modelname + ".ckpt")
 
-            if self.epoch % 5 == 0 or self.epoch==1:
-                self.retrieve_experimental()
-
 
             # return the index to 0
-            self.get_data.batch_index = 0
+            self.batch_index = 0
 
         self.saver.save(self.sess, "models/"+self.modelname+".ckpt")
 
+        self.coord.request_stop()
+        self.coord.join(self.queue_threads)
+
+        if self.evaluation == "background":
+            # wait for the evaluation of the last epoch
+            self.evaluation_queue.put(None)
+            self.evaluation_process.join()
+
+    def request_evaluation(self, plots, experimental):
+        if self.evaluation == "background":
+            # the training continues while the worker evaluates this checkpoint
+            checkpoint = self.evaluation_saver.save(self.sess, "./models/{}_evaluation/phase_net.ckpt".format(
+                                                    self.modelname), global_step=self.epoch, write_meta_graph=False)
+            self.evaluation_queue.put({"epoch": self.epoch, "checkpoint": checkpoint, "plots": plots,
+                                       "experimental": experimental})
+        elif self.evaluation == "inline":
+            self.evaluate.evaluate(self.epoch, plots=plots, experimental=experimental)
+
+    def train_batch(self, feed_dict):
+        """
+        one training batch of the coefs and params loss, with more than one
+        accumulation step the optimizer step is taken every
+        accumulation_steps batches with the mean of their gradients
+        """
+        learning_rate = scaled_learning_rate(self.train_step, self.batch_size * self.accumulation_steps)
+        feed_dict[self.nn_nodes["general"]["hold_prob"]] = 1.0
+        feed_dict[self.nn_nodes["supervised"]["s_LR"]] = learning_rate
+
+        if self.accumulation_steps == 1:
+            self.sess.run(self.nn_nodes["supervised"]["phase_network_train_coefs_params"], feed_dict=feed_dict)
+            self.train_step += 1
+            return
+
+        accumulation = self.nn_nodes["supervised"]["accumulation"]
+        self.sess.run(accumulation["accumulate"], feed_dict=feed_dict)
+        self.accumulated += 1
+        if self.accumulated == self.accumulation_steps:
+            self.sess.run(accumulation["train"], feed_dict={self.nn_nodes["supervised"]["s_LR"]: learning_rate,
+                                                            accumulation["batches"]: self.accumulated})
+            self.sess.run(accumulation["zero"])
+            self.accumulated = 0
+            self.train_step += 1
+
+    def show_loading_bar(self):
+        # display loading bar
+        percent = 50 * self.batch_index / self.epoch_samples
+        if percent - self.dots > 1:
+            print(".", end="", flush=True)
+            self.dots += 1
+
+class PhaseNetEvaluate:
+    def __init__(self, modelname, headless, sess=None, nn_nodes=None, get_data=None):
+        """
+        test and train set losses for tensorboard, prediction plots and the
+        retrieval of the measured trace during training
+
+        without sess the evaluation graph is built in this process and
+        evaluate restores the weights from a checkpoint of the training
+        headless: no plots and no matplotlib import
+        """
+        self.modelname = modelname
+        self.headless = headless
+
+        # self.measured_trace = convert_regular_trace_to_proof(get_measured_trace.trace)
+        self.measured_trace = get_measured_trace.trace
+
+        if sess is None:
+            nn_nodes = setup_neural_net(mode="evaluate")
+            sess = tf.Session()
+            sess.run(tf.global_variables_initializer())
+        if get_data is None:
+            # the train and test sets of the losses
+            get_data = GetData(batch_size=10)
+        self.sess = sess
+        self.nn_nodes = nn_nodes
+        self.get_data = get_data
+        self.saver = tf.train.Saver(var_list=self.nn_nodes["general"]["phase_net_vars"])
+
+        # create a feed dictionary to test on the measured trace
+        self.measured_feed_dict = {
+                self.nn_nodes["general"]["x_in"]: self.measured_trace.reshape(1, -1)
+                }
+        self.retrieval_nodes = retrieval_nodes(self.nn_nodes)
+
+        # initialize mse tracking objects
+        self.tf_loggers = init_tf_loggers(self.nn_nodes)
+        self.writer = tf.summary.FileWriter("./tensorboard_graph/" + self.modelname)
+
+        if not self.headless:
+            import unsupervised_retrieval
+            self.measured_axes = unsupervised_retrieval.create_plot_axes()
+
+            # create figures for showing results
+            self.axes = {}
+
+            self.axes["testplot1"], self.axes["testfig1"]= create_sample_plot()
+            self.axes["testplot2"], self.axes["testfig2"]= create_sample_plot()
+
+            self.axes["trainplot1"], self.axes["trainfig1"]= create_sample_plot()
+            self.axes["trainplot2"], self.axes["trainfig2"]= create_sample_plot()
+
+        self.epoch = None
+
+    def evaluate(self, epoch, plots, experimental, checkpoint=None):
+        if checkpoint is not None:
+            self.saver.restore(self.sess, checkpoint)
+        self.epoch = epoch
+
+        self.add_tensorboard_values()
+        if plots and not self.headless:
+            # update the plot
+            self.update_plots()
+        if experimental:
+            self.retrieve_experimental()
+
     def add_tensorboard_values(self):
 
         #***********************************
@@ -287,13 +433,6 @@ class PhaseNetTrain:
         # ..................................
         self.writer.flush()
 
-    def show_loading_bar(self):
-        # display loading bar
-        percent = 50 * self.get_data.batch_index / self.get_data.samples
-        if percent - self.dots > 1:
-            print(".", end="", flush=True)
-            self.dots += 1
-
     def update_plots(self):
 
         # def update_plots(data_obj, sess, nn_nodes, modelname, epoch, axes):
@@ -309,6 +448,7 @@ class PhaseNetTrain:
         self.plot_predictions(x_in=batch_x_test, y_in=batch_y_test, indexes=[30, 40, 50], set='test_data_2',
                               axes=self.axes["testplot2"], figure=self.axes["testfig2"])
 
+        import matplotlib.pyplot as plt
         plt.show()
         plt.pause(0.001)
 
@@ -415,57 +555,346 @@ class PhaseNetTrain:
             figure.savefig(dir + str(self.epoch) + ".png")
 
     def retrieve_experimental(self):
+        retrieval = run_retrieval(self.sess, self.retrieval_nodes, self.measured_feed_dict)
 
+        if self.headless:
+            # no plots, save the retrieval
+            dir = "./nnpictures/" + self.modelname + "/measured/"
+            if not os.path.isdir(dir):
+                os.makedirs(dir)
+            with open(dir + str(self.epoch) + ".p", "wb") as file:
+                pickle.dump(retrieval._asdict(), file)
+            return
 
-        ir_f = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["ir_E_prop"]["f_cropped"],feed_dict=self.measured_feed_dict)[0]
-        xuv_f = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["f_cropped"],feed_dict=self.measured_feed_dict)[0]
-        xuv_f_phase = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["phasecurve_cropped"],feed_dict=self.measured_feed_dict)[0]
-        xuv_f_full = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["f"],feed_dict=self.measured_feed_dict)[0]
-        xuv_t = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["t"],feed_dict=self.measured_feed_dict)[0]
-
-        #================================================
-        #==================INPUT TRACES==================
-        #================================================
-
-        # calculate INPUT Autocorrelation from input image
-        input_auto = self.sess.run(self.nn_nodes["unsupervised"]["autocorrelate"]["input_image_autocorrelate"], feed_dict=self.measured_feed_dict)
-
-        # calculate INPUT PROOF trace from input image
-        input_proof = self.sess.run(self.nn_nodes["unsupervised"]["proof"]["input_image_proof"]["proof"], feed_dict=self.measured_feed_dict)
-
-        #================================================
-        #==================MEASURED TRACES===============
-        #================================================
-
-        # reconstructed regular trace from input image
-        reconstructed = self.sess.run(self.nn_nodes["general"]["reconstructed_trace"],feed_dict=self.measured_feed_dict)
-
-        # calculate reconstructed proof trace
-        reconstructed_proof = self.sess.run(self.nn_nodes["unsupervised"]["proof"]["reconstructed_proof"]["proof"], feed_dict=self.measured_feed_dict)
-
-        # calculate reconstructed autocorrelation trace
-        reconstruced_auto = self.sess.run(self.nn_nodes["unsupervised"]["autocorrelate"]["reconstructed_autocorrelate"], feed_dict=self.measured_feed_dict)
+        import matplotlib.pyplot as plt
+        import unsupervised_retrieval
 
         # measured/calculated from input traces
         input_traces = dict()
         input_traces["trace"] = self.measured_trace
-        input_traces["proof"] = input_proof
-        input_traces["autocorrelation"] = input_auto
+        input_traces["proof"] = retrieval.input_proof
+        input_traces["autocorrelation"] = retrieval.input_auto
 
         # reconstruction traces
         recons_traces = dict()
-        recons_traces["trace"] = reconstructed
-        recons_traces["proof"] = reconstructed_proof
-
-        recons_traces["autocorrelation"] = reconstruced_auto
+        recons_traces["trace"] = retrieval.reconstructed
+        recons_traces["proof"] = retrieval.reconstructed_proof
+        recons_traces["autocorrelation"] = retrieval.reconstructed_auto
         unsupervised_retrieval.plot_images_fields(axes=self.measured_axes, traces_meas=input_traces, traces_reconstructed=recons_traces,
-                           xuv_f=xuv_f, xuv_f_phase=xuv_f_phase, xuv_f_full=xuv_f_full, xuv_t=xuv_t, ir_f=ir_f, i=self.epoch,
-                           run_name=self.modelname+"measured_retrieval_while_training", true_fields=False, cost_function="trace",
-                           method="Training", save_data_objs=True)
+                           xuv_f=retrieval.xuv_f[0], xuv_f_phase=retrieval.xuv_f_phase[0],
+                           xuv_f_full=retrieval.xuv_f_full[0], xuv_t=retrieval.xuv_t[0], ir_f=retrieval.ir_f[0],
+                           i=self.epoch, run_name=self.modelname+"measured_retrieval_while_training", true_fields=False,
+                           cost_function="trace", method="Training", save_data_objs=True)
         plt.pause(0.00001)
 
+
+def evaluation_worker(modelname, headless, evaluation_queue):
+    """
+    evaluate the checkpoints sent by PhaseNetTrain until None is received,
+    requests that arrive during an evaluation are merged into the latest
+    """
+    evaluate = PhaseNetEvaluate(modelname, headless)
+    finished = False
+    while not finished:
+        request = evaluation_queue.get()
+        finished = request is None
+        while not finished:
+            try:
+                newer = evaluation_queue.get_nowait()
+            except queue.Empty:
+                break
+            if newer is None:
+                finished = True
+            else:
+                newer["plots"] = newer["plots"] or request["plots"]
+                newer["experimental"] = newer["experimental"] or request["experimental"]
+                request = newer
+
+        if request is not None:
+            evaluate.evaluate(request["epoch"], plots=request["plots"], experimental=request["experimental"],
+                              checkpoint=request["checkpoint"])
+
+
+def session_config(workers=1, task=None):
+    """
+    tf.ConfigProto with the thread pools of train_inter_op_threads and
+    train_intra_op_threads
+    task: worker of distributed_train, the devices of the other workers are
+    filtered out
+    """
+    params = phase_parameters.params
+    inter_op_threads = params.train_inter_op_threads
+    intra_op_threads = params.train_intra_op_threads
+    if workers > 1:
+        # every worker with a thread per core would oversubscribe the host
+        cores = max(multiprocessing.cpu_count() // workers, 1)
+        inter_op_threads = inter_op_threads or cores
+        intra_op_threads = intra_op_threads or cores
+
+    config = tf.ConfigProto(inter_op_parallelism_threads=inter_op_threads,
+                            intra_op_parallelism_threads=intra_op_threads)
+    if task is not None:
+        config.device_filters.extend(["/job:ps", "/job:worker/task:{}".format(task)])
+    return config
+
+
+def cluster_spec(workers, port=None):
+    """
+    localhost cluster of distributed_train, one parameter server and the workers
+    """
+    if port is None:
+        port = phase_parameters.params.train_cluster_port
+    cluster = {}
+    cluster["ps"] = ["localhost:{}".format(port)]
+    cluster["worker"] = ["localhost:{}".format(port + 1 + task) for task in range(workers)]
+    return cluster
+
+
+def parameter_server(cluster):
+    # holds the variables until distributed_train terminates it
+    workers = len(cluster["worker"])
+    server = tf.train.Server(tf.train.ClusterSpec(cluster), job_name="ps", task_index=0,
+                             config=session_config(workers))
+    server.join()
+
+
+class DistributedCheckpointHook(tf.train.SessionRunHook):
+    def __init__(self, modelname, nn_nodes, steps_per_epoch, step_batch_size, evaluation_queue):
+        """
+        chief worker of distributed_train: the epoch evaluations and model
+        checkpoints of PhaseNetTrain.supervised_learn and the final model
+        """
+        self.modelname = modelname
+        self.steps_per_epoch = steps_per_epoch
+        self.step_batch_size = step_batch_size
+        self.evaluation_queue = evaluation_queue
+        self.global_step = tf.train.get_global_step()
+        # the phase net variables restored by PhaseNetEvaluate and the retrievals
+        self.saver = tf.train.Saver(var_list=nn_nodes["general"]["phase_net_vars"])
+        self.evaluation_saver = tf.train.Saver(var_list=nn_nodes["general"]["phase_net_vars"], max_to_keep=3)
+        self.epoch = 0
+        self.time1 = None
+
+    def begin(self):
+        self.time1 = time.time()
+
+    def before_run(self, run_context):
+        return tf.train.SessionRunArgs(self.global_step)
+
+    def after_run(self, run_context, run_values):
+        epoch = (run_values.results + 1) // self.steps_per_epoch
+        if epoch > self.epoch:
+            self.epoch = epoch
+            self.end_of_epoch(run_context.session)
+
+    def end_of_epoch(self, session):
+        print("Epoch : {}, training: {} samples/s".format(
+            self.epoch, round(self.steps_per_epoch * self.step_batch_size / (time.time() - self.time1), 1)))
+
+        plots = self.epoch % 20 == 0 or self.epoch <= 15
+        experimental = self.epoch % 5 == 0 or self.epoch == 1
+        if self.evaluation_queue is not None:
+            checkpoint = self.evaluation_saver.save(session, "./models/{}_evaluation/phase_net.ckpt".format(
+                                                    self.modelname), global_step=self.epoch, write_meta_graph=False)
+            self.evaluation_queue.put({"epoch": self.epoch, "checkpoint": checkpoint, "plots": plots,
+                                       "experimental": experimental})
+        if self.epoch % 20 == 0 or self.epoch <= 15:
+            self.saver.save(session, "models/" + self.modelname + ".ckpt")
+        self.time1 = time.time()
+
+    def end(self, session):
+        self.saver.save(session, "models/" + self.modelname + ".ckpt")
+
+
+def distributed_worker(modelname, cluster, task, epochs, steps, evaluation_queue, results_queue):
+    """
+    worker task of distributed_train, task 0 is the chief: it initializes the
+    variables, saves the checkpoints, requests the evaluations and puts the
+    throughput on results_queue
+    """
+    params = phase_parameters.params
+    workers = len(cluster["worker"])
+    batch_size = params.train_batch_size
+    is_chief = task == 0
+    config = session_config(workers, task)
+    server = tf.train.Server(tf.train.ClusterSpec(cluster), job_name="worker", task_index=task, config=config)
+
+    # variables on the parameter server, the input and the network on this worker
+    with tf.device(tf.train.replica_device_setter(worker_device="/job:worker/task:{}".format(task),
+                                                  cluster=cluster)):
+        if params.train_input_pipeline == "tf_data":
+            # every worker reads its shard of the blocks
+            input_pipeline = data_loader.tf_dataset('train3.hdf5', batch_size=batch_size, num_shards=workers,
+                                                    shard_index=task)
+        elif params.train_input_pipeline == "online":
+            input_pipeline = data_loader.online_batch(batch_size=batch_size)
+        else:
+            raise ValueError("distributed_train needs the 'tf_data' or 'online' train_input_pipeline")
+
+        global_step = tf.train.get_or_create_global_step()
+        learning_rate = scaled_learning_rate(global_step, batch_size * workers)
+        nn_nodes = setup_neural_net(input_batch=input_pipeline, mode="train", replicas=workers,
+                                    learning_rate=learning_rate)
+
+    steps_per_epoch = max(input_pipeline["samples"] // (batch_size * workers), 1)
+    if steps is None:
+        steps = epochs * steps_per_epoch
+
+    hooks = [nn_nodes["supervised"]["sync_optimizer"].make_session_run_hook(is_chief),
+             tf.train.StopAtStepHook(last_step=steps)]
+    chief_only_hooks = []
+    if modelname is not None:
+        chief_only_hooks.append(DistributedCheckpointHook(modelname, nn_nodes, steps_per_epoch,
+                                                          batch_size * workers, evaluation_queue))
+
+    train = nn_nodes["supervised"]["phase_network_train_coefs_params"]
+    feed_dict = {nn_nodes["general"]["hold_prob"]: 1.0}
+
+    # throughput after the first steps (graph optimizations, filling the input)
+    warmup_steps = min(10, steps // 2)
+    time1 = None
+    step1 = None
+    step = 0
+    with tf.train.MonitoredTrainingSession(master=server.target, is_chief=is_chief, hooks=hooks,
+                                           chief_only_hooks=chief_only_hooks, config=config,
+                                           save_checkpoint_secs=None, save_summaries_steps=None,
+                                           save_summaries_secs=None, log_step_count_steps=None) as sess:
+        while not sess.should_stop():
+            _, step = sess.run([train, global_step], feed_dict=feed_dict)
+            if time1 is None and step >= warmup_steps:
+                time1 = time.time()
+                step1 = step
+        time2 = time.time()
+
+    if is_chief:
+        results = {}
+        results["workers"] = workers
+        results["steps"] = int(step)
+        results["samples_per_second"] = float("nan")
+        if time1 is not None and time2 > time1:
+            results["samples_per_second"] = (step - step1) * batch_size * workers / (time2 - time1)
+        results_queue.put(results)
+
+
+def distributed_train(modelname, workers=None, epochs=80, steps=None):
+    """
+    data parallel supervised training on this host: between graph
+    replication in worker processes with one parameter server, every
+    optimizer step averages the gradients of one batch (train_batch_size) of
+    every worker
+
+    modelname: None for no checkpoints and evaluations (scaling_benchmark)
+    steps: optimizer steps, default epochs of the training data
+    returns the training throughput of the chief worker
+    """
+    params = phase_parameters.params
+    if workers is None:
+        workers = params.train_workers
+    if params.train_accumulation_steps != 1:
+        raise ValueError("distributed_train averages the workers, set train_accumulation_steps to 1")
+
+    context = multiprocessing.get_context("spawn")
+    evaluation_queue = None
+    evaluation_process = None
+    if modelname is not None:
+        print('starting ' + modelname + ' on {} workers'.format(workers))
+        shutil.copyfile('./network3.py', './models/network3_{}.py'.format(modelname))
+        if params.train_evaluation == "background":
+            evaluation_queue = context.Queue()
+            evaluation_process = context.Process(target=evaluation_worker,
+                                                 args=(modelname, params.train_headless, evaluation_queue))
+            evaluation_process.start()
+        elif params.train_evaluation != "none":
+            print("no {} evaluation in distributed_train".format(params.train_evaluation))
+
+    cluster = cluster_spec(workers)
+    results_queue = context.Queue()
+    processes = [context.Process(target=parameter_server, args=(cluster,), daemon=True)]
+    for task in range(workers):
+        processes.append(context.Process(target=distributed_worker, daemon=True,
+                                         args=(modelname, cluster, task, epochs, steps,
+                                               evaluation_queue if task == 0 else None, results_queue)))
+    for process in processes:
+        process.start()
+
+    chief = processes[1]
+    results = None
+    while results is None:
+        try:
+            results = results_queue.get(timeout=1)
+        except queue.Empty:
+            if not chief.is_alive():
+                break
+    chief.join()
+
+    # the other workers can wait for a step that is never aggregated
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+    if evaluation_process is not None:
+        # wait for the evaluation of the last epoch
+        evaluation_queue.put(None)
+        evaluation_process.join()
+
+    if results is None:
+        raise RuntimeError("the chief worker exited with code {}".format(chief.exitcode))
+    return results
+
+
+# every output of one retrieval, arrays keep the batch dimension, the fields
+# of nodes that are not in the graph are None
+RetrievalResult = collections.namedtuple("RetrievalResult", [
+    "xuv_f", "xuv_f_phase", "xuv_f_full", "xuv_t", "ir_f", "predicted_coefficients_params", "xuv_coefs",
+    "input_trace", "input_proof", "input_auto", "reconstructed", "reconstructed_proof", "reconstructed_auto",
+    "mse", "summary"])
+
+
+def retrieval_nodes(nn_nodes):
+    """
+    the tensors of the RetrievalResult fields in nn_nodes, proof and
+    autocorrelation only if the graph mode built them
+    """
+    general = nn_nodes["general"]
+    nodes = {}
+    nodes["xuv_f"] = general["phase_net_output"]["xuv_E_prop"]["f_cropped"]
+    nodes["xuv_f_phase"] = general["phase_net_output"]["xuv_E_prop"]["phasecurve_cropped"]
+    nodes["xuv_f_full"] = general["phase_net_output"]["xuv_E_prop"]["f"]
+    nodes["xuv_t"] = general["phase_net_output"]["xuv_E_prop"]["t"]
+    nodes["ir_f"] = general["phase_net_output"]["ir_E_prop"]["f_cropped"]
+    nodes["predicted_coefficients_params"] = general["phase_net_output"]["predicted_coefficients_params"]
+    nodes["xuv_coefs"] = general["xuv_coefs_pred"]
+    nodes["input_trace"] = general["x_in"]
+    if "reconstructed_trace" in general:
+        nodes["reconstructed"] = general["reconstructed_trace"]
+
+    unsupervised = nn_nodes.get("unsupervised", {})
+    if "proof" in unsupervised:
+        nodes["input_proof"] = unsupervised["proof"]["input_image_proof"]["proof"]
+        nodes["reconstructed_proof"] = unsupervised["proof"]["reconstructed_proof"]["proof"]
+    if "autocorrelate" in unsupervised:
+        nodes["input_auto"] = unsupervised["autocorrelate"]["input_image_autocorrelate"]
+        nodes["reconstructed_auto"] = unsupervised["autocorrelate"]["reconstructed_autocorrelate"]
+    return nodes
+
+
+def run_retrieval(sess, nodes, feed_dict, mse=None, summary=None):
+    """
+    fetch nodes (from retrieval_nodes) and the optional mse and summary
+    tensors in one sess.run
+    """
+    fetches = dict(nodes)
+    if mse is not None:
+        fetches["mse"] = mse
+    if summary is not None:
+        fetches["summary"] = summary
+    values = sess.run(fetches, feed_dict=feed_dict)
+    return RetrievalResult(**{field: values.get(field) for field in RetrievalResult._fields})
+
+
 class GetData():
-    def __init__(self, batch_size):
+    def __init__(self, batch_size, seed=None):
 
         self.batch_counter = 0
         self.batch_index = 0
@@ -473,22 +902,19 @@ class GetData():
         self.train_filename = 'train3.hdf5'
         self.test_filename = 'test3.hdf5'
 
-        hdf5_file = tables.open_file(self.train_filename, mode="r")
-        self.samples = hdf5_file.root.noise_trace.shape[0]
-        hdf5_file.close()
+        # one open handle, the batches are read ahead in a background thread
+        self.loader = data_loader.DataLoader(self.train_filename, batch_size, seed=seed,
+                                             memmap_directory=phase_parameters.params.data_memmap_directory)
+        self.samples = self.loader.samples
+
+        # evaluation sets are read once
+        self.test_data = None
+        self.train_data = {}
 
     def next_batch(self):
 
         # retrieve the next batch of data from the data source
-        hdf5_file = tables.open_file(self.train_filename, mode="r")
-
-        xuv_coefs = hdf5_file.root.xuv_coefs[self.batch_index:self.batch_index + self.batch_size, :]
-        ir_params = hdf5_file.root.ir_params[self.batch_index:self.batch_index + self.batch_size, :]
-        appended_label_batch = np.append(xuv_coefs, ir_params, 1)
-
-        trace_batch = hdf5_file.root.noise_trace[self.batch_index:self.batch_index + self.batch_size, :]
-
-        hdf5_file.close()
+        trace_batch, appended_label_batch = self.loader.next_batch()
 
         self.batch_index += self.batch_size
 
@@ -498,34 +924,60 @@ class GetData():
     def evaluate_on_test_data(self):
 
         # this is used to evaluate the mean squared error of the data after every epoch
-        hdf5_file = tables.open_file(self.test_filename, mode="r")
+        if self.test_data is None:
+            with tables.open_file(self.test_filename, mode="r") as hdf5_file:
+                generate_data3.check_provenance(hdf5_file, self.test_filename)
+                # the same noise every epoch
+                self.test_data = generate_data3.read_samples(hdf5_file, 0, generate_data3.stored_samples(hdf5_file),
+                                                             random_state=np.random.RandomState(0))
 
-        xuv_coefs = hdf5_file.root.xuv_coefs[:, :]
-        ir_params = hdf5_file.root.ir_params[:, :]
-        appended_label_batch = np.append(xuv_coefs, ir_params, 1)
-
-        trace_batch = hdf5_file.root.noise_trace[:, :]
-
-        hdf5_file.close()
-
-        return trace_batch, appended_label_batch
+        return self.test_data
 
 
 
     def evaluate_on_train_data(self, samples):
 
         # this is used to evaluate the mean squared error of the data after every epoch
-        hdf5_file = tables.open_file(self.train_filename, mode="r")
+        if samples not in self.train_data:
+            with tables.open_file(self.train_filename, mode="r") as hdf5_file:
+                self.train_data[samples] = generate_data3.read_samples(hdf5_file, 0, samples,
+                                                                       random_state=np.random.RandomState(0))
 
-        xuv_coefs = hdf5_file.root.xuv_coefs[:samples, :]
-        ir_params = hdf5_file.root.ir_params[:samples, :]
-        appended_label_batch = np.append(xuv_coefs, ir_params, 1)
+        return self.train_data[samples]
 
-        trace_batch = hdf5_file.root.noise_trace[:samples, :]
+    def evaluate_on_test_noise_level(self, count_level):
 
-        hdf5_file.close()
+        # test samples at one noise level, 0 is the clean trace
+        with tables.open_file(self.test_filename, mode="r") as hdf5_file:
+            return generate_data3.read_noise_level(hdf5_file, count_level, random_state=np.random.RandomState(0))
 
-        return trace_batch, appended_label_batch
+    def throughput(self):
+        return self.loader.throughput()
+
+def scaled_learning_rate(step, step_batch_size):
+    """
+    learning rate of optimizer step number step with step_batch_size traces
+    per step, scaled from train_learning_rate at train_base_batch traces
+    step: int or the global step tensor
+    """
+    params = phase_parameters.params
+    ratio = step_batch_size / params.train_base_batch
+    if params.train_lr_scaling == "linear":
+        learning_rate = params.train_learning_rate * ratio
+    elif params.train_lr_scaling == "sqrt":
+        learning_rate = params.train_learning_rate * np.sqrt(ratio)
+    elif params.train_lr_scaling == "none":
+        learning_rate = params.train_learning_rate
+    else:
+        raise ValueError("train_lr_scaling must be 'linear', 'sqrt' or 'none'")
+
+    if params.train_warmup_steps > 0:
+        if isinstance(step, (tf.Tensor, tf.Variable)):
+            # the global step of distributed_train
+            learning_rate *= tf.minimum(tf.cast(step + 1, tf.float32) / params.train_warmup_steps, 1.0)
+        else:
+            learning_rate *= min((step + 1) / params.train_warmup_steps, 1.0)
+    return learning_rate
 
 def convert_ir_params(ir_params):
     """
@@ -593,6 +1045,7 @@ def concat_fields(xuv, ir):
     return both_fields_concat
 
 def test_generate_data(nn_nodes):
+    import matplotlib.pyplot as plt
     # generate a bunch of samples and test threshold value
     init = tf.global_variables_initializer()
     with tf.Session() as sess:
@@ -702,6 +1155,7 @@ def init_tf_loggers(nn_nodes):
     return tf_loggers
 
 def create_sample_plot(samples_per_plot=3):
+    import matplotlib.pyplot as plt
     fig = plt.figure(figsize=(16, 8))
     plt.subplots_adjust(left=0.04, right=0.96, top=0.92, bottom=0.05,
                             wspace=0.2, hspace=0.1)
@@ -1028,7 +1482,41 @@ def phase_retrieval_net(input):
 
         return phase_net_output, hold_prob, xuv_coefs_pred, ir_params_pred
 
-def setup_neural_net():
+# subgraphs built by setup_neural_net in each mode, the phase retrieval net is
+# always built, "reconstruction" is the streaking trace of the predicted
+# fields (needed by "proof_autocorrelate" and "unsupervised")
+graph_modes = {}
+graph_modes["all"] = ["gan", "supervised", "supervised_train", "supervised_optimizers", "reconstruction",
+                      "proof_autocorrelate", "unsupervised"]
+# supervised training, evaluated in a background process or not at all
+graph_modes["train"] = ["supervised", "supervised_train"]
+# supervised training with the inline evaluation
+graph_modes["train_inline"] = ["supervised", "supervised_train", "reconstruction", "proof_autocorrelate"]
+# PhaseNetEvaluate, the losses without the optimizers
+graph_modes["evaluate"] = ["supervised", "reconstruction", "proof_autocorrelate"]
+# SupervisedRetrieval, the retrieved fields and the reconstructed trace
+graph_modes["infer"] = ["reconstruction"]
+# unsupervised_retrieval
+graph_modes["unsupervised"] = ["reconstruction", "proof_autocorrelate", "unsupervised"]
+
+
+def setup_neural_net(input_batch=None, mode="all", replicas=None, learning_rate=None):
+    """
+    input_batch: dict of "traces" and "labels" tensors (data_loader.tf_dataset),
+    the default inputs of x_in and actual_coefs_params for training without
+    feed_dict
+    mode: key of graph_modes, the nodes of subgraphs that are not built are
+    left out of nn_nodes
+    replicas: workers of distributed_train, the coefs and params optimizer
+    step (SyncReplicasOptimizer) averages one batch of every worker and
+    increments the global step, there is no gradient accumulation
+    learning_rate: tensor, the default of s_LR (the aggregated optimizer step
+    runs without feed_dict)
+    """
+    if mode not in graph_modes:
+        raise ValueError("mode must be one of {}".format(list(graph_modes.keys())))
+    parts = graph_modes[mode]
+
     K_values = phase_parameters.params.K
     tau_values = phase_parameters.params.delay_values
 
@@ -1039,20 +1527,28 @@ def setup_neural_net():
     # define the label for supervised learning of phase retrieval net
     total_coefs_params_length = int(xuv_phase_coefs + 4)
 
-    # define GAN network
-    gan_input = tf.placeholder(tf.float32, shape=[1, 100])
+    x_flat = None
+    if "gan" in parts:
+        # define GAN network
+        gan_input = tf.placeholder(tf.float32, shape=[1, 100])
 
-    # GAN output is used to create XUV field and streaking trace
-    gan_output = gan_network(input=gan_input)
+        # GAN output is used to create XUV field and streaking trace
+        gan_output = gan_network(input=gan_input)
 
-    # use the fields to generate streaking trace
-    # sample size of one required as of now
-    x = tf_functions.streaking_trace(xuv_cropped_f_in=gan_output["xuv_E_prop"]["f_cropped"][0],
-                                        ir_cropped_f_in=gan_output["ir_E_prop"]["f_cropped"][0])
-    x_flat = tf.reshape(x, [1, -1])
+        # use the fields to generate streaking trace
+        # sample size of one required as of now
+        x = tf_functions.streaking_trace(xuv_cropped_f_in=gan_output["xuv_E_prop"]["f_cropped"][0],
+                                            ir_cropped_f_in=gan_output["ir_E_prop"]["f_cropped"][0])
+        x_flat = tf.reshape(x, [1, -1])
     # this placeholder accepts either an input as placeholder (supervised learning)
     # or it will default to the GAN generated fields as input
-    x_in = tf.placeholder_with_default(x_flat, shape=(None, int(len(K_values) * len(tau_values))))
+    # or the training batch of the input pipeline
+    if input_batch is not None:
+        x_flat = input_batch["traces"]
+    if x_flat is not None:
+        x_in = tf.placeholder_with_default(x_flat, shape=(None, int(len(K_values) * len(tau_values))))
+    else:
+        x_in = tf.placeholder(tf.float32, shape=(None, int(len(K_values) * len(tau_values))))
 
 
     phase_net_output, hold_prob, xuv_coefs_pred, ir_params_pred = noise_resistant_phase_retrieval_net(input=x_in)
@@ -1063,25 +1559,31 @@ def setup_neural_net():
 
 
     # create label for supervised learning
-    actual_coefs_params = tf.placeholder(tf.float32, shape=[None, total_coefs_params_length])
-    supervised_label_fields = create_fields_label_from_coefs_params(actual_coefs_params)
+    if "supervised" in parts:
+        if input_batch is not None:
+            actual_coefs_params = tf.placeholder_with_default(input_batch["labels"], shape=[None, total_coefs_params_length])
+        else:
+            actual_coefs_params = tf.placeholder(tf.float32, shape=[None, total_coefs_params_length])
+        supervised_label_fields = create_fields_label_from_coefs_params(actual_coefs_params)
 
-    # generate the reconstructed trace
-    reconstructed_trace = tf_functions.streaking_trace(
-                    xuv_cropped_f_in=phase_net_output["xuv_E_prop"]["f_cropped"][0],
-                    ir_cropped_f_in=phase_net_output["ir_E_prop"]["f_cropped"][0])
+    if "reconstruction" in parts:
+        # generate the reconstructed trace
+        reconstructed_trace = tf_functions.streaking_trace(
+                        xuv_cropped_f_in=phase_net_output["xuv_E_prop"]["f_cropped"][0],
+                        ir_cropped_f_in=phase_net_output["ir_E_prop"]["f_cropped"][0])
 
-    # generate proof trace
-    reconstructed_proof = tf_functions.proof_trace(reconstructed_trace)
-    # input proof trace
-    x_in_reshaped = tf.reshape(x_in, [len(K_values), len(tau_values)])
-    input_image_proof = tf_functions.proof_trace(x_in_reshaped)
+    if "proof_autocorrelate" in parts:
+        # generate proof trace
+        reconstructed_proof = tf_functions.proof_trace(reconstructed_trace)
+        # input proof trace
+        x_in_reshaped = tf.reshape(x_in, [len(K_values), len(tau_values)])
+        input_image_proof = tf_functions.proof_trace(x_in_reshaped)
 
 
-    # generate autocorrelation trace
-    reconstructed_autocorrelate = tf_functions.autocorrelate(reconstructed_trace)
-    # input autocorrelation trace
-    input_image_autocorrelate = tf_functions.autocorrelate(x_in_reshaped)
+        # generate autocorrelation trace
+        reconstructed_autocorrelate = tf_functions.autocorrelate(reconstructed_trace)
+        # input autocorrelation trace
+        input_image_autocorrelate = tf_functions.autocorrelate(x_in_reshaped)
 
 
     # divide the variables to train with gan and phase retrieval net individually
@@ -1112,179 +1614,211 @@ def setup_neural_net():
 
 
 
-    # ........................................................
-    # ........SUPERVISED LEARNING LOSS FUNCTIONS..............
-    # ........................................................
-    s_LR = tf.placeholder(tf.float32, shape=[])
-
-    # phase curve loss function
-    phase_network_phasecurve_loss = tf.losses.mean_squared_error(
-                            labels=supervised_label_fields["xuv_E_prop"]["phasecurve_cropped"],
-                            predictions=phase_net_output["xuv_E_prop"]["phasecurve_cropped"])
-    phase_phasecurve_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
-    phase_network_train_phasecurve = phase_phasecurve_optimizer.minimize(
-                            phase_network_phasecurve_loss, var_list=phase_net_vars)
-
-    # fields loss function for training phase retrieval network
-    phase_network_fields_loss = tf.losses.mean_squared_error(
-                            labels=supervised_label_fields["xuv_ir_field_label"],
-                            predictions=phase_net_output["xuv_ir_field_label"])
-    phase_fields_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
-    phase_network_train_fields = phase_fields_optimizer.minimize(
-                            phase_network_fields_loss, var_list=phase_net_vars)
-
-    # modify scaler to phase coefficients here
-    # supervised_label_fields["actual_coefs_params"]
-    # phase_net_output["predicted_coefficients_params"]
-
-    # coefs and params loss function for training phase retrieval network
-    # original loss function
-    phase_network_coefs_params_loss = tf.losses.mean_squared_error(
-                            labels=supervised_label_fields["actual_coefs_params"],
-                            predictions=phase_net_output["predicted_coefficients_params"])
-
-    # construct loss function with individual cosfficients
-    xuv_coef_loss_w = tf.losses.mean_squared_error(
-                            labels=supervised_label_fields["xuv_coefs_actual"][:,1:],
-                            predictions=xuv_coefs_pred[:,1:])
-
-    # construct a vector of for the IR loss with only the intensity and phaseshift
-    ir_param_loss_w = tf.losses.mean_squared_error(
-                            labels=convert_ir_params(supervised_label_fields["ir_params_actual"]),
-                            predictions=convert_ir_params(ir_params_pred))
-    phase_network_coefs_params_loss_individual = xuv_coef_loss_w + ir_param_loss_w
-
-    # original
-    # phase_coefs_params_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
-    # phase_network_train_coefs_params = phase_coefs_params_optimizer.minimize(
-    #                         phase_network_coefs_params_loss, var_list=phase_net_vars)
-
-    # individual
-    phase_coefs_params_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
-    phase_network_train_coefs_params = phase_coefs_params_optimizer.minimize(
-                            phase_network_coefs_params_loss_individual, var_list=phase_net_vars)
-
-
-    # =========================================================================
-    # define individual xuv / ir /xuc coefficient loss functions to view errors
-    # =========================================================================
-    xuv_loss = tf.losses.mean_squared_error(
-            labels=supervised_label_fields["xuv_coefs_actual"],
-            predictions=xuv_coefs_pred)
-
-    ir_loss = tf.losses.mean_squared_error(
-            labels=supervised_label_fields["ir_params_actual"],
-            predictions=ir_params_pred)
-
-    xuv_individual_coef_loss = []
-    # linear, 2nd order, 3rd, 4th, 5th etc...
-    for i in range(int(xuv_coefs_pred.get_shape()[1])):
-        xuv_coef_loss = tf.losses.mean_squared_error(
-                labels=supervised_label_fields["xuv_coefs_actual"][:,i],
-                predictions=xuv_coefs_pred[:,i])
-        xuv_individual_coef_loss.append(xuv_coef_loss)
-
-    ir_loss_individual = {}
-    for i, key in enumerate(["phase", "clambda", "pulseduration", "I"]):
-        ir_param_loss = tf.losses.mean_squared_error(
-                labels=supervised_label_fields["ir_params_actual"][:,i],
-                predictions=ir_params_pred[:,i])
-
-        # add extra term for the cos of phase term
-        if key == "phase":
-
-            phase_pred = tf_functions.ir_from_params(ir_params_pred)["scaled_values"]["phase"]
-            phase_true = tf_functions.ir_from_params(supervised_label_fields["ir_params_actual"])["scaled_values"]["phase"]
-
-            # ir_loss_individual["phase_cos_rad"] = tf.losses.mean_squared_error(
-                # labels=tf.cos(phase_true)+tf.sin(phase_true),
-                # predictions=tf.cos(phase_pred)+tf.sin(phase_pred))
-
-            ir_loss_individual["phase_cos"] = tf.losses.mean_squared_error(
-                labels=tf.cos(phase_true),
-                predictions=tf.cos(phase_pred))
-
-            ir_loss_individual["phase_sin"] = tf.losses.mean_squared_error(
-                labels=tf.sin(phase_true),
-                predictions=tf.sin(phase_pred))
-
-            # this is the old cost function that doesnt make any sense
-            # ir_loss_individual["phase_cos_old"] = tf.losses.mean_squared_error(
-                # labels=tf.cos(supervised_label_fields["ir_params_actual"][:,i]),
-                # predictions=tf.cos(ir_params_pred[:,i]))
-
-        ir_loss_individual[key] = ir_param_loss
-
-
-
-    # ..........................................................
-    # .........UNSUPERVISED LEARNING LOSS FUNCTION..............
-    # ..........................................................
-    u_LR = tf.placeholder(tf.float32, shape=[])
-
-    # regular cost function
-    unsupervised_learning_loss = tf.losses.mean_squared_error(labels=x_in,
-                            predictions=tf.reshape(reconstructed_trace, [1, -1]))
-    unsupervised_optimizer = tf.train.AdamOptimizer(learning_rate=u_LR)
-    unsupervised_train = unsupervised_optimizer.minimize(unsupervised_learning_loss,
-                                                        var_list=phase_net_vars)
-
-    # # log cost function
-    # # log1 = log_base(x=0.5, base=10.0, translate=1)
-    # u_base = tf.placeholder(tf.float32, shape=[])
-    # u_translate = tf.placeholder(tf.float32, shape=[])
-    # unsupervised_learning_loss_log = tf.losses.mean_squared_error(
-    #                         labels=log_base(x=x_in, base=u_base, translate=u_translate),
-    #                         predictions=log_base(x=tf.reshape(reconstructed_trace, [1, -1]),
-    #                                              base=u_base,
-    #                                              translate=u_translate)
-    # )
-    # unsupervised_optimizer_log = tf.train.AdamOptimizer(learning_rate=u_LR)
-    # unsupervised_train_log = unsupervised_optimizer_log.minimize(unsupervised_learning_loss_log,
-    #                                                     var_list=phase_net_vars)
-
-
-    # ..........................................................
-    # .................PROOF RETRIEVAL LOSS FUNC................
-    # ..........................................................
-    # regular cost function
-    proof_unsupervised_learning_loss = tf.losses.mean_squared_error(
-                            labels=tf.reshape(input_image_proof["proof"], [1, -1]),
-                            predictions=tf.reshape(reconstructed_proof["proof"], [1, -1]))
-    proof_unsupervised_optimizer = tf.train.AdamOptimizer(learning_rate=u_LR)
-    proof_unsupervised_train = proof_unsupervised_optimizer.minimize(
-                            proof_unsupervised_learning_loss,
-                            var_list=phase_net_vars)
-
-    # ..........................................................
-    # .............AUTOCORRELATION RETRIEVAL LOSS FUNC..........
-    # ..........................................................
-    # regular cost function
-    autocorrelate_unsupervised_learning_loss = tf.losses.mean_squared_error(
-        labels=tf.reshape(input_image_autocorrelate, [1, -1]),
-        predictions=tf.reshape(reconstructed_autocorrelate, [1, -1]))
-    autocorrelate_unsupervised_optimizer = tf.train.AdamOptimizer(learning_rate=u_LR)
-    autocorrelate_unsupervised_train = autocorrelate_unsupervised_optimizer.minimize(
-                                            autocorrelate_unsupervised_learning_loss,
-                                            var_list=phase_net_vars)
-
-    # +++++++++++++++++++++++++++++++++++++
-    # ++++++++++BOOTSTRAP METHOD+++++++++++
-    # +++++++++++++++++++++++++++++++++++++
-    norm_bootstrap_loss, norm_bootstrap_train, norm_bootstrap_indexes_ph = bootstrap(
-                    recons_trace=reconstructed_trace, input_trace=x_in,
-                    learning_rate_in=u_LR, train_variables=phase_net_vars
-    )
-
-    proof_bootstrap_loss, proof_bootstrap_train, proof_bootstrap_indexes_ph = bootstrap(
-                    recons_trace=reconstructed_proof["proof"], input_trace=input_image_proof["proof"],
-                    learning_rate_in=u_LR, train_variables=phase_net_vars
-    )
-
-    auto_bootstrap_loss, auto_bootstrap_train, auto_bootstrap_indexes_ph = bootstrap(
-                    recons_trace=reconstructed_autocorrelate, input_trace=input_image_autocorrelate,
-                    learning_rate_in=u_LR, train_variables=phase_net_vars
-    )
+    if "supervised" in parts:
+        # ........................................................
+        # ........SUPERVISED LEARNING LOSS FUNCTIONS..............
+        # ........................................................
+        if learning_rate is not None:
+            s_LR = tf.placeholder_with_default(tf.cast(learning_rate, tf.float32), shape=[])
+        else:
+            s_LR = tf.placeholder(tf.float32, shape=[])
+
+        # phase curve loss function
+        phase_network_phasecurve_loss = tf.losses.mean_squared_error(
+                                labels=supervised_label_fields["xuv_E_prop"]["phasecurve_cropped"],
+                                predictions=phase_net_output["xuv_E_prop"]["phasecurve_cropped"])
+        if "supervised_optimizers" in parts:
+            phase_phasecurve_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
+            phase_network_train_phasecurve = phase_phasecurve_optimizer.minimize(
+                                    phase_network_phasecurve_loss, var_list=phase_net_vars)
+
+        # fields loss function for training phase retrieval network
+        phase_network_fields_loss = tf.losses.mean_squared_error(
+                                labels=supervised_label_fields["xuv_ir_field_label"],
+                                predictions=phase_net_output["xuv_ir_field_label"])
+        if "supervised_optimizers" in parts:
+            phase_fields_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
+            phase_network_train_fields = phase_fields_optimizer.minimize(
+                                    phase_network_fields_loss, var_list=phase_net_vars)
+
+        # modify scaler to phase coefficients here
+        # supervised_label_fields["actual_coefs_params"]
+        # phase_net_output["predicted_coefficients_params"]
+
+        # coefs and params loss function for training phase retrieval network
+        # original loss function
+        phase_network_coefs_params_loss = tf.losses.mean_squared_error(
+                                labels=supervised_label_fields["actual_coefs_params"],
+                                predictions=phase_net_output["predicted_coefficients_params"])
+
+        # construct loss function with individual cosfficients
+        xuv_coef_loss_w = tf.losses.mean_squared_error(
+                                labels=supervised_label_fields["xuv_coefs_actual"][:,1:],
+                                predictions=xuv_coefs_pred[:,1:])
+
+        # construct a vector of for the IR loss with only the intensity and phaseshift
+        ir_param_loss_w = tf.losses.mean_squared_error(
+                                labels=convert_ir_params(supervised_label_fields["ir_params_actual"]),
+                                predictions=convert_ir_params(ir_params_pred))
+        phase_network_coefs_params_loss_individual = xuv_coef_loss_w + ir_param_loss_w
+
+        # original
+        # phase_coefs_params_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
+        # phase_network_train_coefs_params = phase_coefs_params_optimizer.minimize(
+        #                         phase_network_coefs_params_loss, var_list=phase_net_vars)
+
+        if "supervised_train" in parts:
+            # individual
+            phase_coefs_params_optimizer = tf.train.AdamOptimizer(learning_rate=s_LR)
+            if replicas is not None:
+                phase_coefs_params_optimizer = tf.train.SyncReplicasOptimizer(phase_coefs_params_optimizer,
+                                                                              replicas_to_aggregate=replicas,
+                                                                              total_num_replicas=replicas)
+            coefs_params_grads = phase_coefs_params_optimizer.compute_gradients(
+                                    phase_network_coefs_params_loss_individual, var_list=phase_net_vars)
+            coefs_params_grads = [(grad, var) for grad, var in coefs_params_grads if grad is not None]
+
+            if replicas is not None:
+                phase_network_train_coefs_params = phase_coefs_params_optimizer.apply_gradients(
+                                    coefs_params_grads, global_step=tf.train.get_or_create_global_step())
+            else:
+                phase_network_train_coefs_params = phase_coefs_params_optimizer.apply_gradients(coefs_params_grads)
+
+                # gradient accumulation over several batches for one optimizer step
+                with tf.variable_scope("grad_accumulation"):
+                    accumulated_grads = [tf.Variable(tf.zeros(var.get_shape(), dtype=var.dtype.base_dtype),
+                                                     trainable=False) for _, var in coefs_params_grads]
+                    accumulation_batches = tf.placeholder(tf.float32, shape=[])
+                    coefs_params_accumulate = tf.group(*[accumulated.assign_add(grad) for accumulated, (grad, _)
+                                                         in zip(accumulated_grads, coefs_params_grads)])
+                    coefs_params_zero = tf.group(*[accumulated.assign(tf.zeros_like(accumulated))
+                                                   for accumulated in accumulated_grads])
+                phase_network_train_coefs_params_accumulated = phase_coefs_params_optimizer.apply_gradients(
+                                        [(accumulated / accumulation_batches, var) for accumulated, (_, var)
+                                         in zip(accumulated_grads, coefs_params_grads)])
+
+
+        # =========================================================================
+        # define individual xuv / ir /xuc coefficient loss functions to view errors
+        # =========================================================================
+        xuv_loss = tf.losses.mean_squared_error(
+                labels=supervised_label_fields["xuv_coefs_actual"],
+                predictions=xuv_coefs_pred)
+
+        ir_loss = tf.losses.mean_squared_error(
+                labels=supervised_label_fields["ir_params_actual"],
+                predictions=ir_params_pred)
+
+        xuv_individual_coef_loss = []
+        # linear, 2nd order, 3rd, 4th, 5th etc...
+        for i in range(int(xuv_coefs_pred.get_shape()[1])):
+            xuv_coef_loss = tf.losses.mean_squared_error(
+                    labels=supervised_label_fields["xuv_coefs_actual"][:,i],
+                    predictions=xuv_coefs_pred[:,i])
+            xuv_individual_coef_loss.append(xuv_coef_loss)
+
+        ir_loss_individual = {}
+        for i, key in enumerate(["phase", "clambda", "pulseduration", "I"]):
+            ir_param_loss = tf.losses.mean_squared_error(
+                    labels=supervised_label_fields["ir_params_actual"][:,i],
+                    predictions=ir_params_pred[:,i])
+
+            # add extra term for the cos of phase term
+            if key == "phase":
+
+                phase_pred = tf_functions.ir_from_params(ir_params_pred)["scaled_values"]["phase"]
+                phase_true = tf_functions.ir_from_params(supervised_label_fields["ir_params_actual"])["scaled_values"]["phase"]
+
+                # ir_loss_individual["phase_cos_rad"] = tf.losses.mean_squared_error(
+                    # labels=tf.cos(phase_true)+tf.sin(phase_true),
+                    # predictions=tf.cos(phase_pred)+tf.sin(phase_pred))
+
+                ir_loss_individual["phase_cos"] = tf.losses.mean_squared_error(
+                    labels=tf.cos(phase_true),
+                    predictions=tf.cos(phase_pred))
+
+                ir_loss_individual["phase_sin"] = tf.losses.mean_squared_error(
+                    labels=tf.sin(phase_true),
+                    predictions=tf.sin(phase_pred))
+
+                # this is the old cost function that doesnt make any sense
+                # ir_loss_individual["phase_cos_old"] = tf.losses.mean_squared_error(
+                    # labels=tf.cos(supervised_label_fields["ir_params_actual"][:,i]),
+                    # predictions=tf.cos(ir_params_pred[:,i]))
+
+            ir_loss_individual[key] = ir_param_loss
+
+
+
+    if "unsupervised" in parts:
+        # ..........................................................
+        # .........UNSUPERVISED LEARNING LOSS FUNCTION..............
+        # ..........................................................
+        u_LR = tf.placeholder(tf.float32, shape=[])
+
+        # regular cost function
+        unsupervised_learning_loss = tf.losses.mean_squared_error(labels=x_in,
+                                predictions=tf.reshape(reconstructed_trace, [1, -1]))
+        unsupervised_optimizer = tf.train.AdamOptimizer(learning_rate=u_LR)
+        unsupervised_train = unsupervised_optimizer.minimize(unsupervised_learning_loss,
+                                                            var_list=phase_net_vars)
+
+        # # log cost function
+        # # log1 = log_base(x=0.5, base=10.0, translate=1)
+        # u_base = tf.placeholder(tf.float32, shape=[])
+        # u_translate = tf.placeholder(tf.float32, shape=[])
+        # unsupervised_learning_loss_log = tf.losses.mean_squared_error(
+        #                         labels=log_base(x=x_in, base=u_base, translate=u_translate),
+        #                         predictions=log_base(x=tf.reshape(reconstructed_trace, [1, -1]),
+        #                                              base=u_base,
+        #                                              translate=u_translate)
+        # )
+        # unsupervised_optimizer_log = tf.train.AdamOptimizer(learning_rate=u_LR)
+        # unsupervised_train_log = unsupervised_optimizer_log.minimize(unsupervised_learning_loss_log,
+        #                                                     var_list=phase_net_vars)
+
+
+        # ..........................................................
+        # .................PROOF RETRIEVAL LOSS FUNC................
+        # ..........................................................
+        # regular cost function
+        proof_unsupervised_learning_loss = tf.losses.mean_squared_error(
+                                labels=tf.reshape(input_image_proof["proof"], [1, -1]),
+                                predictions=tf.reshape(reconstructed_proof["proof"], [1, -1]))
+        proof_unsupervised_optimizer = tf.train.AdamOptimizer(learning_rate=u_LR)
+        proof_unsupervised_train = proof_unsupervised_optimizer.minimize(
+                                proof_unsupervised_learning_loss,
+                                var_list=phase_net_vars)
+
+        # ..........................................................
+        # .............AUTOCORRELATION RETRIEVAL LOSS FUNC..........
+        # ..........................................................
+        # regular cost function
+        autocorrelate_unsupervised_learning_loss = tf.losses.mean_squared_error(
+            labels=tf.reshape(input_image_autocorrelate, [1, -1]),
+            predictions=tf.reshape(reconstructed_autocorrelate, [1, -1]))
+        autocorrelate_unsupervised_optimizer = tf.train.AdamOptimizer(learning_rate=u_LR)
+        autocorrelate_unsupervised_train = autocorrelate_unsupervised_optimizer.minimize(
+                                                autocorrelate_unsupervised_learning_loss,
+                                                var_list=phase_net_vars)
+
+        # +++++++++++++++++++++++++++++++++++++
+        # ++++++++++BOOTSTRAP METHOD+++++++++++
+        # +++++++++++++++++++++++++++++++++++++
+        norm_bootstrap_loss, norm_bootstrap_train, norm_bootstrap_indexes_ph = bootstrap(
+                        recons_trace=reconstructed_trace, input_trace=x_in,
+                        learning_rate_in=u_LR, train_variables=phase_net_vars
+        )
+
+        proof_bootstrap_loss, proof_bootstrap_train, proof_bootstrap_indexes_ph = bootstrap(
+                        recons_trace=reconstructed_proof["proof"], input_trace=input_image_proof["proof"],
+                        learning_rate_in=u_LR, train_variables=phase_net_vars
+        )
+
+        auto_bootstrap_loss, auto_bootstrap_train, auto_bootstrap_indexes_ph = bootstrap(
+                        recons_trace=reconstructed_autocorrelate, input_trace=input_image_autocorrelate,
+                        learning_rate_in=u_LR, train_variables=phase_net_vars
+        )
 
 
 
@@ -1303,77 +1837,98 @@ def setup_neural_net():
     # nn_nodes["gan"]["gan_LR"] = gan_LR
     # nn_nodes["gan"]["gan_network_train"] = gan_network_train
 
-    nn_nodes["supervised"]["x_in"] = x_in
-    nn_nodes["supervised"]["actual_coefs_params"] = actual_coefs_params
-    nn_nodes["supervised"]["phase_network_train_phasecurve"] = phase_network_train_phasecurve
-    nn_nodes["supervised"]["phase_network_train_fields"] = phase_network_train_fields
-    nn_nodes["supervised"]["phase_network_train_coefs_params"] = phase_network_train_coefs_params
-    nn_nodes["supervised"]["s_LR"] = s_LR
-    nn_nodes["supervised"]["phase_network_phasecurve_loss"] = phase_network_phasecurve_loss
-    nn_nodes["supervised"]["phase_network_fields_loss"] = phase_network_fields_loss
-    nn_nodes["supervised"]["phase_network_coefs_params_loss"] = phase_network_coefs_params_loss
-    nn_nodes["supervised"]["supervised_label_fields"] = supervised_label_fields
-    # avg ir and xuv loss / individual xuv coefficient loss functions
-    nn_nodes["supervised"]["extra_losses"] = {}
-    nn_nodes["supervised"]["extra_losses"]["ir_loss"] = ir_loss
-    nn_nodes["supervised"]["extra_losses"]["ir_loss_individual"] = ir_loss_individual
-    nn_nodes["supervised"]["extra_losses"]["xuv_loss"] = xuv_loss
-    nn_nodes["supervised"]["extra_losses"]["xuv_individual_coef_loss"] = xuv_individual_coef_loss
-
-
-
-    nn_nodes["unsupervised"]["x_in"] = x_in
-    nn_nodes["unsupervised"]["unsupervised_train"] = unsupervised_train
-    # nn_nodes["unsupervised"]["unsupervised_train_log"] = unsupervised_train_log
-    nn_nodes["unsupervised"]["u_LR"] = u_LR
-    nn_nodes["unsupervised"]["unsupervised_learning_loss"] = unsupervised_learning_loss
-    # nn_nodes["unsupervised"]["unsupervised_learning_loss_log"] = unsupervised_learning_loss_log
-    # nn_nodes["unsupervised"]["u_base"] = u_base
-    # nn_nodes["unsupervised"]["u_translate"] = u_translate
-
-    nn_nodes["unsupervised"]["proof"] = {}
-    nn_nodes["unsupervised"]["proof"]["x_in"] = x_in
-    nn_nodes["unsupervised"]["proof"]["u_LR"] = u_LR
-    nn_nodes["unsupervised"]["proof"]["reconstructed_proof"] = reconstructed_proof
-    nn_nodes["unsupervised"]["proof"]["input_image_proof"] = input_image_proof
-    nn_nodes["unsupervised"]["proof"]["proof_unsupervised_train"] = proof_unsupervised_train
-    nn_nodes["unsupervised"]["proof"]["proof_unsupervised_learning_loss"] = proof_unsupervised_learning_loss
-
-    nn_nodes["unsupervised"]["autocorrelate"] = {}
-    nn_nodes["unsupervised"]["autocorrelate"]["x_in"] = x_in
-    nn_nodes["unsupervised"]["autocorrelate"]["u_LR"] = u_LR
-    nn_nodes["unsupervised"]["autocorrelate"]["reconstructed_autocorrelate"] = reconstructed_autocorrelate
-    nn_nodes["unsupervised"]["autocorrelate"]["input_image_autocorrelate"] = input_image_autocorrelate
-    nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_train"] = autocorrelate_unsupervised_train
-    nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_learning_loss"] = autocorrelate_unsupervised_learning_loss
-
-
-    # add nodes for bootstrap method
-    nn_nodes["unsupervised"]["bootstrap"] = {}
-    
-    nn_nodes["unsupervised"]["bootstrap"]["u_LR"] = u_LR
-
-    nn_nodes["unsupervised"]["bootstrap"]["normal"] = {}
-    nn_nodes["unsupervised"]["bootstrap"]["normal"]["loss"] = norm_bootstrap_loss
-    nn_nodes["unsupervised"]["bootstrap"]["normal"]["train"] = norm_bootstrap_train
-    nn_nodes["unsupervised"]["bootstrap"]["normal"]["indexes_ph"] = norm_bootstrap_indexes_ph
-
-    nn_nodes["unsupervised"]["bootstrap"]["proof"] = {}
-    nn_nodes["unsupervised"]["bootstrap"]["proof"]["loss"] = proof_bootstrap_loss
-    nn_nodes["unsupervised"]["bootstrap"]["proof"]["train"] = proof_bootstrap_train
-    nn_nodes["unsupervised"]["bootstrap"]["proof"]["indexes_ph"] = proof_bootstrap_indexes_ph
-
-    nn_nodes["unsupervised"]["bootstrap"]["auto"] = {}
-    nn_nodes["unsupervised"]["bootstrap"]["auto"]["loss"]  = auto_bootstrap_loss
-    nn_nodes["unsupervised"]["bootstrap"]["auto"]["train"] = auto_bootstrap_train
-    nn_nodes["unsupervised"]["bootstrap"]["auto"]["indexes_ph"]  = auto_bootstrap_indexes_ph
-
+    if "supervised" in parts:
+        nn_nodes["supervised"]["x_in"] = x_in
+        nn_nodes["supervised"]["actual_coefs_params"] = actual_coefs_params
+        if "supervised_optimizers" in parts:
+            nn_nodes["supervised"]["phase_network_train_phasecurve"] = phase_network_train_phasecurve
+            nn_nodes["supervised"]["phase_network_train_fields"] = phase_network_train_fields
+        if "supervised_train" in parts:
+            nn_nodes["supervised"]["phase_network_train_coefs_params"] = phase_network_train_coefs_params
+            if replicas is not None:
+                # session run hook of the workers
+                nn_nodes["supervised"]["sync_optimizer"] = phase_coefs_params_optimizer
+            else:
+                # run accumulate for every batch, then train (mean of the accumulated
+                # gradients) and zero once per optimizer step
+                nn_nodes["supervised"]["accumulation"] = {}
+                nn_nodes["supervised"]["accumulation"]["accumulate"] = coefs_params_accumulate
+                nn_nodes["supervised"]["accumulation"]["zero"] = coefs_params_zero
+                nn_nodes["supervised"]["accumulation"]["train"] = phase_network_train_coefs_params_accumulated
+                nn_nodes["supervised"]["accumulation"]["batches"] = accumulation_batches
+        nn_nodes["supervised"]["s_LR"] = s_LR
+        nn_nodes["supervised"]["phase_network_phasecurve_loss"] = phase_network_phasecurve_loss
+        nn_nodes["supervised"]["phase_network_fields_loss"] = phase_network_fields_loss
+        nn_nodes["supervised"]["phase_network_coefs_params_loss"] = phase_network_coefs_params_loss
+        nn_nodes["supervised"]["supervised_label_fields"] = supervised_label_fields
+        # avg ir and xuv loss / individual xuv coefficient loss functions
+        nn_nodes["supervised"]["extra_losses"] = {}
+        nn_nodes["supervised"]["extra_losses"]["ir_loss"] = ir_loss
+        nn_nodes["supervised"]["extra_losses"]["ir_loss_individual"] = ir_loss_individual
+        nn_nodes["supervised"]["extra_losses"]["xuv_loss"] = xuv_loss
+        nn_nodes["supervised"]["extra_losses"]["xuv_individual_coef_loss"] = xuv_individual_coef_loss
+
+
+
+    if "proof_autocorrelate" in parts:
+        nn_nodes["unsupervised"]["proof"] = {}
+        nn_nodes["unsupervised"]["proof"]["x_in"] = x_in
+        nn_nodes["unsupervised"]["proof"]["reconstructed_proof"] = reconstructed_proof
+        nn_nodes["unsupervised"]["proof"]["input_image_proof"] = input_image_proof
+
+        nn_nodes["unsupervised"]["autocorrelate"] = {}
+        nn_nodes["unsupervised"]["autocorrelate"]["x_in"] = x_in
+        nn_nodes["unsupervised"]["autocorrelate"]["reconstructed_autocorrelate"] = reconstructed_autocorrelate
+        nn_nodes["unsupervised"]["autocorrelate"]["input_image_autocorrelate"] = input_image_autocorrelate
+
+    if "unsupervised" in parts:
+        nn_nodes["unsupervised"]["x_in"] = x_in
+        nn_nodes["unsupervised"]["unsupervised_train"] = unsupervised_train
+        # nn_nodes["unsupervised"]["unsupervised_train_log"] = unsupervised_train_log
+        nn_nodes["unsupervised"]["u_LR"] = u_LR
+        nn_nodes["unsupervised"]["unsupervised_learning_loss"] = unsupervised_learning_loss
+        # nn_nodes["unsupervised"]["unsupervised_learning_loss_log"] = unsupervised_learning_loss_log
+        # nn_nodes["unsupervised"]["u_base"] = u_base
+        # nn_nodes["unsupervised"]["u_translate"] = u_translate
+
+        nn_nodes["unsupervised"]["proof"]["u_LR"] = u_LR
+        nn_nodes["unsupervised"]["proof"]["proof_unsupervised_train"] = proof_unsupervised_train
+        nn_nodes["unsupervised"]["proof"]["proof_unsupervised_learning_loss"] = proof_unsupervised_learning_loss
+
+        nn_nodes["unsupervised"]["autocorrelate"]["u_LR"] = u_LR
+        nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_train"] = autocorrelate_unsupervised_train
+        nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_learning_loss"] = autocorrelate_unsupervised_learning_loss
+
+
+        # add nodes for bootstrap method
+        nn_nodes["unsupervised"]["bootstrap"] = {}
+
+        nn_nodes["unsupervised"]["bootstrap"]["u_LR"] = u_LR
+
+        nn_nodes["unsupervised"]["bootstrap"]["normal"] = {}
+        nn_nodes["unsupervised"]["bootstrap"]["normal"]["loss"] = norm_bootstrap_loss
+        nn_nodes["unsupervised"]["bootstrap"]["normal"]["train"] = norm_bootstrap_train
+        nn_nodes["unsupervised"]["bootstrap"]["normal"]["indexes_ph"] = norm_bootstrap_indexes_ph
+
+        nn_nodes["unsupervised"]["bootstrap"]["proof"] = {}
+        nn_nodes["unsupervised"]["bootstrap"]["proof"]["loss"] = proof_bootstrap_loss
+        nn_nodes["unsupervised"]["bootstrap"]["proof"]["train"] = proof_bootstrap_train
+        nn_nodes["unsupervised"]["bootstrap"]["proof"]["indexes_ph"] = proof_bootstrap_indexes_ph
+
+        nn_nodes["unsupervised"]["bootstrap"]["auto"] = {}
+        nn_nodes["unsupervised"]["bootstrap"]["auto"]["loss"]  = auto_bootstrap_loss
+        nn_nodes["unsupervised"]["bootstrap"]["auto"]["train"] = auto_bootstrap_train
+        nn_nodes["unsupervised"]["bootstrap"]["auto"]["indexes_ph"]  = auto_bootstrap_indexes_ph
 
     nn_nodes["general"]["phase_net_output"] = phase_net_output
-    nn_nodes["general"]["reconstructed_trace"] = reconstructed_trace
+    if "reconstruction" in parts:
+        nn_nodes["general"]["reconstructed_trace"] = reconstructed_trace
     nn_nodes["general"]["hold_prob"] = hold_prob
     nn_nodes["general"]["x_in"] = x_in
     nn_nodes["general"]["xuv_coefs_pred"] = xuv_coefs_pred
+    # weights of the phase retrieval net, without optimizer slots, for
+    # restoring a checkpoint saved from a graph of another mode
+    nn_nodes["general"]["phase_net_vars"] = phase_net_vars
 
     return nn_nodes
 
@@ -1415,7 +1970,10 @@ def divide_to_cos_sin(angle_in):
 
 
 if __name__ == "__main__":
-    phase_net_train = PhaseNetTrain(modelname=sys.argv[1])
-    # phase_net_train = PhaseNetTrain(modelname='test_test')
-    phase_net_train.supervised_learn()
+    if phase_parameters.params.train_workers > 1:
+        distributed_train(modelname=sys.argv[1])
+    else:
+        phase_net_train = PhaseNetTrain(modelname=sys.argv[1])
+        # phase_net_train = PhaseNetTrain(modelname='test_test')
+        phase_net_train.supervised_learn()
 
@@ -0,0 +1,424 @@
+import os
+import numpy as np
+import scipy.constants as sc
+import xuv_spectrum.spectrum
+import ir_spectrum.ir_spectrum
+import phase_parameters.params
+import kernel_constants
+
+# numpy version of the forward model in tf_functions (xuv_taylor_to_E,
+# ir_from_params, streaking_trace). same inputs, outputs and normalization,
+# but runs without a tensorflow graph / session so it can be used for
+# parameter sweeps and in worker processes
+
+
+# memory used by the integrand when phase_parameters.params.streaking_memory_budget
+# is None. the full (K, xuv_time, tau_delay, angle) integrand in double precision
+# is several GB, so the numpy version always integrates the K axis in chunks
+default_memory_budget = 2**28
+
+# stored outputs of the forward model for parity_inputs (save_reference)
+reference_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "np_reference.npz")
+
+
+def np_ifft(array, shift, axis=0):
+
+    shifted = np.roll(array, shift=shift, axis=axis)
+    # fft
+    time_domain_not_shifted = np.fft.ifft(shifted, axis=axis)
+    # shift again
+    time_domain = np.roll(time_domain_not_shifted, shift=shift, axis=axis)
+
+    return time_domain
+
+
+def np_fft(array, shift, axis=0):
+
+    shifted = np.roll(array, shift=shift, axis=axis)
+    # fft
+    freq_domain_not_shifted = np.fft.fft(shifted, axis=axis)
+    # shift again
+    freq_domain = np.roll(freq_domain_not_shifted, shift=shift, axis=axis)
+
+    return freq_domain
+
+
+def xuv_taylor_to_E(coefficients_in):
+
+    coefficients_in = np.asarray(coefficients_in, dtype=np.float64)
+    assert coefficients_in.shape[1] == phase_parameters.params.xuv_phase_coefs
+
+    Ef = xuv_spectrum.spectrum.Ef.reshape(1, -1)
+    Ef_photon = xuv_spectrum.spectrum.Ef_photon.reshape(1, -1)
+
+    taylor_constants = kernel_constants.taylor_constants()
+
+    # reshape the coef values and scale them
+    coef_values = coefficients_in.reshape(len(coefficients_in), -1, 1)
+    coef_values = coef_values * taylor_constants["amplitude_scaler"].reshape(1, -1, 1)
+    coef_values = coef_values * taylor_constants["scaler_2"].reshape(1, -1, 1)
+
+    # divide by the factorials
+    coef_div_fact = coef_values / taylor_constants["factorials"].reshape(1, -1, 1)
+
+    # multiply by the fmat
+    taylor_coefs_mat = coef_div_fact * taylor_constants["exp_mat_fmat"].reshape(1, phase_parameters.params.xuv_phase_coefs, -1)
+
+    # this is the phase angle, summed along the taylor terms
+    phasecurve = np.sum(taylor_coefs_mat, axis=1)
+
+    # apply the phase angle to Ef
+    Ef_prop = Ef * np.exp(1j * phasecurve)
+    Ef_photon_prop = Ef_photon * np.exp(1j * phasecurve)
+
+    # fourier transform for time propagated signal
+    Et_prop = np_ifft(Ef_prop, shift=int(xuv_spectrum.spectrum.N/2), axis=1)
+    Et_photon_prop = np_ifft(Ef_photon_prop, shift=int(xuv_spectrum.spectrum.N/2), axis=1)
+
+    E_prop = {}
+    E_prop["f"] = Ef_prop
+    E_prop["f_cropped"] = Ef_prop[:, xuv_spectrum.spectrum.indexmin: xuv_spectrum.spectrum.indexmax]
+    E_prop["f_photon_cropped"] = Ef_photon_prop[:, xuv_spectrum.spectrum.indexmin: xuv_spectrum.spectrum.indexmax]
+    E_prop["t"] = Et_prop
+    E_prop["t_photon"] = Et_photon_prop
+    E_prop["phasecurve_cropped"] = phasecurve[:, xuv_spectrum.spectrum.indexmin: xuv_spectrum.spectrum.indexmax]
+
+    return E_prop
+
+
+def ir_from_params(ir_param_values):
+
+    ir_param_values = np.asarray(ir_param_values, dtype=np.float64)
+    amplitudes = phase_parameters.params.ir_param_amplitudes
+
+    # construct param values from normalized input
+    scaled_values = {}
+    for i, key in enumerate(["phase_range", "clambda_range", "pulseduration_range", "I_range"]):
+        # middle and half the range of the variables
+        avg = (amplitudes[key][0] + amplitudes[key][1])/2
+        half_range = (amplitudes[key][1] - amplitudes[key][0]) / 2
+        scaled_values[key.split("_")[0]] = avg + ir_param_values[:, i] * half_range
+
+    # convert to SI units
+    W = 1
+    cm = 1e-2
+    um = 1e-6
+    fs = 1e-15
+
+    scaled_values_si = {}
+    scaled_values_si["I"] = scaled_values["I"] * 1e13 * W / cm ** 2
+    scaled_values_si["f0"] = sc.c / (um * scaled_values["clambda"])
+    scaled_values_si["t0"] = scaled_values["pulseduration"] * fs
+
+    # calculate ponderomotive energy in SI units
+    Up = (sc.elementary_charge ** 2 * np.abs(scaled_values_si["I"])) / (2 * sc.c * sc.epsilon_0 * sc.electron_mass * (2 * np.pi * scaled_values_si["f0"]) ** 2)
+
+    # convert to AU
+    values_au = {}
+    values_au["Up"] = Up / sc.physical_constants['atomic unit of energy'][0]
+    values_au["f0"] = scaled_values_si["f0"] * sc.physical_constants['atomic unit of time'][0]
+    values_au["t0"] = scaled_values_si["t0"] / sc.physical_constants['atomic unit of time'][0]
+
+    # calculate driving amplitude in AU
+    E0 = np.sqrt(4 * values_au["Up"] * (2 * np.pi * values_au["f0"]) ** 2)
+
+    tmat = ir_spectrum.ir_spectrum.tmat.reshape(1, -1)
+
+    # slow oscilating envelope
+    Et_slow_osc = E0.reshape(-1, 1) * np.exp(-2*np.log(2) * (tmat / values_au["t0"].reshape(-1, 1))**2)
+
+    # fast oscilating envelope
+    Et_fast_osc = np.exp(1j * 2 * np.pi * values_au["f0"].reshape(-1, 1) * tmat)
+
+    # Pulse before phase applied
+    Et = Et_slow_osc * Et_fast_osc
+
+    # Fourier transform
+    Ef = np_fft(Et, shift=int(len(ir_spectrum.ir_spectrum.tmat)/2), axis=1)
+
+    # apply phase angle
+    Ef_phase = Ef * np.exp(1j * scaled_values["phase"].reshape(-1, 1))
+
+    # inverse fourier transform
+    Et_phase = np_ifft(Ef_phase, shift=int(len(ir_spectrum.ir_spectrum.tmat) / 2), axis=1)
+
+    E_prop = {}
+    E_prop["f"] = Ef_phase
+    E_prop["f_cropped"] = Ef_phase[:, ir_spectrum.ir_spectrum.start_index:ir_spectrum.ir_spectrum.end_index]
+    E_prop["t"] = Et_phase
+
+    out = {}
+    out["scaled_values"] = scaled_values
+    out["E_prop"] = E_prop
+
+    return out
+
+
+def k_chunk_size(memory_budget, N_theta=1):
+    """
+    number of K values which fit in the memory budget (bytes), the numpy
+    version holds the phase (float64) and its exponential (complex128)
+    """
+    bytes_per_element = 8 + 16
+    bytes_per_k = bytes_per_element * xuv_spectrum.spectrum.N * len(phase_parameters.params.delay_values) * N_theta
+    return int(max(1, min(len(phase_parameters.params.K), memory_budget // bytes_per_k)))
+
+
+def xuv_time_window(xuv_time_domain, time_window):
+    """
+    indexes (start, stop) of the xuv time axis used in the streaking integral,
+    same as tf_functions.xuv_time_window
+    """
+    if isinstance(time_window, (tuple, list)):
+        return int(time_window[0]), int(time_window[1])
+
+    xuv_abs = np.abs(xuv_time_domain)
+    limit = 0.5 * time_window * np.sum(xuv_abs)
+    # number of points at each edge which can be removed
+    start = int(np.sum(np.cumsum(xuv_abs) <= limit))
+    end_points = int(np.sum(np.cumsum(xuv_abs[::-1]) <= limit))
+
+    return start, len(xuv_abs) - end_points
+
+
+def streaking_fields(xuv_cropped_f_in, ir_cropped_f_in, spectral_path=None):
+    """
+    numpy version of tf_functions.streaking_fields
+    """
+    if spectral_path is None:
+        spectral_path = phase_parameters.params.streaking_spectral_path
+    if spectral_path not in ("fft", "band"):
+        raise ValueError("spectral_path must be 'fft' or 'band': {}".format(spectral_path))
+
+    xuv_cropped_f_in = np.asarray(xuv_cropped_f_in, dtype=np.complex128)
+    ir_cropped_f_in = np.asarray(ir_cropped_f_in, dtype=np.complex128)
+    dt = xuv_spectrum.spectrum.dt
+    fields = {}
+
+    if spectral_path == "band":
+        band = kernel_constants.band_constants()
+        fields["xuv_t"] = band["xuv_basis"] @ xuv_cropped_f_in
+        # A(t) on the delay span, starting from the cumsum of the ir before it
+        ir_start = np.sum(band["ir_start_weights"] * ir_cropped_f_in)
+        A_t = -1.0 * dt * (np.real(ir_start) + np.cumsum(np.real(band["ir_basis"] @ ir_cropped_f_in)))
+        # integrate A_L(t) and A_L(t)^2 up to a constant
+        fields["A_int"] = -1.0 * dt * np.cumsum(A_t[::-1])[::-1]
+        fields["A2_int"] = -1.0 * dt * np.cumsum((A_t**2)[::-1])[::-1]
+        fields["delayindexes"] = band["delayindexes_span"]
+        return fields
+
+    streak_constants = kernel_constants.streaking_constants()
+
+    #-----------------------------------------------------------------
+    # zero pad the spectrum of ir and xuv input to match the full original f matrices
+    #-----------------------------------------------------------------
+    padded_xuv_f = np.pad(xuv_cropped_f_in, (xuv_spectrum.spectrum.indexmin, xuv_spectrum.spectrum.N - xuv_spectrum.spectrum.indexmax))
+    padded_ir_f = np.pad(ir_cropped_f_in, (ir_spectrum.ir_spectrum.start_index, ir_spectrum.ir_spectrum.N - ir_spectrum.ir_spectrum.end_index))
+    # fourier transform the padded xuv
+    fields["xuv_t"] = np_ifft(padded_xuv_f, shift=int(xuv_spectrum.spectrum.N / 2))
+
+    #------------------------------------------------------------------
+    #------ zero pad ir in frequency space to match xuv timestep-------
+    #------------------------------------------------------------------
+    N_req = int(streak_constants["N_req"])
+    pad_2 = int(streak_constants["pad_2"])
+    padded_ir_2 = np.pad(padded_ir_f, (pad_2, pad_2))
+    # calculate ir with matching dt in time, scaled to the original
+    ir_t_matched_dt_scaled = np_ifft(padded_ir_2, shift=int(N_req / 2)) * (N_req / ir_spectrum.ir_spectrum.N)
+
+    #------------------------------------------------------------------
+    # ---------------------integrate ir pulse--------------------------
+    #------------------------------------------------------------------
+    A_t = -1.0 * dt * np.cumsum(np.real(ir_t_matched_dt_scaled))
+    # integrate A_L(t) and A_L(t)^2
+    fields["A_int"] = -1.0 * dt * np.cumsum(A_t[::-1])[::-1]
+    fields["A2_int"] = -1.0 * dt * np.cumsum((A_t**2)[::-1])[::-1]
+    fields["delayindexes"] = streak_constants["delayindexes"]
+
+    return fields
+
+
+def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in, memory_budget=None, time_window=None,
+                    angle_in=None, Beta_in=None, theta_max=None, N_theta=None, spectral_path=None):
+    """
+    numpy version of tf_functions.streaking_trace for one xuv / ir pair
+
+    xuv_cropped_f_in: cropped xuv spectrum (xuv_E_prop["f_cropped"][0])
+    ir_cropped_f_in: cropped ir spectrum (ir_E_prop["f_cropped"][0])
+
+    the angle arguments and spectral_path ("fft" or "band") are the same as
+    in tf_functions.streaking_trace
+
+    returns the normalized trace (K, tau_delay)
+    """
+    if memory_budget is None:
+        memory_budget = phase_parameters.params.streaking_memory_budget
+    if memory_budget is None:
+        memory_budget = default_memory_budget
+    if time_window is None:
+        time_window = phase_parameters.params.streaking_time_window
+    if Beta_in is None:
+        Beta_in = phase_parameters.params.streaking_Beta
+
+    # define the angle for streaking trace collection
+    if angle_in is None:
+        if theta_max is None:
+            theta_max = phase_parameters.params.streaking_theta_max
+        if N_theta is None:
+            N_theta = phase_parameters.params.streaking_N_theta
+        angle_in = np.linspace(0, theta_max, N_theta)
+    angle_in = np.asarray(angle_in, dtype=np.float64)
+    N_theta = len(angle_in)
+
+    streak_constants = kernel_constants.streaking_constants()
+    dt = xuv_spectrum.spectrum.dt
+
+    #------------------------------------------------------------------
+    # -------------xuv field and integrals of the ir pulse--------------
+    #------------------------------------------------------------------
+    fields = streaking_fields(xuv_cropped_f_in, ir_cropped_f_in, spectral_path)
+    xuv_time_domain = fields["xuv_t"]
+    # (xuv_time, tau_delay)
+    ir_values = fields["A_int"][fields["delayindexes"]]
+    ir_values_2 = fields["A2_int"][fields["delayindexes"]]
+
+    #------------------------------------------------------------------
+    #-------------------construct streaking trace----------------------
+    #------------------------------------------------------------------
+    p = streak_constants["p"]
+    e_fft = streak_constants["e_fft"]
+    spec_angle = np.cos(angle_in)
+    angular_distribution = 1 + (Beta_in / 2) * (3 * (np.cos(angle_in))**2 - 1)
+
+    # crop the xuv time axis to the pulse
+    if time_window is not None:
+        time_start, time_stop = xuv_time_window(xuv_time_domain, time_window)
+    else:
+        time_start, time_stop = 0, xuv_spectrum.spectrum.N
+    xuv_time_domain = xuv_time_domain[time_start:time_stop]
+    ir_values = ir_values[time_start:time_stop]
+    ir_values_2 = ir_values_2[time_start:time_stop]
+    # xuv and fourier term (K, xuv_time)
+    xuv_e_fft = e_fft[:, time_start:time_stop] * xuv_time_domain.reshape(1, -1)
+
+    integration = np.zeros((len(p), len(phase_parameters.params.delay_values), N_theta), dtype=np.complex128)
+    k_chunk = k_chunk_size(memory_budget, N_theta)
+    for k_start in range(0, len(p), k_chunk):
+        k_slice = slice(k_start, k_start + k_chunk)
+
+        # phase (K, xuv_time, tau_delay, angle)
+        p_A_t_integ_t_phase = (p[k_slice].reshape(-1, 1, 1, 1) * spec_angle.reshape(1, 1, 1, -1) * ir_values.reshape(1, ir_values.shape[0], -1, 1)
+                               + 0.5 * ir_values_2.reshape(1, ir_values_2.shape[0], -1, 1))
+        ir_phi = np.exp(1j * p_A_t_integ_t_phase)
+        # integrate over the xuv time
+        integration[k_slice] = dt * np.einsum("kt,ktdn->kdn", xuv_e_fft[k_slice], ir_phi)
+
+    integration = integration * angular_distribution.reshape(1, 1, -1)
+
+    # absolute square the matrix
+    image_not_scaled = np.abs(integration)**2
+    image_not_scaled = image_not_scaled * np.sin(angle_in).reshape(1, 1, -1)
+
+    # integrate along the theta axis
+    dtheta = angle_in[1] - angle_in[0]
+    theta_integration = dtheta * np.sum(image_not_scaled, axis=2)
+
+    scaled = theta_integration - np.min(theta_integration)
+    image = scaled / np.max(scaled)
+
+    return image
+
+
+def streaking_trace_batch(xuv_cropped_f_in, ir_cropped_f_in, memory_budget=None, time_window=None, **angle_kwargs):
+    """
+    streaking traces [batch, K, tau_delay] for [batch, n_xuv_freq] and
+    [batch, n_ir_freq] spectra
+    """
+    return np.array([streaking_trace(xuv_cropped_f, ir_cropped_f, memory_budget=memory_budget, time_window=time_window,
+                                     **angle_kwargs)
+                     for xuv_cropped_f, ir_cropped_f in zip(xuv_cropped_f_in, ir_cropped_f_in)])
+
+
+def parity_inputs(n_samples, seed=0):
+    """
+    random xuv coefficients (normalized, no linear phase) and ir parameters
+    """
+    random_state = np.random.RandomState(seed)
+    xuv_coefs = 2 * random_state.rand(n_samples, phase_parameters.params.xuv_phase_coefs) - 1.0
+    xuv_coefs[:, 0] = 0.0
+    xuv_coefs = xuv_coefs / np.sum(np.abs(xuv_coefs), axis=1).reshape(-1, 1)
+    ir_values = 2 * random_state.rand(n_samples, 4) - 1.0
+    return xuv_coefs, ir_values
+
+
+def reference_outputs(xuv_coefs, ir_values):
+    """
+    xuv / ir time domain fields and traces of the numpy forward model
+    """
+    xuv_E_prop = xuv_taylor_to_E(xuv_coefs)
+    ir_E_prop = ir_from_params(ir_values)["E_prop"]
+    traces = np.array([streaking_trace(xuv_E_prop["f_cropped"][i], ir_E_prop["f_cropped"][i])
+                       for i in range(len(xuv_coefs))])
+    return {"xuv_t": xuv_E_prop["t"], "ir_t": ir_E_prop["t"], "trace": traces}
+
+
+def save_reference(filename=reference_filename, n_samples=1, seed=0):
+    """
+    store the outputs of the current forward model for parity_inputs, read
+    by test_np_parity.py, only regenerate after an intended change of the model
+    """
+    xuv_coefs, ir_values = parity_inputs(n_samples, seed)
+    outputs = reference_outputs(xuv_coefs, ir_values)
+    np.savez_compressed(filename, xuv_coefs=xuv_coefs, ir_values=ir_values, **outputs)
+
+
+def parity_test(n_samples=4, tolerance=1e-3, seed=0, precision=None):
+    """
+    compare the numpy forward model against the tensorflow graphs in
+    tf_functions for random xuv coefficients and ir parameters, raises an
+    AssertionError if any trace differs by more than tolerance
+
+    precision: precision policy of the tensorflow graphs (tf_functions.precision_dtypes)
+    """
+    import tensorflow as tf
+    import tf_functions
+
+    xuv_coefs, ir_values = parity_inputs(n_samples, seed)
+
+    graph = tf.Graph()
+    with graph.as_default():
+        # float64 inputs in double precision, rounding the inputs to float32
+        # alone gives errors of ~1e-7
+        input_dtype = tf_functions.precision_dtypes(precision)["real"]
+        xuv_coefs_in = tf.placeholder(input_dtype, shape=[None, phase_parameters.params.xuv_phase_coefs])
+        ir_values_in = tf.placeholder(input_dtype, shape=[None, 4])
+        xuv_E_prop = tf_functions.xuv_taylor_to_E(xuv_coefs_in, precision=precision)
+        ir_E_prop = tf_functions.ir_from_params(ir_values_in, precision=precision)["E_prop"]
+        image = tf_functions.streaking_trace(xuv_cropped_f_in=xuv_E_prop["f_cropped"][0],
+                                             ir_cropped_f_in=ir_E_prop["f_cropped"][0], precision=precision)
+
+    np_xuv_E_prop = xuv_taylor_to_E(xuv_coefs)
+    np_ir_E_prop = ir_from_params(ir_values)["E_prop"]
+
+    errors = {"xuv_t": [], "ir_t": [], "trace": []}
+    with tf.Session(graph=graph) as sess:
+        for i in range(n_samples):
+            feed_dict = {xuv_coefs_in: xuv_coefs[i:i+1], ir_values_in: ir_values[i:i+1]}
+            tf_xuv_t, tf_ir_t, tf_trace = sess.run([xuv_E_prop["t"], ir_E_prop["t"], image], feed_dict=feed_dict)
+
+            np_trace = streaking_trace(np_xuv_E_prop["f_cropped"][i], np_ir_E_prop["f_cropped"][i])
+
+            errors["xuv_t"].append(np.max(np.abs(tf_xuv_t[0] - np_xuv_E_prop["t"][i])) / np.max(np.abs(np_xuv_E_prop["t"][i])))
+            errors["ir_t"].append(np.max(np.abs(tf_ir_t[0] - np_ir_E_prop["t"][i])) / np.max(np.abs(np_ir_E_prop["t"][i])))
+            errors["trace"].append(np.max(np.abs(tf_trace - np_trace)))
+
+    for key in errors:
+        print("max {} error: {}".format(key, np.max(errors[key])))
+        assert np.max(errors[key]) < tolerance, "numpy and tensorflow {} differ by {}".format(key, np.max(errors[key]))
+
+    return errors
+
+
+if __name__ == "__main__":
+    parity_test()
+    parity_test(precision="double", tolerance=1e-8)
@@ -14,6 +14,14 @@ xuv_phase_coefs=5
 amplitude=20.0
 # amplitude=4.0
 
+# additional scaler of the taylor coefficients
+# these are arbitrary numbers that were found to keep the field in the time window
+# for sample 2
+# scaler_2 = [1.0, 1.0, 0.2, 0.06, 0.04]
+# for sample 3
+# ++++ force the linear phase term to always be 0
+scaler_2 = [0.0, 1.3, 0.15, 0.03, 0.01]
+
 #infrared params
 # for sample 2
 # ir_param_amplitudes = {}
@@ -59,6 +67,102 @@ K = measured_trace.energy
 
 
 
+# memory (bytes) the streaking trace integrand may use, the K axis is
+# integrated in chunks to stay below this. None builds the full integrand
+# streaking_memory_budget = 4 * 1024**3
+streaking_memory_budget = None
+
+# window of the xuv time axis used in the streaking integral, see
+# tf_functions.xuv_time_window. a (start, stop) index tuple, a tolerance
+# for an adaptive window, or None for the full time axis
+# streaking_time_window = (threshold_min_index, threshold_max_index)
+# streaking_time_window = 1e-4
+streaking_time_window = None
+
+# photoelectron angles integrated in the streaking trace
+# theta from 0 to streaking_theta_max with streaking_N_theta points and the
+# angular distribution 1 + (Beta / 2) * (3cos^2(theta) - 1)
+streaking_theta_max = np.pi/2
+streaking_N_theta = 10
+streaking_Beta = 1
+
+# engine of tf_functions.streaking_trace_no_angle, "direct" or "fft"
+streaking_engine = "direct"
+
+# precision policy of the forward model, see tf_functions.precision_dtypes
+# "single": complex64, "mixed": exp arguments in float64, accumulation in
+# complex64. "double" (complex128) is for validation only and is passed to
+# the tf_functions graphs explicitly
+forward_precision = "single"
+
+# "fft": pad the cropped xuv / ir spectra and inverse fft the full axes
+# "band": fourier matrices of the nonzero bands, ir only on the delay span
+# see tf_functions.streaking_fields
+streaking_spectral_path = "fft"
+
+
+# shot noise levels (maximum counts) of the training data, each clean trace
+# is used once without noise and once at each of these levels
+noise_counts = np.round(np.linspace(10, 100, 5))
+
+
+# candidate xuv coefficients per batch of the rejection sampler
+xuv_sample_batch_size = 1000
+
+
+# hdf5 data files: trace dtype ("float64", "float32" or "uint16"), rows per
+# chunk (the training batch size) and blosc:lz4 compression level (0: none)
+data_trace_format = "float64"
+data_chunk_rows = 10
+data_complevel = 0
+# samples between the checkpoints of generate_data3.generate_samples
+data_checkpoint_every = 500
+
+
+# training data loader: queued batches, batches per contiguous read and
+# block shuffled epochs
+data_prefetch_batches = 20
+data_block_batches = 100
+data_shuffle = False
+# memmap export of train3.hdf5 (memmap_data.py export) read by the feed_dict
+# loader (GetData) instead of the hdf5 file, None: the hdf5 file
+data_memmap_directory = None
+# training input of network3: "tf_data" (data_loader.tf_dataset), "online"
+# (data_loader.online_batch) or "feed_dict" (GetData), and the shuffle buffer
+# (rows) of the tf.data pipeline
+train_input_pipeline = "feed_dict"
+data_shuffle_buffer = 1000
+# online generation: candidate samples per simulation step, queue capacity
+# (rows), simulation threads and samples per training epoch
+online_candidate_batch = 20
+online_queue_capacity = 200
+online_threads = 2
+online_epoch_samples = 64000 * 6
+# supervised training: traces per batch, batches of accumulated gradients per
+# optimizer step, learning rate at train_base_batch traces per step scaled
+# ("linear", "sqrt" or "none") to the traces per step, linear warmup (steps)
+train_batch_size = 10
+train_accumulation_steps = 1
+train_learning_rate = 0.0001
+train_base_batch = 10
+train_lr_scaling = "linear"
+train_warmup_steps = 0
+# evaluation, plots and measured trace retrieval at the end of each epoch:
+# "background" (worker process restoring the epoch checkpoint), "inline" or
+# "none", headless: no plots and no matplotlib import
+train_evaluation = "inline"
+train_headless = False
+# data parallel training (network3.distributed_train): worker processes on
+# this host with train_batch_size traces each per optimizer step, and the
+# first port of the localhost cluster (parameter server, then the workers)
+train_workers = 1
+train_cluster_port = 2222
+# thread pools of the training sessions, 0: the tensorflow default with one
+# worker, the cores of the host divided among the workers with more
+train_inter_op_threads = 0
+train_intra_op_threads = 0
+
+
 # threshold scaler for the generated pulses
 threshold_scaler = 0.03
 
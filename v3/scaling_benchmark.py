@@ -0,0 +1,51 @@
+import argparse
+import multiprocessing
+
+# training throughput of network3.distributed_train from 1 to max_workers
+# worker processes on this host, no checkpoints or evaluations
+#
+# python scaling_benchmark.py --max_workers 16 --steps 200
+# python scaling_benchmark.py --workers 1 2 4 8 --steps 200
+
+
+def worker_counts(max_workers):
+    # powers of two and max_workers
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def scaling_benchmark(counts, steps):
+    import network3
+
+    results = []
+    for workers in counts:
+        results.append(network3.distributed_train(None, workers=workers, steps=steps))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="training samples per second of network3.distributed_train")
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    parser.add_argument("--max_workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    counts = args.workers if args.workers is not None else worker_counts(args.max_workers)
+    results = scaling_benchmark(counts, args.steps)
+
+    # speedup relative to the samples per second of one worker
+    single = results[0]["samples_per_second"] / results[0]["workers"]
+    for result in results:
+        speedup = result["samples_per_second"] / single
+        print("{} workers: {} samples/s, speedup {}, efficiency {} %".format(
+            result["workers"], round(result["samples_per_second"], 1), round(speedup, 2),
+            round(100 * speedup / result["workers"], 1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,12 @@ from xuv_spectrum import spectrum
 import matplotlib.pyplot as plt
 import numpy as np
 import tf_functions
+import network3
 import sys
 # modelname = "DDD3normal_notanh2_long_512dense_leaky_activations_hp1_120ksamples_sample4_1_multires_stride"
 test_run = "noise_test_1"
 import importlib
+import inspect
 from phase_parameters import params
 import measured_trace.get_trace as get_measured_trace
 
@@ -394,23 +396,34 @@ class SupervisedRetrieval:
 
         self.modelname = model
         self.network3 = importlib.import_module("models.network3_"+self.modelname)
-        # build neural net graph
-        self.nn_nodes = self.network3.setup_neural_net()
+        # build neural net graph, only the inference nodes if the model's
+        # network3 copy has the graph modes
+        if "mode" in inspect.signature(self.network3.setup_neural_net).parameters:
+            self.nn_nodes = self.network3.setup_neural_net(mode="infer")
+        else:
+            self.nn_nodes = self.network3.setup_neural_net()
 
         # restore session
         self.sess = tf.Session()
         self.saver = tf.train.Saver()
         self.saver.restore(self.sess, './models/{}.ckpt'.format(self.modelname))
 
-    def retrieve(self, trace):
+        # the model copies share the node names of network3
+        self.retrieval_nodes = network3.retrieval_nodes(self.nn_nodes)
 
+    def retrieve_result(self, trace):
+        """
+        network3.RetrievalResult of trace, every output in one run
+        """
         self.feed_dict = {self.nn_nodes["general"]["x_in"]: trace.reshape(1, -1)}
-        # return self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"], feed_dict=self.feed_dict)
-        trace_recons = self.sess.run(self.nn_nodes["general"]["reconstructed_trace"], feed_dict=self.feed_dict)
-        xuv_retrieved = self.sess.run(self.nn_nodes["general"]["xuv_coefs_pred"], feed_dict=self.feed_dict)
-        ir_params_pred = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["predicted_coefficients_params"], feed_dict=self.feed_dict)[:, params.xuv_phase_coefs:]
-        predicted_coefficients_params = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["predicted_coefficients_params"], feed_dict=self.feed_dict)
+        return network3.run_retrieval(self.sess, self.retrieval_nodes, self.feed_dict)
 
+    def retrieve(self, trace):
+        retrieval = self.retrieve_result(trace)
+        trace_recons = retrieval.reconstructed
+        xuv_retrieved = retrieval.xuv_coefs
+        ir_params_pred = retrieval.predicted_coefficients_params[:, params.xuv_phase_coefs:]
+        predicted_coefficients_params = retrieval.predicted_coefficients_params
 
         retrieve_output = {}
         retrieve_output["trace_recons"] = trace_recons
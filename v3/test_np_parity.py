@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import np_functions
+
+# numpy forward model against the outputs stored in np_reference.npz
+# (np_functions.save_reference), and numpy / tensorflow parity
+# (np_functions.parity_test) for every precision policy, skipped without
+# tensorflow
+#
+# python -m pytest -q test_np_parity.py
+
+
+def test_reference():
+    reference = np.load(np_functions.reference_filename)
+    outputs = np_functions.reference_outputs(reference["xuv_coefs"], reference["ir_values"])
+    for key in ["xuv_t", "ir_t", "trace"]:
+        scale = np.max(np.abs(reference[key]))
+        assert np.max(np.abs(outputs[key] - reference[key])) < 1e-8 * scale, key
+
+
+@pytest.mark.parametrize("precision, tolerance", [("single", 1e-3), ("mixed", 1e-3), ("double", 1e-8)])
+def test_parity(precision, tolerance):
+    pytest.importorskip("tensorflow")
+    errors = np_functions.parity_test(n_samples=2, tolerance=tolerance, precision=precision)
+    for key in ["xuv_t", "ir_t", "trace"]:
+        assert len(errors[key]) == 2
@@ -1,12 +1,12 @@
 import tensorflow as tf
 import xuv_spectrum.spectrum
 import ir_spectrum.ir_spectrum
-import matplotlib.pyplot as plt
 import numpy as np
 from scipy.special import factorial
 import scipy.constants as sc
 import math
 import phase_parameters.params
+import kernel_constants
 # import generate_data3
 import pickle
 # import unsupervised_retrieval
@@ -42,6 +42,7 @@ class TestGraphs:
 
     def plot_xuv_trace(self, feed_dict_in):
 
+        import matplotlib.pyplot as plt
         feed_dict = {
             self.xuv_coefs_in: feed_dict_in["xuv_coefs_in"],
             self.ir_values_in: feed_dict_in["ir_values_in"]
@@ -109,6 +110,7 @@ def normal_text(ax, pos, text, ha=None):
 
 
 def animate_trace(sess, xuv_coefs_in, ir_values_in, xuv_E_prop, image2_2):
+    import matplotlib.pyplot as plt
     # make graph
     fig = plt.figure(figsize=(17, 5))
     fig.subplots_adjust(wspace=0.4, left=0.05, right=0.95)
@@ -208,6 +210,7 @@ def animate_trace(sess, xuv_coefs_in, ir_values_in, xuv_E_prop, image2_2):
 
 
 def compare_A_A2_animate(sess, xuv_coefs_in, ir_values_in, xuv_E_prop, image2, image2_2):
+    import matplotlib.pyplot as plt
     # ===============================================
     # =======testing trace difference A/A^2==========
     # ===============================================
@@ -384,6 +387,35 @@ def proof_trace(trace):
     return nodes
 
 
+def add_shot_noise(traces, counts=None, seed=None):
+    """
+    shot noise of a batch of traces at every count level in one op, the
+    graph version of generate_data3.add_shot_noise_batch
+
+    traces: [batch, ...] clean traces
+    counts: maximum counts of each noise level, defaults to
+    phase_parameters.params.noise_counts
+    seed: op seed of tf.random_poisson, the sequence is reproducible with
+    tf.set_random_seed
+
+    returns [batch, len(counts), ...], each noisy trace normalized to a maximum of 1
+    """
+    if counts is None:
+        counts = phase_parameters.params.noise_counts
+
+    counts = np.array(counts, dtype=np.float64)
+    trace_rank = len(traces.get_shape().as_list())
+    counts_tens = tf.constant(counts.reshape((1, -1) + (1,) * (trace_rank - 1)), dtype=traces.dtype)
+
+    discrete_trace = tf.round(tf.expand_dims(traces, axis=1) * counts_tens)
+    # output shape [] -> one sample per rate
+    noisy_trace = tf.random_poisson(discrete_trace, shape=[], dtype=traces.dtype, seed=seed)
+
+    # normalize each noisy trace
+    reduce_axes = list(range(2, trace_rank + 1))
+    return noisy_trace / tf.reduce_max(noisy_trace, axis=reduce_axes, keepdims=True)
+
+
 def tf_ifft(tensor, shift, axis=0):
 
     shifted = tf.manip.roll(tensor, shift=shift, axis=axis)
@@ -406,56 +438,77 @@ def tf_fft(tensor, shift, axis=0):
     return freq_domain
 
 
-def xuv_taylor_to_E(coefficients_in):
+def precision_dtypes(precision=None):
+    """
+    tensorflow dtypes of the forward model for a precision policy
+
+    "single": float32 / complex64 everywhere
+    "double": float64 / complex128 everywhere, for validation
+    "mixed": the arguments of exp (ir integrals, momentum, phase curve) and
+    the exponentials in float64 / complex128, the fields and the
+    accumulation of the integrals in complex64
+
+    precision defaults to phase_parameters.params.forward_precision, which
+    is "single" or "mixed": the traces of the default precision are float32
+    like the inputs of the network, "double" is only built when it is passed
+    explicitly (np_functions.parity_test)
+    """
+    if precision is None:
+        precision = phase_parameters.params.forward_precision
+        if precision == "double":
+            raise ValueError("forward_precision 'double' would give float64 traces to the float32 network and "
+                             "data graphs, pass precision='double' to the tf_functions graphs for validation")
+    if precision not in ("single", "double", "mixed"):
+        raise ValueError("precision must be 'single', 'double' or 'mixed': {}".format(precision))
+
+    dtypes = {}
+    dtypes["real"] = tf.float64 if precision == "double" else tf.float32
+    dtypes["complex"] = tf.complex128 if precision == "double" else tf.complex64
+    dtypes["phase_real"] = tf.float32 if precision == "single" else tf.float64
+    dtypes["phase_complex"] = tf.complex64 if precision == "single" else tf.complex128
+    return dtypes
+
+
+def phase_exp(phase, dtypes):
+    """
+    exp(i*phase) evaluated in the phase precision, returned in the field precision
+    """
+    phase = tf.cast(phase, dtypes["phase_real"])
+    return tf.cast(tf.exp(tf.complex(imag=phase, real=tf.zeros_like(phase))), dtypes["complex"])
+
+
+def xuv_taylor_to_E(coefficients_in, precision=None):
 
     assert int(coefficients_in.shape[1]) == phase_parameters.params.xuv_phase_coefs
 
-    amplitude = phase_parameters.params.amplitude
+    dtypes = precision_dtypes(precision)
 
-    Ef = tf.constant(xuv_spectrum.spectrum.Ef, dtype=tf.complex64)
+    Ef = tf.constant(xuv_spectrum.spectrum.Ef, dtype=dtypes["complex"])
     Ef = tf.reshape(Ef, [1, -1])
-    Ef_photon = tf.constant(xuv_spectrum.spectrum.Ef_photon, dtype=tf.complex64)
+    Ef_photon = tf.constant(xuv_spectrum.spectrum.Ef_photon, dtype=dtypes["complex"])
     Ef_photon = tf.reshape(Ef_photon, [1, -1])
 
-    fmat_taylor = tf.constant(xuv_spectrum.spectrum.fmat-xuv_spectrum.spectrum.f0, dtype=tf.float32)
+    taylor_constants = kernel_constants.taylor_constants()
 
     # create factorials
-    factorials = tf.constant(factorial(np.array(range(coefficients_in.shape[1]))+1), dtype=tf.float32)
+    factorials = kernel_constants.graph_constant(taylor_constants, "factorials", dtypes["phase_real"])
     factorials = tf.reshape(factorials, [1, -1, 1])
 
-    # create exponents
-    exponents = tf.constant(np.array(range(coefficients_in.shape[1]))+1, dtype=tf.float32)
-
-    # reshape the taylor fmat
-    fmat_taylor = tf.reshape(fmat_taylor, [1, 1, -1])
-
-    # reshape the exponential matrix
-    exp_mat = tf.reshape(exponents, [1, -1, 1])
-
-    # raise the fmat to the exponential power
-    exp_mat_fmat = tf.pow(fmat_taylor, exp_mat)
-
-    # scale the coefficients
-    amplitude_mat = tf.constant(amplitude, dtype=tf.float32)
-    amplitude_mat = tf.reshape(amplitude_mat, [1, -1, 1])
+    # fmat raised to the exponential power
+    exp_mat_fmat = kernel_constants.graph_constant(taylor_constants, "exp_mat_fmat", dtypes["phase_real"])
+    exp_mat_fmat = tf.expand_dims(exp_mat_fmat, axis=0)
 
     # amplitude scales with exponent
-    amplitude_scaler = tf.pow(amplitude_mat, exp_mat)
+    amplitude_scaler = kernel_constants.graph_constant(taylor_constants, "amplitude_scaler", dtypes["phase_real"])
+    amplitude_scaler = tf.reshape(amplitude_scaler, [1, -1, 1])
 
     # additional scaler
     # these are arbitrary numbers that were found to keep the field in the time window
-
-
-    # for sample 2
-    # scaler_2 = tf.constant(np.array([1.0, 1.0, 0.2, 0.06, 0.04]).reshape(1,-1,1), dtype=tf.float32)
-
-    # for sample 3
-    # ++++ force the linear phase term to always be 0
-    scaler_2 = tf.constant(np.array([0.0, 1.3, 0.15, 0.03, 0.01]).reshape(1,-1,1), dtype=tf.float32)
-
-
+    scaler_2 = kernel_constants.graph_constant(taylor_constants, "scaler_2", dtypes["phase_real"])
+    scaler_2 = tf.reshape(scaler_2, [1, -1, 1])
 
     # reshape the coef values and scale them
+    coefficients_in = tf.cast(coefficients_in, dtypes["phase_real"])
     coef_values = tf.reshape(coefficients_in, [tf.shape(coefficients_in)[0], -1, 1]) * amplitude_scaler * scaler_2
 
     # divide by the factorials
@@ -468,8 +521,8 @@ def xuv_taylor_to_E(coefficients_in):
     phasecurve = tf.reduce_sum(taylor_coefs_mat, axis=1)
 
     # apply the phase angle to Ef
-    Ef_prop = Ef * tf.exp(tf.complex(imag=phasecurve, real=tf.zeros_like(phasecurve)))
-    Ef_photon_prop = Ef_photon * tf.exp(tf.complex(imag=phasecurve, real=tf.zeros_like(phasecurve)))
+    Ef_prop = Ef * phase_exp(phasecurve, dtypes)
+    Ef_photon_prop = Ef_photon * phase_exp(phasecurve, dtypes)
 
     # fourier transform for time propagated signal
     Et_prop = tf_ifft(Ef_prop, shift=int(xuv_spectrum.spectrum.N/2), axis=1)
@@ -480,7 +533,7 @@ def xuv_taylor_to_E(coefficients_in):
     Ef_photon_prop_cropped = Ef_photon_prop[:, xuv_spectrum.spectrum.indexmin: xuv_spectrum.spectrum.indexmax]
 
     # return cropped phase curve
-    phasecurve_cropped = phasecurve[:, xuv_spectrum.spectrum.indexmin: xuv_spectrum.spectrum.indexmax]
+    phasecurve_cropped = tf.cast(phasecurve[:, xuv_spectrum.spectrum.indexmin: xuv_spectrum.spectrum.indexmax], dtypes["real"])
 
     E_prop = {}
     E_prop["f"] = Ef_prop
@@ -494,7 +547,13 @@ def xuv_taylor_to_E(coefficients_in):
     return E_prop
 
 
-def ir_from_params(ir_param_values):
+def ir_from_params(ir_param_values, precision=None):
+    """
+    the ir field is built in the phase precision of the precision policy
+    (see precision_dtypes) and returned in the field precision
+    """
+    dtypes = precision_dtypes(precision)
+    ir_param_values = tf.cast(ir_param_values, dtypes["phase_real"])
 
     amplitudes = phase_parameters.params.ir_param_amplitudes
 
@@ -508,8 +567,8 @@ def ir_from_params(ir_param_values):
         parameters[key]["half_range"] = (amplitudes[key][1] - amplitudes[key][0]) / 2
 
         # create tensorflow constants
-        parameters[key]["tf_avg"] = tf.constant(parameters[key]["avg"], dtype=tf.float32)
-        parameters[key]["tf_half_range"] = tf.constant(parameters[key]["half_range"], dtype=tf.float32)
+        parameters[key]["tf_avg"] = tf.constant(parameters[key]["avg"], dtype=dtypes["phase_real"])
+        parameters[key]["tf_half_range"] = tf.constant(parameters[key]["half_range"], dtype=dtypes["phase_real"])
 
 
     # construct param values from normalized input
@@ -543,7 +602,7 @@ def ir_from_params(ir_param_values):
     E0 = tf.sqrt(4 * values_au["Up"] * (2 * np.pi * values_au["f0"]) ** 2)
 
     # set up the driving IR field amplitude in AU
-    tf_tmat = tf.reshape(tf.constant(ir_spectrum.ir_spectrum.tmat, dtype=tf.float32), [1, -1])
+    tf_tmat = tf.reshape(tf.constant(ir_spectrum.ir_spectrum.tmat, dtype=dtypes["phase_real"]), [1, -1])
     # tf_fmat = tf.reshape(tf.constant(ir_spectrum.ir_spectrum.fmat, dtype=tf.float32), [1, -1])
 
     # slow oscilating envelope
@@ -570,12 +629,12 @@ def ir_from_params(ir_param_values):
     Ef_phase_cropped = Ef_phase[:, ir_spectrum.ir_spectrum.start_index:ir_spectrum.ir_spectrum.end_index]
 
     E_prop = {}
-    E_prop["f"] = Ef_phase
-    E_prop["f_cropped"] = Ef_phase_cropped
-    E_prop["t"] = Et_phase
+    E_prop["f"] = tf.cast(Ef_phase, dtypes["complex"])
+    E_prop["f_cropped"] = tf.cast(Ef_phase_cropped, dtypes["complex"])
+    E_prop["t"] = tf.cast(Et_phase, dtypes["complex"])
 
     out = {}
-    out["scaled_values"] = scaled_tf_values
+    out["scaled_values"] = {key: tf.cast(value, dtypes["real"]) for key, value in scaled_tf_values.items()}
     out["E_prop"] = E_prop
 
     return out
@@ -748,8 +807,8 @@ def streaking_traceA(xuv_cropped_f_in, ir_cropped_f_in):
 
 
 
-    # ionization potential
-    Ip = phase_parameters.params.Ip
+    # constant tensors of the streaking trace
+    streak_constants = kernel_constants.streaking_constants(delay_values=phase_parameters.params.delay_values)
 
     #-----------------------------------------------------------------
     # zero pad the spectrum of ir and xuv input to match the full original f matrices
@@ -773,9 +832,9 @@ def streaking_traceA(xuv_cropped_f_in, ir_cropped_f_in):
     #------ zero pad ir in frequency space to match xuv timestep-------
     #------------------------------------------------------------------
     # calculate N required to match timestep
-    N_req = int(1 / (xuv_spectrum.spectrum.dt * ir_spectrum.ir_spectrum.df))
+    N_req = int(streak_constants["N_req"])
     # this much needs to be padded to each side
-    pad_2 = int((N_req - ir_spectrum.ir_spectrum.N) / 2)
+    pad_2 = int(streak_constants["pad_2"])
     # pad the IR to match dt of xuv
     paddings_ir_2 = tf.constant([[pad_2, pad_2]], dtype=tf.int32)
     padded_ir_2 = tf.pad(padded_ir_f, paddings_ir_2)
@@ -795,29 +854,16 @@ def streaking_traceA(xuv_cropped_f_in, ir_cropped_f_in):
     A_t_integ_t_phase = tf.reverse(flipped_integral, axis=[0])
 
 
-    # ------------------------------------------------------------------
-    # ---------------------make ir t axis-------------------------------
-    # ------------------------------------------------------------------
-    ir_taxis = xuv_spectrum.spectrum.dt * np.arange(-N_req/2, N_req/2, 1)
-
-
-
     # ------------------------------------------------------------------
     # ---------------------find indexes of tau values-------------------
     # ------------------------------------------------------------------
-    center_indexes = []
-    for delay_value in phase_parameters.params.delay_values:
-        index = np.argmin(np.abs(delay_value - ir_taxis))
-        center_indexes.append(index)
-    center_indexes = np.array(center_indexes)
-    rangevals = np.array(range(xuv_spectrum.spectrum.N)) - int((xuv_spectrum.spectrum.N/2))
-    delayindexes = center_indexes.reshape(1, -1) + rangevals.reshape(-1, 1)
+    delayindexes = kernel_constants.graph_constant(streak_constants, "delayindexes", tf.int32)
 
 
     # ------------------------------------------------------------------
     # ------------gather values from integrated array-------------------
     # ------------------------------------------------------------------
-    ir_values = tf.gather(A_t_integ_t_phase, delayindexes.astype(np.int))
+    ir_values = tf.gather(A_t_integ_t_phase, delayindexes)
     ir_values = tf.expand_dims(ir_values, axis=0)
 
 
@@ -825,19 +871,13 @@ def streaking_traceA(xuv_cropped_f_in, ir_cropped_f_in):
     #------------------------------------------------------------------
     #-------------------construct streaking trace----------------------
     #------------------------------------------------------------------
-    # convert K to atomic units
-    K = phase_parameters.params.K * sc.electron_volt  # joules
-    K = K / sc.physical_constants['atomic unit of energy'][0]  # a.u.
-    K = K.reshape(-1, 1, 1)
-    p = np.sqrt(2 * K).reshape(-1, 1, 1)
-    # convert to tensorflow
-    p_tf = tf.constant(p, dtype=tf.float32)
+    # momentum in atomic units
+    p_tf = tf.reshape(kernel_constants.graph_constant(streak_constants, "p", tf.float32), [-1, 1, 1])
     # 3d ir mat
     p_A_t_integ_t_phase3d = p_tf * ir_values
     ir_phi = tf.exp(tf.complex(imag=(p_A_t_integ_t_phase3d), real=tf.zeros_like(p_A_t_integ_t_phase3d)))
     # add fourier transform term
-    e_fft = np.exp(-1j * (K + Ip) * xuv_spectrum.spectrum.tmat.reshape(1, -1, 1))
-    e_fft_tf = tf.constant(e_fft, dtype=tf.complex64)
+    e_fft_tf = tf.expand_dims(kernel_constants.graph_constant(streak_constants, "e_fft", tf.complex64), axis=2)
     # add xuv to integrate over
     xuv_time_domain_integrate = tf.reshape(xuv_time_domain, [1, -1, 1])
     # multiply elements together
@@ -852,21 +892,54 @@ def streaking_traceA(xuv_cropped_f_in, ir_cropped_f_in):
     return image
 
 
-def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in):
-
-
-    # define the angle for streaking trace collection
-    theta_max = np.pi/2
-    N_theta = 10
-    angle_in = tf.constant(np.linspace(0, theta_max, N_theta), dtype=tf.float32)
-    Beta_in =  1
-
-
-    # this is the second version of streaking trace generator which also includes
-    # the A^2 term in the integral
-
-    # ionization potential
-    Ip = phase_parameters.params.Ip
+def streaking_fields(xuv_cropped_f_in, ir_cropped_f_in, streak_constants, dtypes, spectral_path=None):
+    """
+    xuv field in time and the integrals of the ir vector potential A_int and
+    A2_int on the ir time axis matched to the xuv time step
+
+    spectral_path: "fft" zero pads the cropped spectra and uses inverse
+    ffts over the full xuv axis and the N_req long ir axis. "band" multiplies
+    the cropped spectra with the band limited fourier matrices of
+    kernel_constants.band_constants and only evaluates the ir on the span
+    of the ir time axis which the delays reach. A_int and A2_int are then
+    missing a constant offset, which only adds the same phase to every delay
+    at each K and angle and drops out of |.|^2. defaults to
+    phase_parameters.params.streaking_spectral_path
+
+    returns a dict with "xuv_t", "A_int", "A2_int", "delayindexes" (the
+    gather table into A_int) and "index_offset" (index of A_int[0] on the
+    full ir time axis)
+    """
+    if spectral_path is None:
+        spectral_path = phase_parameters.params.streaking_spectral_path
+    if spectral_path not in ("fft", "band"):
+        raise ValueError("spectral_path must be 'fft' or 'band': {}".format(spectral_path))
+
+    fields = {}
+
+    if spectral_path == "band":
+        band = kernel_constants.band_constants()
+        # xuv in time from the nonzero band only
+        xuv_basis = kernel_constants.graph_constant(band, "xuv_basis", dtypes["complex"])
+        fields["xuv_t"] = tf.reshape(tf.matmul(xuv_basis, tf.reshape(xuv_cropped_f_in, [-1, 1])), [-1])
+
+        # ir field on the delay span
+        ir_basis = kernel_constants.graph_constant(band, "ir_basis", dtypes["complex"])
+        ir_t_span = tf.reshape(tf.matmul(ir_basis, tf.reshape(ir_cropped_f_in, [-1, 1])), [-1])
+        ir_start_weights = kernel_constants.graph_constant(band, "ir_start_weights", dtypes["complex"])
+        ir_start = tf.reduce_sum(ir_start_weights * ir_cropped_f_in)
+
+        # A(t) on the span, starting from the cumsum of the ir before it
+        minus_dt = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=dtypes["phase_real"])
+        A_t = minus_dt * (tf.cast(tf.real(ir_start), dtypes["phase_real"]) + tf.cumsum(tf.cast(tf.real(ir_t_span), dtypes["phase_real"])))
+
+        # integrate A_L(t) and A_L(t)^2 up to a constant
+        fields["A_int"] = minus_dt * tf.cumsum(A_t, reverse=True)
+        fields["A2_int"] = minus_dt * tf.cumsum(A_t**2, reverse=True)
+        fields["delayindexes"] = kernel_constants.graph_constant(band, "delayindexes_span", tf.int32)
+        fields["index_offset"] = int(band["index_min"])
+
+        return fields
 
     #-----------------------------------------------------------------
     # zero pad the spectrum of ir and xuv input to match the full original f matrices
@@ -882,71 +955,163 @@ def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in):
     padded_ir_f = tf.pad(ir_cropped_f_in, paddings_ir)
     # fourier transform the padded xuv
     xuv_time_domain = tf_ifft(tensor=padded_xuv_f, shift=int(xuv_spectrum.spectrum.N / 2))
-    # fourier transform the padded ir
-    ir_time_domain = tf_ifft(tensor=padded_ir_f, shift=int(ir_spectrum.ir_spectrum.N / 2))
 
 
     #------------------------------------------------------------------
     #------ zero pad ir in frequency space to match xuv timestep-------
     #------------------------------------------------------------------
     # calculate N required to match timestep
-    N_req = int(1 / (xuv_spectrum.spectrum.dt * ir_spectrum.ir_spectrum.df))
+    N_req = int(streak_constants["N_req"])
     # this much needs to be padded to each side
-    pad_2 = int((N_req - ir_spectrum.ir_spectrum.N) / 2)
+    pad_2 = int(streak_constants["pad_2"])
     # pad the IR to match dt of xuv
     paddings_ir_2 = tf.constant([[pad_2, pad_2]], dtype=tf.int32)
     padded_ir_2 = tf.pad(padded_ir_f, paddings_ir_2)
     # calculate ir with matching dt in time
     ir_t_matched_dt = tf_ifft(tensor=padded_ir_2, shift=int(N_req / 2))
     # match the scale of the original
-    scale_factor = tf.constant(N_req/ ir_spectrum.ir_spectrum.N, dtype=tf.complex64)
+    scale_factor = tf.constant(N_req/ ir_spectrum.ir_spectrum.N, dtype=dtypes["complex"])
     ir_t_matched_dt_scaled = ir_t_matched_dt * scale_factor
 
 
     #------------------------------------------------------------------
     # ---------------------integrate ir pulse--------------------------
     #------------------------------------------------------------------
-    A_t = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=tf.float32) * tf.cumsum(tf.real(ir_t_matched_dt_scaled))
+    A_t = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=dtypes["phase_real"]) * tf.cumsum(tf.cast(tf.real(ir_t_matched_dt_scaled), dtypes["phase_real"]))
 
     # integrate A_L(t)
     flipped1 = tf.reverse(A_t, axis=[0])
-    flipped_integral = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=tf.float32) * tf.cumsum(flipped1, axis=0)
+    flipped_integral = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=dtypes["phase_real"]) * tf.cumsum(flipped1, axis=0)
     A_t_integ_t_phase = tf.reverse(flipped_integral, axis=[0])
 
     # integrate A_L(t)^2
     flipped1_2 = tf.reverse(A_t**2, axis=[0])
-    flipped_integral_2 = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=tf.float32) * tf.cumsum(flipped1_2, axis=0)
+    flipped_integral_2 = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=dtypes["phase_real"]) * tf.cumsum(flipped1_2, axis=0)
     A_t_integ_t_phase_2 = tf.reverse(flipped_integral_2, axis=[0])
 
+    fields["xuv_t"] = xuv_time_domain
+    fields["A_int"] = A_t_integ_t_phase
+    fields["A2_int"] = A_t_integ_t_phase_2
+    fields["delayindexes"] = kernel_constants.graph_constant(streak_constants, "delayindexes", tf.int32)
+    fields["index_offset"] = 0
+
+    return fields
+
+
+def k_chunk_size(memory_budget, N_theta=1, precision=None):
+    """
+    number of K values which fit in the memory budget (bytes) when the
+    streaking trace integrand is evaluated in chunks along the K axis
+    """
+    # the phase, the exponential and the product are held at the same time
+    # for every element of the integrand
+    dtypes = precision_dtypes(precision)
+    bytes_per_element = dtypes["phase_real"].size + dtypes["phase_complex"].size + dtypes["complex"].size
+    bytes_per_k = bytes_per_element * xuv_spectrum.spectrum.N * len(phase_parameters.params.delay_values) * N_theta
+    return int(max(1, min(len(phase_parameters.params.K), memory_budget // bytes_per_k)))
+
+
+def xuv_time_window(xuv_time_domain, time_window):
+    """
+    indexes (start, stop) of the xuv time axis used in the streaking integral
+
+    time_window: (start, stop) tuple of fixed indexes, for example
+    (threshold_min_index, threshold_max_index) which every generated pulse is
+    checked against, or a float tolerance to find the window from |E(t)|:
+    the window is the smallest one which leaves at most tolerance / 2 of
+    sum(|E(t)|) on each side.
+
+    because |exp(i*phi)| = 1 for the ir and fourier terms, cutting the
+    integral changes the complex amplitude at every (K, tau, theta) by at most
+    dt * max(angular distribution) * sum(|E(t)| outside the window),
+    for a tolerance that is tolerance * dt * max(angular distribution) * sum(|E(t)|)
+    """
+    if isinstance(time_window, (tuple, list)):
+        return int(time_window[0]), int(time_window[1])
+
+    xuv_abs = tf.abs(xuv_time_domain)
+    limit = 0.5 * time_window * tf.reduce_sum(xuv_abs)
+    # number of points at each edge which can be removed
+    start = tf.reduce_sum(tf.cast(tf.cumsum(xuv_abs) <= limit, tf.int32))
+    end_points = tf.reduce_sum(tf.cast(tf.cumsum(xuv_abs, reverse=True) <= limit, tf.int32))
+    stop = tf.shape(xuv_abs)[0] - end_points
+
+    return start, stop
+
+
+def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in, memory_budget=None, time_window=None,
+                    angle_in=None, Beta_in=None, theta_max=None, N_theta=None, precision=None,
+                    spectral_path=None):
+    """
+    memory_budget: number of bytes the integrand may use, the K axis is then
+    integrated in chunks one after another and the resulting trace is the same.
+    defaults to phase_parameters.params.streaking_memory_budget, if that is
+    None the complete integrand is built in one tensor
+
+    time_window: restricts the integral over the xuv time to a window, see
+    xuv_time_window. defaults to phase_parameters.params.streaking_time_window,
+    None integrates over the full xuv time axis
+
+    angle_in: photoelectron angles (tensor or array), if None
+    linspace(0, theta_max, N_theta) is used. Beta_in, theta_max and N_theta
+    default to phase_parameters.params.streaking_Beta / streaking_theta_max /
+    streaking_N_theta
+
+    the angular distribution only depends on the angle, it multiplies the
+    integral after the integration over the xuv time
+
+    precision: precision policy of the integral, see precision_dtypes. the
+    trace is returned as float64 for "double" and float32 otherwise
+
+    spectral_path: "fft" or "band", see streaking_fields
+    """
+    if memory_budget is None:
+        memory_budget = phase_parameters.params.streaking_memory_budget
+    if time_window is None:
+        time_window = phase_parameters.params.streaking_time_window
+    if Beta_in is None:
+        Beta_in = phase_parameters.params.streaking_Beta
 
 
-    # ------------------------------------------------------------------
-    # ---------------------make ir t axis-------------------------------
-    # ------------------------------------------------------------------
-    ir_taxis = xuv_spectrum.spectrum.dt * np.arange(-N_req/2, N_req/2, 1)
+    # define the angle for streaking trace collection
+    if angle_in is None:
+        if theta_max is None:
+            theta_max = phase_parameters.params.streaking_theta_max
+        if N_theta is None:
+            N_theta = phase_parameters.params.streaking_N_theta
+        angle_in = tf.constant(np.linspace(0, theta_max, N_theta), dtype=tf.float32)
+    else:
+        angle_in = tf.convert_to_tensor(angle_in, dtype=tf.float32)
+        N_theta = int(angle_in.shape[0])
 
 
+    # this is the second version of streaking trace generator which also includes
+    # the A^2 term in the integral
 
-    # ------------------------------------------------------------------
-    # ---------------------find indexes of tau values-------------------
-    # ------------------------------------------------------------------
-    center_indexes = []
-    delay_vals_au = phase_parameters.params.delay_values/sc.physical_constants['atomic unit of time'][0]
-    for delay_value in delay_vals_au:
-        index = np.argmin(np.abs(delay_value - ir_taxis))
-        center_indexes.append(index)
-    center_indexes = np.array(center_indexes)
-    rangevals = np.array(range(xuv_spectrum.spectrum.N)) - int((xuv_spectrum.spectrum.N/2))
-    delayindexes = center_indexes.reshape(1, -1) + rangevals.reshape(-1, 1)
+    # constant tensors of the streaking trace
+    streak_constants = kernel_constants.streaking_constants()
+
+    dtypes = precision_dtypes(precision)
+    xuv_cropped_f_in = tf.cast(xuv_cropped_f_in, dtypes["complex"])
+    ir_cropped_f_in = tf.cast(ir_cropped_f_in, dtypes["complex"])
+
+    #------------------------------------------------------------------
+    # -------------xuv field and integrals of the ir pulse--------------
+    #------------------------------------------------------------------
+    fields = streaking_fields(xuv_cropped_f_in, ir_cropped_f_in, streak_constants, dtypes, spectral_path)
+    xuv_time_domain = fields["xuv_t"]
+    A_t_integ_t_phase = fields["A_int"]
+    A_t_integ_t_phase_2 = fields["A2_int"]
+    delayindexes = fields["delayindexes"]
 
 
     # ------------------------------------------------------------------
     # ------------gather values from integrated array-------------------
     # ------------------------------------------------------------------
-    ir_values = tf.gather(A_t_integ_t_phase, delayindexes.astype(np.int))
+    ir_values = tf.gather(A_t_integ_t_phase, delayindexes)
     ir_values = tf.expand_dims(tf.expand_dims(ir_values, axis=0), axis=3)
     # for the squared integral
-    ir_values_2 = tf.gather(A_t_integ_t_phase_2, delayindexes.astype(np.int))
+    ir_values_2 = tf.gather(A_t_integ_t_phase_2, delayindexes)
     ir_values_2 = tf.expand_dims(tf.expand_dims(ir_values_2, axis=0), axis=3)
 
 
@@ -954,17 +1119,13 @@ def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in):
     #------------------------------------------------------------------
     #-------------------construct streaking trace----------------------
     #------------------------------------------------------------------
-    # convert K to atomic units
-    K = phase_parameters.params.K * sc.electron_volt  # joules
-    K = K / sc.physical_constants['atomic unit of energy'][0]  # a.u.
-    K = K.reshape(-1, 1, 1, 1)
-    p = np.sqrt(2 * K).reshape(-1, 1, 1, 1)
+    # momentum in atomic units
+    p = streak_constants["p"].reshape(-1, 1, 1, 1)
     # theta_max = np.pi # 90 degrees
     # angle_in = np.linspace(0, theta_max, 10)
 
-    spec_angle = tf.reshape(tf.cos(angle_in), [1, 1, 1, -1])
-    # convert to tensorflow
-    p_tf = tf.constant(p, dtype=tf.float32)
+    spec_angle = tf.reshape(tf.cos(tf.cast(angle_in, dtypes["phase_real"])), [1, 1, 1, -1])
+    angle_in = tf.cast(angle_in, dtypes["real"])
 
     # test
     # xuv_coefs = tf.placeholder(tf.float32, shape=[None, 5])
@@ -979,14 +1140,10 @@ def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in):
     #     feed_dict = {xuv_cropped_f_in:xuv_cropped_out[0] , ir_cropped_f_in:ir_cropped_out[0]}
     #     ir_values_out = sess.run(ir_values, feed_dict=feed_dict)
 
-    p_A_t_integ_t_phase3d = spec_angle * p_tf * ir_values + 0.5 * ir_values_2
-    ir_phi = tf.exp(tf.complex(imag=(p_A_t_integ_t_phase3d), real=tf.zeros_like(p_A_t_integ_t_phase3d)))
     # add fourier transform term
-    e_fft = np.exp(-1j * (K + Ip) * xuv_spectrum.spectrum.tmat.reshape(1, -1, 1, 1))
-    e_fft_tf = tf.constant(e_fft, dtype=tf.complex64)
+    e_fft = streak_constants["e_fft"].reshape(len(p), -1, 1, 1)
     # add xuv to integrate over
     xuv_time_domain_integrate = tf.reshape(xuv_time_domain, [1, -1, 1, 1])
-    # multiply elements together
 
     # axes:
     # (301, 2048, 98)
@@ -996,12 +1153,52 @@ def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in):
     # (K, xuv_time, tau_delay, angle)
     # angular distribution term calculated from equation
     angular_distribution = 1 + (Beta_in / 2)  * (3 * (tf.cos(angle_in))**2 - 1)
-    angular_distribution = tf.reshape(angular_distribution, [1, 1, 1, -1])
-    angular_distribution = tf.complex(imag=tf.zeros_like(angular_distribution), real=angular_distribution)
+    angular_distribution = tf.reshape(angular_distribution, [1, 1, -1])
+    angular_distribution = tf.cast(angular_distribution, dtypes["complex"])
+
+    # crop the xuv time axis to the pulse
+    if time_window is not None:
+        time_start, time_stop = xuv_time_window(xuv_time_domain, time_window)
+        xuv_time_domain_integrate = xuv_time_domain_integrate[:, time_start:time_stop]
+        ir_values = ir_values[:, time_start:time_stop]
+        ir_values_2 = ir_values_2[:, time_start:time_stop]
+    else:
+        time_start, time_stop = 0, xuv_spectrum.spectrum.N
+
+    def integrate_xuv_time(p_tf, e_fft_tf):
+        # integrand for the K values in p_tf / e_fft_tf
+        e_fft_tf = e_fft_tf[:, time_start:time_stop]
+        p_A_t_integ_t_phase3d = spec_angle * p_tf * ir_values + 0.5 * ir_values_2
+        ir_phi = phase_exp(p_A_t_integ_t_phase3d, dtypes)
+        product = xuv_time_domain_integrate * ir_phi * e_fft_tf
+        # integrate over the xuv time
+        return tf.constant(xuv_spectrum.spectrum.dt, dtype=dtypes["complex"]) * tf.reduce_sum(product, axis=1)
+
+    if memory_budget is None:
+        # build the full (K, xuv_time, tau_delay, angle) integrand at once
+        p_tf = tf.reshape(kernel_constants.graph_constant(streak_constants, "p", dtypes["phase_real"]), [-1, 1, 1, 1])
+        e_fft_tf = tf.reshape(kernel_constants.graph_constant(streak_constants, "e_fft", dtypes["complex"]), [len(p), -1, 1, 1])
+        integration = integrate_xuv_time(p_tf, e_fft_tf)
+
+    else:
+        # split the K axis into chunks which are integrated one after another
+        k_chunk = k_chunk_size(memory_budget, N_theta, precision)
+        n_chunks = int(np.ceil(len(p) / k_chunk))
+        # pad the last chunk by repeating the last K value, removed after integration
+        padded_k_indexes = np.minimum(np.arange(n_chunks * k_chunk), len(p) - 1)
+        p_chunks = kernel_constants.graph_constant(streak_constants, "p_chunks_{}".format(k_chunk), dtypes["phase_real"],
+                                                   value=p[padded_k_indexes].reshape(n_chunks, k_chunk, 1, 1, 1))
+        e_fft_chunks = kernel_constants.graph_constant(streak_constants, "e_fft_chunks_{}".format(k_chunk), dtypes["complex"],
+                                                       value=e_fft[padded_k_indexes].reshape(n_chunks, k_chunk, -1, 1, 1))
+
+        integration_chunks = tf.map_fn(lambda chunk: integrate_xuv_time(chunk[0], chunk[1]),
+                                       (p_chunks, e_fft_chunks), dtype=dtypes["complex"],
+                                       parallel_iterations=1, swap_memory=True)
+        integration = tf.reshape(integration_chunks, [n_chunks * k_chunk, len(phase_parameters.params.delay_values), N_theta])
+        integration = integration[:len(p)]
+
+    integration = integration * angular_distribution
 
-    product = angular_distribution * xuv_time_domain_integrate * ir_phi * e_fft_tf
-    # integrate over the xuv time
-    integration = tf.constant(xuv_spectrum.spectrum.dt, dtype=tf.complex64) * tf.reduce_sum(product, axis=1)
     # absolute square the matrix
     image_not_scaled = tf.square(tf.abs(integration))
     image_not_scaled = image_not_scaled * tf.reshape(tf.sin(angle_in), [1, 1, -1])
@@ -1016,93 +1213,88 @@ def streaking_trace(xuv_cropped_f_in, ir_cropped_f_in):
     return image
 
 
+def streaking_trace_batch(xuv_cropped_f_in, ir_cropped_f_in, parallel_iterations=1, memory_budget=None,
+                          time_window=None, precision=None, **angle_kwargs):
+    """
+    batched version of streaking_trace
 
-def streaking_trace_no_angle(xuv_cropped_f_in, ir_cropped_f_in):
-    # this is the second version of streaking trace generator which also includes
-    # the A^2 term in the integral
+    xuv_cropped_f_in: [batch, n_xuv_freq] cropped xuv spectra
+    ir_cropped_f_in: [batch, n_ir_freq] cropped ir spectra
 
-    # ionization potential
-    Ip = phase_parameters.params.Ip
+    returns the streaking traces with shape [batch, len(K), len(delay)],
+    each trace is min / max normalized individually the same as streaking_trace
 
-    #-----------------------------------------------------------------
-    # zero pad the spectrum of ir and xuv input to match the full original f matrices
-    #-----------------------------------------------------------------
-    # [pad_before , padafter]
-    paddings_xuv = tf.constant(
-        [[xuv_spectrum.spectrum.indexmin, xuv_spectrum.spectrum.N - xuv_spectrum.spectrum.indexmax]], dtype=tf.int32)
-    padded_xuv_f = tf.pad(xuv_cropped_f_in, paddings_xuv)
-    # same for the IR
-    paddings_ir = tf.constant(
-        [[ir_spectrum.ir_spectrum.start_index, ir_spectrum.ir_spectrum.N - ir_spectrum.ir_spectrum.end_index]],
-        dtype=tf.int32)
-    padded_ir_f = tf.pad(ir_cropped_f_in, paddings_ir)
-    # fourier transform the padded xuv
-    xuv_time_domain = tf_ifft(tensor=padded_xuv_f, shift=int(xuv_spectrum.spectrum.N / 2))
-    # fourier transform the padded ir
-    ir_time_domain = tf_ifft(tensor=padded_ir_f, shift=int(ir_spectrum.ir_spectrum.N / 2))
+    the traces are calculated inside one graph op so a whole batch only
+    needs one sess.run, parallel_iterations sets how many traces are
+    integrated at the same time, memory_budget, time_window, precision and the
+    angle arguments (angle_in, Beta_in, theta_max, N_theta) are passed
+    to streaking_trace (an adaptive time window is found for every sample)
+    """
+    images = tf.map_fn(lambda fields: streaking_trace(xuv_cropped_f_in=fields[0], ir_cropped_f_in=fields[1],
+                                                      memory_budget=memory_budget, time_window=time_window,
+                                                      precision=precision, **angle_kwargs),
+                       (xuv_cropped_f_in, ir_cropped_f_in), dtype=precision_dtypes(precision)["real"],
+                       parallel_iterations=parallel_iterations)
 
+    return images
 
-    #------------------------------------------------------------------
-    #------ zero pad ir in frequency space to match xuv timestep-------
-    #------------------------------------------------------------------
-    # calculate N required to match timestep
-    N_req = int(1 / (xuv_spectrum.spectrum.dt * ir_spectrum.ir_spectrum.df))
-    # this much needs to be padded to each side
-    pad_2 = int((N_req - ir_spectrum.ir_spectrum.N) / 2)
-    # pad the IR to match dt of xuv
-    paddings_ir_2 = tf.constant([[pad_2, pad_2]], dtype=tf.int32)
-    padded_ir_2 = tf.pad(padded_ir_f, paddings_ir_2)
-    # calculate ir with matching dt in time
-    ir_t_matched_dt = tf_ifft(tensor=padded_ir_2, shift=int(N_req / 2))
-    # match the scale of the original
-    scale_factor = tf.constant(N_req/ ir_spectrum.ir_spectrum.N, dtype=tf.complex64)
-    ir_t_matched_dt_scaled = ir_t_matched_dt * scale_factor
 
 
-    #------------------------------------------------------------------
-    # ---------------------integrate ir pulse--------------------------
-    #------------------------------------------------------------------
-    A_t = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=tf.float32) * tf.cumsum(tf.real(ir_t_matched_dt_scaled))
+def streaking_trace_no_angle(xuv_cropped_f_in, ir_cropped_f_in, engine=None, precision=None, spectral_path=None):
+    """
+    engine: "direct" sums the integrand over the xuv time for every (K, tau),
+    "fft" uses that the volkov phase only depends on t - tau, so for every K
+    the integral over the xuv time is a cross correlation of the xuv term with
+    exp(i*(p*A_int + 0.5*A2_int)) along the ir time axis, computed with ffts
+    on the part of the ir time axis which the delays reach. defaults to
+    phase_parameters.params.streaking_engine
 
-    # integrate A_L(t)
-    flipped1 = tf.reverse(A_t, axis=[0])
-    flipped_integral = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=tf.float32) * tf.cumsum(flipped1, axis=0)
-    A_t_integ_t_phase = tf.reverse(flipped_integral, axis=[0])
+    precision: precision policy, see precision_dtypes
 
-    # integrate A_L(t)^2
-    flipped1_2 = tf.reverse(A_t**2, axis=[0])
-    flipped_integral_2 = tf.constant(-1.0 * xuv_spectrum.spectrum.dt, dtype=tf.float32) * tf.cumsum(flipped1_2, axis=0)
-    A_t_integ_t_phase_2 = tf.reverse(flipped_integral_2, axis=[0])
+    spectral_path: "fft" or "band", see streaking_fields
+    """
+    if engine is None:
+        engine = phase_parameters.params.streaking_engine
+    if engine not in ("direct", "fft"):
+        raise ValueError("engine must be 'direct' or 'fft': {}".format(engine))
 
+    # this is the second version of streaking trace generator which also includes
+    # the A^2 term in the integral
 
+    # constant tensors of the streaking trace
+    streak_constants = kernel_constants.streaking_constants()
 
-    # ------------------------------------------------------------------
-    # ---------------------make ir t axis-------------------------------
-    # ------------------------------------------------------------------
-    ir_taxis = xuv_spectrum.spectrum.dt * np.arange(-N_req/2, N_req/2, 1)
+    dtypes = precision_dtypes(precision)
+    xuv_cropped_f_in = tf.cast(xuv_cropped_f_in, dtypes["complex"])
+    ir_cropped_f_in = tf.cast(ir_cropped_f_in, dtypes["complex"])
 
+    #------------------------------------------------------------------
+    # -------------xuv field and integrals of the ir pulse--------------
+    #------------------------------------------------------------------
+    fields = streaking_fields(xuv_cropped_f_in, ir_cropped_f_in, streak_constants, dtypes, spectral_path)
+    xuv_time_domain = fields["xuv_t"]
+    A_t_integ_t_phase = fields["A_int"]
+    A_t_integ_t_phase_2 = fields["A2_int"]
+    delayindexes = fields["delayindexes"]
 
+    if engine == "fft":
+        integration = streaking_integral_fft(xuv_time_domain, A_t_integ_t_phase, A_t_integ_t_phase_2, streak_constants, dtypes,
+                                             index_offset=fields["index_offset"])
+        # absolute square the matrix
+        image_not_scaled = tf.square(tf.abs(integration))
+        scaled = image_not_scaled - tf.reduce_min(image_not_scaled)
+        image = scaled / tf.reduce_max(scaled)
 
-    # ------------------------------------------------------------------
-    # ---------------------find indexes of tau values-------------------
-    # ------------------------------------------------------------------
-    center_indexes = []
-    delay_vals_au = phase_parameters.params.delay_values/sc.physical_constants['atomic unit of time'][0]
-    for delay_value in delay_vals_au:
-        index = np.argmin(np.abs(delay_value - ir_taxis))
-        center_indexes.append(index)
-    center_indexes = np.array(center_indexes)
-    rangevals = np.array(range(xuv_spectrum.spectrum.N)) - int((xuv_spectrum.spectrum.N/2))
-    delayindexes = center_indexes.reshape(1, -1) + rangevals.reshape(-1, 1)
+        return image
 
 
     # ------------------------------------------------------------------
     # ------------gather values from integrated array-------------------
     # ------------------------------------------------------------------
-    ir_values = tf.gather(A_t_integ_t_phase, delayindexes.astype(np.int))
+    ir_values = tf.gather(A_t_integ_t_phase, delayindexes)
     ir_values = tf.expand_dims(ir_values, axis=0)
     # for the squared integral
-    ir_values_2 = tf.gather(A_t_integ_t_phase_2, delayindexes.astype(np.int))
+    ir_values_2 = tf.gather(A_t_integ_t_phase_2, delayindexes)
     ir_values_2 = tf.expand_dims(ir_values_2, axis=0)
 
 
@@ -1110,25 +1302,19 @@ def streaking_trace_no_angle(xuv_cropped_f_in, ir_cropped_f_in):
     #------------------------------------------------------------------
     #-------------------construct streaking trace----------------------
     #------------------------------------------------------------------
-    # convert K to atomic units
-    K = phase_parameters.params.K * sc.electron_volt  # joules
-    K = K / sc.physical_constants['atomic unit of energy'][0]  # a.u.
-    K = K.reshape(-1, 1, 1)
-    p = np.sqrt(2 * K).reshape(-1, 1, 1)
-    # convert to tensorflow
-    p_tf = tf.constant(p, dtype=tf.float32)
+    # momentum in atomic units
+    p_tf = tf.reshape(kernel_constants.graph_constant(streak_constants, "p", dtypes["phase_real"]), [-1, 1, 1])
     # 3d ir mat
     p_A_t_integ_t_phase3d = p_tf * ir_values + 0.5 * ir_values_2
-    ir_phi = tf.exp(tf.complex(imag=(p_A_t_integ_t_phase3d), real=tf.zeros_like(p_A_t_integ_t_phase3d)))
+    ir_phi = phase_exp(p_A_t_integ_t_phase3d, dtypes)
     # add fourier transform term
-    e_fft = np.exp(-1j * (K + Ip) * xuv_spectrum.spectrum.tmat.reshape(1, -1, 1))
-    e_fft_tf = tf.constant(e_fft, dtype=tf.complex64)
+    e_fft_tf = tf.expand_dims(kernel_constants.graph_constant(streak_constants, "e_fft", dtypes["complex"]), axis=2)
     # add xuv to integrate over
     xuv_time_domain_integrate = tf.reshape(xuv_time_domain, [1, -1, 1])
     # multiply elements together
     product = xuv_time_domain_integrate * ir_phi * e_fft_tf
     # integrate over the xuv time
-    integration = tf.constant(xuv_spectrum.spectrum.dt, dtype=tf.complex64) * tf.reduce_sum(product, axis=1)
+    integration = tf.constant(xuv_spectrum.spectrum.dt, dtype=dtypes["complex"]) * tf.reduce_sum(product, axis=1)
     # absolute square the matrix
     image_not_scaled = tf.square(tf.abs(integration))
     scaled = image_not_scaled - tf.reduce_min(image_not_scaled)
@@ -1136,7 +1322,96 @@ def streaking_trace_no_angle(xuv_cropped_f_in, ir_cropped_f_in):
 
     return image
 
+def streaking_integral_fft(xuv_time_domain, A_t_integ_t_phase, A_t_integ_t_phase_2, streak_constants, dtypes, index_offset=0):
+    """
+    integral over the xuv time of streaking_trace_no_angle (K, tau_delay) as
+    a cross correlation along the ir time axis
+
+    delayindexes[t, tau] = center_index[tau] + t - N/2, so for each K
+    integral[tau] = dt * sum_t f(t) g(t + offset[tau])
+    with f = xuv * e_fft and g = exp(i*(p*A_int + 0.5*A2_int)) restricted to
+    the indexes the delays reach. this takes len(K) * L exponentials and
+    three length M ffts per K instead of len(K) * N * len(delay)
+    exponentials (L: span of delayindexes, M: next power of 2 >= L)
+
+    index_offset: index of A_t_integ_t_phase[0] on the full ir time axis
+    """
+    delayindexes = streak_constants["delayindexes"]
+    index_min = int(np.min(delayindexes))
+    L = int(np.max(delayindexes)) + 1 - index_min
+    M = int(2**np.ceil(np.log2(L)))
+    # start of each delay window on the restricted ir axis
+    offsets = streak_constants["center_indexes"] - np.min(streak_constants["center_indexes"])
+
+    # restrict the ir to the part reached by the delays (1, L)
+    index_start = index_min - index_offset
+    A_restricted = tf.reshape(A_t_integ_t_phase[index_start:index_start + L], [1, -1])
+    A2_restricted = tf.reshape(A_t_integ_t_phase_2[index_start:index_start + L], [1, -1])
+
+    # (K, L)
+    p_tf = tf.reshape(kernel_constants.graph_constant(streak_constants, "p", dtypes["phase_real"]), [-1, 1])
+    g_phase = p_tf * A_restricted + 0.5 * A2_restricted
+    g = phase_exp(g_phase, dtypes)
+
+    # (K, N)
+    e_fft_tf = kernel_constants.graph_constant(streak_constants, "e_fft", dtypes["complex"])
+    f = e_fft_tf * tf.reshape(xuv_time_domain, [1, -1])
+
+    # zero pad both to M, the correlation does not wrap for the offsets needed
+    g_padded = tf.pad(g, [[0, 0], [0, M - L]])
+    f_padded = tf.pad(f, [[0, 0], [0, M - xuv_spectrum.spectrum.N]])
+    # sum_t f(t) g(t + o) = M * ifft(fft(g) * ifft(f))[o]
+    correlation = tf.ifft(tf.fft(g_padded) * tf.ifft(f_padded))
+    correlation = tf.gather(correlation, offsets.astype(np.int32), axis=1)
+
+    return tf.constant(M * xuv_spectrum.spectrum.dt, dtype=dtypes["complex"]) * correlation
+
+
+def streaking_engine_benchmark(n_samples=10, seed=0):
+    """
+    accuracy and speed of the "fft" engine of streaking_trace_no_angle
+    against the "direct" engine, with streaking_trace timed for reference
+    """
+    import time
+
+    random_state = np.random.RandomState(seed)
+    xuv_coefs = 2 * random_state.rand(n_samples, phase_parameters.params.xuv_phase_coefs) - 1.0
+    xuv_coefs[:, 0] = 0.0
+    ir_values = 2 * random_state.rand(n_samples, 4) - 1.0
+
+    graph = tf.Graph()
+    with graph.as_default():
+        xuv_coefs_in = tf.placeholder(tf.float32, shape=[None, phase_parameters.params.xuv_phase_coefs])
+        ir_values_in = tf.placeholder(tf.float32, shape=[None, 4])
+        xuv_E_prop = xuv_taylor_to_E(xuv_coefs_in)
+        ir_E_prop = ir_from_params(ir_values_in)["E_prop"]
+        images = {}
+        images["direct"] = streaking_trace_no_angle(xuv_E_prop["f_cropped"][0], ir_E_prop["f_cropped"][0], engine="direct")
+        images["fft"] = streaking_trace_no_angle(xuv_E_prop["f_cropped"][0], ir_E_prop["f_cropped"][0], engine="fft")
+        images["streaking_trace"] = streaking_trace(xuv_E_prop["f_cropped"][0], ir_E_prop["f_cropped"][0])
+
+    results = {name: {"time": 0.0, "traces": []} for name in images}
+    with tf.Session(graph=graph) as sess:
+        for i in range(n_samples):
+            feed_dict = {xuv_coefs_in: xuv_coefs[i:i+1], ir_values_in: ir_values[i:i+1]}
+            for name in images:
+                if i == 0:
+                    # first run includes the graph setup
+                    sess.run(images[name], feed_dict=feed_dict)
+                time1 = time.time()
+                results[name]["traces"].append(sess.run(images[name], feed_dict=feed_dict))
+                results[name]["time"] += time.time() - time1
+
+    errors = np.abs(np.array(results["fft"]["traces"]) - np.array(results["direct"]["traces"]))
+    for name in images:
+        print("{}: {:.4f} s / trace".format(name, results[name]["time"] / n_samples))
+    print("fft engine max abs error: {}, mean abs error: {}".format(np.max(errors), np.mean(errors)))
+
+    return results
+
+
 def phase_rmse_error_test():
+    import matplotlib.pyplot as plt
     # calculate transform limited trace
     # view generated xuv pulse
     xuv_coefs = tf.placeholder(tf.float32, shape=[None, 5])
@@ -1238,6 +1513,7 @@ def phase_rmse_error_test():
 if __name__ == "__main__":
    # phase_rmse_error_test()
 
+    import matplotlib.pyplot as plt
     # view generated xuv pulse
     xuv_coefs = tf.placeholder(tf.float32, shape=[None, 5])
     ir_values_in = tf.placeholder(tf.float32, shape=[None, 4])
@@ -49,25 +49,26 @@ class UnsupervisedRetrieval:
         self.measured_trace = measured_trace
 
         # build neural net graph
-        self.nn_nodes = network3.setup_neural_net()
+        self.nn_nodes = network3.setup_neural_net(mode="unsupervised")
 
         # create mse measurer
         self.writer = tf.summary.FileWriter("./tensorboard_graph_u/" + self.run_name)
         if self.retrieval == "normal":
-            self.unsupervised_mse_tb = tf.summary.scalar("trace_mse",
-                                self.nn_nodes["unsupervised"]["unsupervised_learning_loss"])
+            self.unsupervised_mse = self.nn_nodes["unsupervised"]["unsupervised_learning_loss"]
 
         elif self.retrieval == "proof":
-            self.unsupervised_mse_tb = tf.summary.scalar("trace_mse",
-                                self.nn_nodes["unsupervised"]["proof"]["proof_unsupervised_learning_loss"])
+            self.unsupervised_mse = self.nn_nodes["unsupervised"]["proof"]["proof_unsupervised_learning_loss"]
 
         elif self.retrieval == "autocorrelation":
-            self.unsupervised_mse_tb = tf.summary.scalar("trace_mse",
-                                self.nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_learning_loss"])
+            self.unsupervised_mse = self.nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_learning_loss"]
 
         else:
             self.unsupervised_mse_tb = None
             raise ValueError("retrieval type must be either 'normal', 'proof', or 'autocorrelation'")
+        self.unsupervised_mse_tb = tf.summary.scalar("trace_mse", self.unsupervised_mse)
+
+        # fields and traces of the plots and the result, fetched in one run
+        self.retrieval_nodes = network3.retrieval_nodes(self.nn_nodes)
 
         # init data object
         self.get_data = network3.GetData(batch_size=10)
@@ -75,7 +76,9 @@ class UnsupervisedRetrieval:
         self.axes = create_plot_axes()
 
         self.sess = tf.Session()
-        self.saver = tf.train.Saver()
+        # the optimizers of this graph start from their initial values
+        self.sess.run(tf.global_variables_initializer())
+        self.saver = tf.train.Saver(var_list=self.nn_nodes["general"]["phase_net_vars"])
         self.saver.restore(self.sess, './models/{}.ckpt'.format(self.modelname+'_unsupervised'))
 
         self.c_iteration = 0
@@ -189,46 +192,25 @@ class UnsupervisedRetrieval:
         return self.retrieve_final_result()
 
     def update_plots(self):
-        ir_f = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["ir_E_prop"]["f_cropped"],feed_dict=self.feed_dict)[0]
-        xuv_f = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["f_cropped"],feed_dict=self.feed_dict)[0]
-        xuv_f_phase = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["phasecurve_cropped"],feed_dict=self.feed_dict)[0]
-        xuv_f_full = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["f"],feed_dict=self.feed_dict)[0]
-        xuv_t = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["t"],feed_dict=self.feed_dict)[0]
-
-        #================================================
-        #==================INPUT TRACES==================
-        #================================================
-
-        # calculate INPUT Autocorrelation from input image
-        input_auto = self.sess.run(self.nn_nodes["unsupervised"]["autocorrelate"]["input_image_autocorrelate"], feed_dict=self.feed_dict)
-
-        # calculate INPUT PROOF trace from input image
-        input_proof = self.sess.run(self.nn_nodes["unsupervised"]["proof"]["input_image_proof"]["proof"], feed_dict=self.feed_dict)
-
-        #================================================
-        #==================MEASURED TRACES===============
-        #================================================
-
-        # reconstructed regular trace from input image
-        reconstructed = self.sess.run(self.nn_nodes["general"]["reconstructed_trace"],feed_dict=self.feed_dict)
-
-        # calculate reconstructed proof trace
-        reconstructed_proof = self.sess.run(self.nn_nodes["unsupervised"]["proof"]["reconstructed_proof"]["proof"], feed_dict=self.feed_dict)
-
-        # calculate reconstructed autocorrelation trace
-        reconstruced_auto = self.sess.run(self.nn_nodes["unsupervised"]["autocorrelate"]["reconstructed_autocorrelate"], feed_dict=self.feed_dict)
+        retrieval = network3.run_retrieval(self.sess, self.retrieval_nodes, self.feed_dict)
 
         # measured/calculated from input traces
         input_traces = dict()
         input_traces["trace"] = self.measured_trace
-        input_traces["proof"] = input_proof
-        input_traces["autocorrelation"] = input_auto
+        input_traces["proof"] = retrieval.input_proof
+        input_traces["autocorrelation"] = retrieval.input_auto
 
         # reconstruction traces
         recons_traces = dict()
-        recons_traces["trace"] = reconstructed
-        recons_traces["proof"] = reconstructed_proof
-        recons_traces["autocorrelation"] = reconstruced_auto
+        recons_traces["trace"] = retrieval.reconstructed
+        recons_traces["proof"] = retrieval.reconstructed_proof
+        recons_traces["autocorrelation"] = retrieval.reconstructed_auto
+
+        xuv_f = retrieval.xuv_f[0]
+        xuv_f_phase = retrieval.xuv_f_phase[0]
+        xuv_f_full = retrieval.xuv_f_full[0]
+        xuv_t = retrieval.xuv_t[0]
+        ir_f = retrieval.ir_f[0]
 
         if self.retrieval == "normal":
             plot_images_fields(axes=self.axes, traces_meas=input_traces, traces_reconstructed=recons_traces,
@@ -252,41 +234,25 @@ class UnsupervisedRetrieval:
             plt.pause(0.00001)
 
     def retrieve_final_result(self):
-        # get trace rmse and trace
-        if self.retrieval == "normal":
-            # trace mse
-            final_mse = self.sess.run(self.nn_nodes["unsupervised"]["unsupervised_learning_loss"],
-                                      feed_dict=self.feed_dict)
-            # reconstructed trace
-            recons_trace = self.sess.run(self.nn_nodes["general"]["reconstructed_trace"],
-                                      feed_dict=self.feed_dict)
+        # trace mse, reconstructed trace and retrieved phase in one run
+        retrieval = network3.run_retrieval(self.sess, self.retrieval_nodes, self.feed_dict,
+                                           mse=self.unsupervised_mse)
+        final_mse = retrieval.mse
 
+        # reconstructed trace of the retrieval type
+        if self.retrieval == "normal":
+            recons_trace = retrieval.reconstructed
         elif self.retrieval == "proof":
-            # trace mse
-            final_mse = self.sess.run(self.nn_nodes["unsupervised"]["proof"]["proof_unsupervised_learning_loss"],
-                                      feed_dict=self.feed_dict)
-            # reconstructed trace
-            recons_trace = self.sess.run(self.nn_nodes["unsupervised"]["proof"]["reconstructed_proof"],
-                                      feed_dict=self.feed_dict)
-
+            recons_trace = retrieval.reconstructed_proof
         elif self.retrieval == "autocorrelation":
-            # trace mse
-            final_mse = self.sess.run(self.nn_nodes["unsupervised"]["autocorrelate"]["autocorrelate_unsupervised_learning_loss"],
-                                      feed_dict=self.feed_dict)
-            # reconstructed trace
-            recons_trace = self.sess.run(self.nn_nodes["unsupervised"]["autocorrelate"]["reconstructed_autocorrelate"],
-                                      feed_dict=self.feed_dict)
+            recons_trace = retrieval.reconstructed_auto
         else:
             raise ValueError("final mse not defined")
 
-        # get the retrieved phase
+        # the retrieved phase and complex spectrum
         phase_retrieved = dict()
-        phase_retrieved["cropped_phase"] = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["phasecurve_cropped"],
-                             feed_dict=self.feed_dict)[0]
-
-        # get the retrieved complex spectrum
-        phase_retrieved["f_full"] = self.sess.run(self.nn_nodes["general"]["phase_net_output"]["xuv_E_prop"]["f"],
-                                                   feed_dict=self.feed_dict)[0]
+        phase_retrieved["cropped_phase"] = retrieval.xuv_f_phase[0]
+        phase_retrieved["f_full"] = retrieval.xuv_f_full[0]
 
         result = dict()
         result["field"] = phase_retrieved 
@@ -980,7 +946,7 @@ class SupervisedRetrieval:
         """
         self.modelname = model
         # build neural net graph
-        self.nn_nodes = network3.setup_neural_net()
+        self.nn_nodes = network3.setup_neural_net(mode="infer")
 
         # restore session
         self.sess = tf.Session()
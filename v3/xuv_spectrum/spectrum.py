@@ -1,6 +1,5 @@
 import csv
 import pickle
-import matplotlib.pyplot as plt
 import scipy.constants as sc
 import numpy as np
 import scipy.interpolate
@@ -53,6 +52,7 @@ def my_interp(electronvolts_in, intensity_in, plotting=False):
     indexmax = np.argmin(np.abs(fmat - 9.34e16))
 
     if plotting:
+        import matplotlib.pyplot as plt
         plt.figure(1)
         plt.plot(hertz, Intensity, color='red')
         plt.plot(fmat, np.zeros_like(fmat), color='blue')
@@ -124,6 +124,7 @@ def retrieve_spectrum2(plotting=False):
 
 
     if plotting:
+        import matplotlib.pyplot as plt
         plt.figure(1)
         plt.plot(hertz, Intensity, color='red')
         plt.plot(fmat, np.zeros_like(fmat), color='blue')